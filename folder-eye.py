@@ -1,26 +1,135 @@
 import os
 import sys
 import json
-import hashlib
-import difflib
-import shutil
 import time
+import tempfile
 import subprocess
 import threading
-import chardet
-import re
+import multiprocessing
 import queue  # Added for thread safety
+from collections import deque
 from datetime import datetime
 from pathlib import Path
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext, simpledialog
 import webbrowser
 
-def get_app_dir(app_name="FolderComparisonTool"):
-    if getattr(sys, "frozen", False):
-        return os.path.dirname(sys.executable)
-    else:
-        return os.path.dirname(os.path.abspath(__file__))
+import folder_eye_report as report
+import folder_eye_views as views
+from folder_eye_archive import archive_format
+from folder_eye_log import LogRing
+from folder_eye_engine import (get_app_dir, read_file_content, compact_exclusion_rules,
+                               ComparisonEngine, ComparisonOptions)
+
+# Messages the worker threads may queue ahead of the GUI before they block
+GUI_QUEUE_MAX = 10000
+# Main-thread time spent draining the queue per tick, in seconds
+GUI_TICK_BUDGET = 0.05
+GUI_TICK_MS = 100
+# Next tick comes sooner while a backlog is left over
+GUI_BUSY_TICK_MS = 20
+# Entries kept in the 操作日志 tab
+GUI_LOG_LINES = 1000
+
+
+class VirtualFileList:
+    """
+    Treeview front end for a result list of any length. Rows live in a plain
+    list; only the rows that fit in the view exist as Tk items, and scrolling
+    rebinds those few items to other rows.
+    """
+
+    def __init__(self, tree, scrollbar):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.rows = []
+        self.offset = 0
+        # Index into rows, kept while the selected row is scrolled out of view
+        self.selected = None
+        self._items = []
+
+        scrollbar.configure(command=self.yview)
+        tree.bind("<Configure>", lambda e: self.refresh())
+        tree.bind("<<TreeviewSelect>>", self._on_select)
+        tree.bind("<MouseWheel>", lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        tree.bind("<Button-4>", lambda e: self.scroll(-3))
+        tree.bind("<Button-5>", lambda e: self.scroll(3))
+        tree.bind("<Up>", lambda e: self._move_selection(-1))
+        tree.bind("<Down>", lambda e: self._move_selection(1))
+        tree.bind("<Prior>", lambda e: self._move_selection(-self._visible_count()))
+        tree.bind("<Next>", lambda e: self._move_selection(self._visible_count()))
+        tree.bind("<Home>", lambda e: self._move_selection(-len(self.rows)))
+        tree.bind("<End>", lambda e: self._move_selection(len(self.rows)))
+
+    def _visible_count(self):
+        top, row_height = 25, 20
+        if self._items:
+            box = self.tree.bbox(self._items[0])
+            if box:
+                top, row_height = box[1], box[3]
+        # Only whole rows, so the Treeview itself never has anything to scroll
+        return max(1, (self.tree.winfo_height() - top) // max(1, row_height))
+
+    def clear(self):
+        self.rows = []
+        self.offset = 0
+        self.selected = None
+        self.refresh()
+
+    def refresh(self):
+        total = len(self.rows)
+        visible = min(self._visible_count(), total)
+        self.offset = max(0, min(self.offset, total - visible))
+
+        while len(self._items) < visible:
+            self._items.append(self.tree.insert("", tk.END, values=()))
+        while len(self._items) > visible:
+            self.tree.delete(self._items.pop())
+        for k, iid in enumerate(self._items):
+            self.tree.item(iid, values=self.rows[self.offset + k])
+
+        if self.selected is not None and self.offset <= self.selected < self.offset + visible:
+            iid = self._items[self.selected - self.offset]
+            if self.tree.selection() != (iid,):
+                self.tree.selection_set(iid)
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+
+        if total:
+            self.scrollbar.set(self.offset / total, (self.offset + visible) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def scroll(self, rows):
+        self.offset += rows
+        self.refresh()
+
+    def yview(self, *args):
+        if args[0] == 'moveto':
+            self.offset = int(float(args[1]) * len(self.rows))
+            self.refresh()
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            self.scroll(step * self._visible_count() if args[2] == 'pages' else step)
+
+    def _on_select(self, event):
+        selection = self.tree.selection()
+        if selection and selection[0] in self._items:
+            self.selected = self.offset + self._items.index(selection[0])
+
+    def _move_selection(self, step):
+        if not self.rows:
+            return "break"
+        current = self.selected if self.selected is not None else self.offset - 1
+        self.selected = max(0, min(len(self.rows) - 1, current + step))
+        visible = self._visible_count()
+        if self.selected < self.offset:
+            self.offset = self.selected
+        elif self.selected >= self.offset + visible:
+            self.offset = self.selected - visible + 1
+        self.refresh()
+        return "break"
+
 
 class FolderComparisonTool:
     def __init__(self, root):
@@ -42,17 +151,25 @@ class FolderComparisonTool:
         self.excluded_config_path = os.path.join(self.app_dir, "exclude_config.json")
         
         # --- Optimization: Thread-Safe Queue Init ---
-        self.gui_queue = queue.Queue()
+        # Bounded, so a run finding 100k+ files blocks its workers instead of flooding the main thread
+        self.gui_queue = queue.Queue(maxsize=GUI_QUEUE_MAX)
+        # Messages posted by the main thread itself, which must never block on its own queue
+        self._main_messages = deque()
+        # --- Optimization: Bounded On-Screen Log ---
+        # The log tab shows this ring; the complete log goes to 运行日志.log in the output folder
+        self.log_ring = LogRing(GUI_LOG_LINES)
         # --------------------------------------------
 
         self.dir_a = tk.StringVar()
         self.dir_b = tk.StringVar()
         self.output_dir = tk.StringVar(value=os.path.join(self.app_dir, "对比结果"))
         self.is_comparing = tk.BooleanVar(value=False)
-        self.stop_flag = False
+        self.engine = None
         self.modified_files = []
         self.added_files = []
         self.deleted_files = []
+        # output_dir -> (ReportIndex, TempReportCache) for double-click views
+        self._report_views = {}
         
         self.dir_a_history = []
         self.dir_b_history = []
@@ -73,66 +190,109 @@ class FolderComparisonTool:
     # --- Optimization: GUI Queue Processor ---
     def process_gui_queue(self):
         """
-        Runs on the main thread. Checks the queue for updates from the background thread
-        and updates the GUI safely.
+        Runs on the main thread. Drains queued updates from the background
+        threads for at most GUI_TICK_BUDGET per tick and applies them in one
+        batch: rows go into the virtual lists, log lines into one text insert,
+        and only the latest status is shown.
         """
+        deadline = time.monotonic() + GUI_TICK_BUDGET
+        logs = []
+        # False once a message was folded into an older entry or pushed one out; the text is redrawn then
+        logs_appended_only = True
+        status = None
+        progress = None
+        touched = set()
+        backlog = True
         try:
-            while not self.gui_queue.empty():
-                # Get data without blocking
-                msg_type, data = self.gui_queue.get_nowait()
-                
+            while time.monotonic() < deadline:
+                if self._main_messages:
+                    msg_type, data = self._main_messages.popleft()
+                else:
+                    try:
+                        msg_type, data = self.gui_queue.get_nowait()
+                    except queue.Empty:
+                        backlog = False
+                        break
+
                 if msg_type == 'log':
-                    if hasattr(self, 'log_text') and self.log_text:
-                        self.log_text.insert(tk.END, data)
-                        self.log_text.see(tk.END)
-                
+                    text, category = data
+                    if self.log_ring.add(text, category):
+                        logs.append(text)
+                    else:
+                        logs_appended_only = False
+
                 elif msg_type == 'status':
-                    message, progress = data
-                    self.status_var.set(message)
-                    if progress is not None:
-                        self.progress_var.set(progress)
-                
+                    status, message_progress = data
+                    if message_progress is not None:
+                        progress = message_progress
+
                 elif msg_type == 'tree_insert':
                     # data = (tree_type, values)
                     tree_type, values = data
-                    if tree_type == 'modified':
-                        self.modified_tree.insert("", tk.END, values=values)
-                    elif tree_type == 'added':
-                        self.added_tree.insert("", tk.END, values=values)
-                    elif tree_type == 'deleted':
-                        self.deleted_tree.insert("", tk.END, values=values)
+                    self.result_lists[tree_type].rows.append(values)
+                    touched.add(tree_type)
 
                 elif msg_type == 'tree_clear':
-                    for item in self.modified_tree.get_children(): self.modified_tree.delete(item)
-                    for item in self.added_tree.get_children(): self.added_tree.delete(item)
-                    for item in self.deleted_tree.get_children(): self.deleted_tree.delete(item)
+                    for file_list in self.result_lists.values():
+                        file_list.clear()
+                    touched.clear()
+                    logs = []
+                    logs_appended_only = True
+                    self.log_ring.clear()
                     self.log_text.delete(1.0, tk.END)
 
                 elif msg_type == 'completion':
+                    # The dialog below runs its own event loop, so show everything queued before it first
+                    self._apply_gui_batch(logs, logs_appended_only, status, progress, touched)
+                    logs, logs_appended_only, status, progress, touched = [], True, None, None, set()
+
                     # Re-enable buttons on main thread
                     self.open_result_button.config(state=tk.NORMAL)
-                    self.open_summary_button.config(state=tk.NORMAL)
+                    # The summary of an archive output is inside the archive, not on disk
+                    self.open_summary_button.config(
+                        state=tk.DISABLED if archive_format(self.output_dir.get()) else tk.NORMAL)
                     self.compare_button.config(state=tk.NORMAL)
                     self.stop_button.config(state=tk.DISABLED)
                     self.is_comparing.set(False)
                     summary_text = data
-                    messagebox.showinfo("完成", summary_text)
+                    if summary_text:
+                        messagebox.showinfo("完成", summary_text)
 
-        except queue.Empty:
-            pass
         finally:
-            # Check again in 100ms
-            self.root.after(100, self.process_gui_queue)
+            self._apply_gui_batch(logs, logs_appended_only, status, progress, touched)
+            self.root.after(GUI_BUSY_TICK_MS if backlog else GUI_TICK_MS, self.process_gui_queue)
+
+    def _apply_gui_batch(self, logs, logs_appended_only, status, progress, touched):
+        if not logs_appended_only:
+            self.log_text.delete(1.0, tk.END)
+            self.log_text.insert(tk.END, self.log_ring.render())
+            self.log_text.see(tk.END)
+        elif logs:
+            self.log_text.insert(tk.END, ''.join(logs))
+            self.log_text.see(tk.END)
+        if status is not None:
+            self.status_var.set(status)
+        if progress is not None:
+            self.progress_var.set(progress)
+        for tree_type in touched:
+            self.result_lists[tree_type].refresh()
+
+    def _post(self, message):
+        if threading.current_thread() is threading.main_thread():
+            self._main_messages.append(message)
+        else:
+            # Blocks while the queue is full: backpressure on the comparison threads
+            self.gui_queue.put(message)
 
     def log(self, message):
         """Thread-safe logging"""
         timestamp = datetime.now().strftime("%H:%M:%S")
         log_msg = f"[{timestamp}] {message}\n"
-        self.gui_queue.put(('log', log_msg))
+        self._post(('log', (log_msg, None)))
 
     def update_status(self, message, progress=None):
         """Thread-safe status update"""
-        self.gui_queue.put(('status', (message, progress)))
+        self._post(('status', (message, progress)))
 
     def load_config(self):
         if os.path.exists(self.config_path):
@@ -181,7 +341,8 @@ class FolderComparisonTool:
         if os.path.exists(self.excluded_config_path):
             try:
                 with open(self.excluded_config_path, 'r', encoding='utf-8') as f:
-                    self.excluded_folders = json.load(f)
+                    # Older configs stored every expanded subfolder; keep only the top-level rules
+                    self.excluded_folders = compact_exclusion_rules(json.load(f))
                 self.log(f"已加载排除文件夹配置，共 {len(self.excluded_folders)} 个排除项")
             except Exception as e:
                 # messagebox on main thread during init is fine
@@ -271,6 +432,14 @@ class FolderComparisonTool:
         ttk.Checkbutton(options_frame, text="忽略空白", variable=self.ignore_whitespace, style='Custom.TCheckbutton').pack(anchor=tk.W, pady=1)
         self.ignore_case = tk.BooleanVar(value=False)
         ttk.Checkbutton(options_frame, text="忽略大小写", variable=self.ignore_case, style='Custom.TCheckbutton').pack(anchor=tk.W, pady=1)
+        self.ignore_line_endings = tk.BooleanVar(value=True)
+        ttk.Checkbutton(options_frame, text="忽略换行符 (CRLF/LF)", variable=self.ignore_line_endings, style='Custom.TCheckbutton').pack(anchor=tk.W, pady=1)
+        self.lazy_reports = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="按需渲染差异报告（只保存压缩差异数据，打开时再渲染）", variable=self.lazy_reports, style='Custom.TCheckbutton').pack(anchor=tk.W, pady=1)
+        self.byte_compare = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="逐块比较（发现差异立即停止，不计算哈希）", variable=self.byte_compare, style='Custom.TCheckbutton').pack(anchor=tk.W, pady=1)
+        self.verbose_log = tk.BooleanVar(value=True)
+        ttk.Checkbutton(options_frame, text="详细日志（记录每个差异、删除和排除的文件）", variable=self.verbose_log, style='Custom.TCheckbutton').pack(anchor=tk.W, pady=1)
         
         control_frame = ttk.Frame(main_frame, padding="2")
         control_frame.pack(fill=tk.X, pady=2)
@@ -308,6 +477,7 @@ class FolderComparisonTool:
         self.log_frame = ttk.Frame(result_notebook)
         result_notebook.add(self.log_frame, text="操作日志")
         
+        self.result_lists = {}
         self.create_file_list(self.modified_frame, "modified")
         self.create_file_list(self.added_frame, "added")
         self.create_file_list(self.deleted_frame, "deleted")
@@ -329,9 +499,9 @@ class FolderComparisonTool:
         
         tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
-        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=tree.yview)
-        tree.configure(yscroll=scrollbar.set)
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.result_lists[file_type] = VirtualFileList(tree, scrollbar)
         
         if file_type == "modified":
             self.modified_tree = tree
@@ -405,13 +575,6 @@ class FolderComparisonTool:
             self.output_dir_combobox['values'] = self.output_dir_history
             self.save_config()
 
-    def get_all_subfolders(self, base_dir, root_folder):
-        all_folders = []
-        for root, dirs, _ in os.walk(os.path.join(base_dir, root_folder)):
-            rel_path = os.path.relpath(root, base_dir)
-            all_folders.append(rel_path)
-        return all_folders
-
     def add_excluded_folder(self):
         if not self.dir_a.get() or not self.dir_b.get():
             messagebox.showerror("错误", "请先选择要比较的两个文件夹")
@@ -466,19 +629,9 @@ class FolderComparisonTool:
                 dialog.destroy()
                 return
             
-            folders_to_exclude = set()
-            
-            for i in selected_indices:
-                folder = listbox.get(i)
-                a_subfolders = self.get_all_subfolders(dir_a, folder)
-                b_subfolders = self.get_all_subfolders(dir_b, folder)
-                
-                for subfolder in a_subfolders + b_subfolders:
-                    folders_to_exclude.add(subfolder)
-            
-            for folder in folders_to_exclude:
-                if folder not in self.excluded_folders:
-                    self.excluded_folders.append(folder)
+            # A folder rule covers all of its subfolders, so only the selections are stored
+            folders_to_exclude = [listbox.get(i) for i in selected_indices]
+            self.excluded_folders = compact_exclusion_rules(self.excluded_folders + folders_to_exclude)
             
             self.refresh_excluded_listbox()
             self.save_excluded_folders()
@@ -523,1191 +676,72 @@ class FolderComparisonTool:
             messagebox.showinfo("成功", "已清空所有排除文件夹")
 
     def stop_comparison(self):
-        self.stop_flag = True
+        if self.engine:
+            self.engine.stop()
         self.stop_button.config(state=tk.DISABLED)
         self.update_status("正在停止对比...")
         self.log("用户请求停止对比")
 
-    def detect_encoding(self, file_path):
-        try:
-            with open(file_path, 'rb') as f:
-                raw_data = f.read(8192)
-                result = chardet.detect(raw_data)
-                confidence = result.get('confidence', 0)
-                encoding = result.get('encoding', 'utf-8')
-                return encoding
-        except:
-            return 'utf-8'
-    
-    # --- Optimization: Fast Check for Text Files ---
-    def is_text_file(self, file_path):
-        # Read the first 1KB and check for null bytes to detect binary
-        try:
-            with open(file_path, 'rb') as f:
-                chunk = f.read(1024)
-                if b'\x00' in chunk:
-                    return False
-                return True
-        except:
-            return False
-
-    # --- Optimization: Improved Reading ---
-    def read_file_content(self, file_path):
-        # List of common encodings to try before expensive detection
-        encodings = ['utf-8', 'gb18030', 'gbk', 'utf-16', 'latin-1']
-        raw = b''
-        
-        try:
-            with open(file_path, 'rb') as f:
-                raw = f.read()
-        except Exception as e:
-            self.log(f"读取文件失败: {file_path} - {e}")
-            return ""
-
-        # Try common encodings first (Fast)
-        for enc in encodings:
-            try:
-                return raw.decode(enc)
-            except UnicodeDecodeError:
-                continue
-        
-        # Fallback to Chardet (Slow)
-        try:
-            detected = chardet.detect(raw[:10000])
-            if detected['encoding']:
-                return raw.decode(detected['encoding'], errors='replace')
-        except:
-            pass
-            
-        return raw.decode('utf-8', errors='ignore')
-
-    # --- Optimization: Hash-Based Comparison (No Memory Load) ---
-    def _calculate_file_hash(self, filepath, block_size=65536):
-        sha256 = hashlib.sha256()
-        try:
-            with open(filepath, 'rb') as f:
-                for block in iter(lambda: f.read(block_size), b''):
-                    sha256.update(block)
-            return sha256.hexdigest()
-        except:
-            return ""
-
-    def compare_files(self, file_a, file_b):
-        try:
-            if self.stop_flag:
-                return False
-            
-            # 1. Size Check
-            size_a = os.path.getsize(file_a)
-            size_b = os.path.getsize(file_b)
-            
-            # If not strict mode, different size = different file (Instant)
-            if size_a != size_b and not getattr(self, 'strict_mode', False):
-                self.log(f"差异(大小): {os.path.basename(file_a)}")
-                return False
-            
-            # 2. Hash Check (Streaming, Memory Efficient)
-            hash_a = self._calculate_file_hash(file_a)
-            hash_b = self._calculate_file_hash(file_b)
-            
-            if hash_a == hash_b:
-                return True
-            else:
-                self.log(f"差异(内容): {os.path.basename(file_a)}")
-                return False
-                
-        except Exception as e:
-            self.log(f"比较文件时出错: {os.path.basename(file_a)} - {str(e)}")
-            return False
-
-    def is_excluded(self, rel_path):
-        if not rel_path:
-            return False
-        
-        for excluded_folder in self.excluded_folders:
-            if rel_path.startswith(excluded_folder + os.path.sep) or rel_path == excluded_folder:
-                return True
-        return False
-
-    def _parse_diff_header(self, header_line):
-        pattern = r'@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@'
-        match = re.match(pattern, header_line.strip())
-        if not match:
-            return None
-        
-        start_a = int(match.group(1))
-        count_a = int(match.group(2)) if match.group(2) else 1
-        start_b = int(match.group(3))
-        count_b = int(match.group(4)) if match.group(4) else 1
-        
-        return {
-            'start_a': start_a,
-            'count_a': count_a,
-            'start_b': start_b,
-            'count_b': count_b
-        }
-
-    def _parse_diff_lines(self, diff_lines):
-        skip_lines = 0
-        for i, line in enumerate(diff_lines):
-            if line.startswith(('---', '+++')):
-                skip_lines += 1
-            else:
-                break
-        diff_lines = diff_lines[skip_lines:]
-
-        parsed_lines = []
-        core_diff_indices = []
-        current_line_num_a = 0
-        current_line_num_b = 0
-        header_info = None
-
-        for line_idx, line in enumerate(diff_lines):
-            line_type = line[0] if line.strip() else ''
-            parsed_line = {
-                'line': line,
-                'line_idx': line_idx,
-                'line_type': line_type,
-                'num_a': None,
-                'num_b': None,
-                'is_core_diff': False,
-                'content': line[1:].rstrip('\n') if line_type in ('-', '+') else ''
-            }
-
-            if line.startswith('@@'):
-                header_info = self._parse_diff_header(line)
-                if header_info:
-                    current_line_num_a = header_info['start_a']
-                    current_line_num_b = header_info['start_b']
-                parsed_lines.append(parsed_line)
-                continue
-
-            if header_info:
-                if line_type == '-':
-                    parsed_line['is_core_diff'] = True
-                    parsed_line['num_a'] = current_line_num_a
-                    current_line_num_a += 1
-                    core_diff_indices.append(line_idx)
-                elif line_type == '+':
-                    parsed_line['is_core_diff'] = True
-                    parsed_line['num_b'] = current_line_num_b
-                    current_line_num_b += 1
-                    core_diff_indices.append(line_idx)
-                elif line_type == ' ':
-                    parsed_line['num_a'] = current_line_num_a
-                    parsed_line['num_b'] = current_line_num_b
-                    current_line_num_a += 1
-                    current_line_num_b += 1
-                elif line_type == '?':
-                    pass
-
-            parsed_lines.append(parsed_line)
-        
-        return parsed_lines, core_diff_indices
-
-    def _merge_contiguous_core_indices(self, core_diff_indices):
-        if not core_diff_indices:
-            return []
-        merged_blocks = []
-        current_block = [core_diff_indices[0]]
-        for idx in core_diff_indices[1:]:
-            if idx == current_block[-1] + 1:
-                current_block.append(idx)
-            else:
-                merged_blocks.append(current_block)
-                current_block = [idx]
-        merged_blocks.append(current_block)
-        return merged_blocks
-
-    def _group_diff_fragments_with_context(self, diff_lines, context_lines=3):
-        parsed_lines, core_diff_indices = self._parse_diff_lines(diff_lines)
-        
-        merged_core_blocks = self._merge_contiguous_core_indices(core_diff_indices)
-        fragments = []
-        processed_core_indices = set()
-
-        for core_block in merged_core_blocks:
-            block_start = core_block[0]
-            block_end = core_block[-1]
-            start_idx = max(0, block_start - context_lines)
-            end_idx = min(len(parsed_lines) - 1, block_end + context_lines)
-            
-            for idx in core_block:
-                processed_core_indices.add(idx)
-
-            fragment_lines = []
-            fragment_line_nums = []
-            original_core_diff = []
-            modified_core_diff = []
-
-            for idx in range(start_idx, end_idx + 1):
-                p_line = parsed_lines[idx]
-                fragment_lines.append(p_line['line'])
-                fragment_line_nums.append((p_line['num_a'], p_line['num_b']))
-                
-                if p_line['is_core_diff']:
-                    if p_line['line_type'] == '-':
-                        original_core_diff.append(p_line['content'])
-                    elif p_line['line_type'] == '+':
-                        modified_core_diff.append(p_line['content'])
-
-            fragments.append({
-                'type': 'changed',
-                'lines': fragment_lines,
-                'line_numbers': fragment_line_nums,
-                'core_indices': core_block,
-                'original_core_diff': original_core_diff,
-                'modified_core_diff': modified_core_diff,
-                'parsed_lines': parsed_lines[start_idx:end_idx+1]
-            })
-
-        if not fragments:
-            fragments = [{
-                'type': 'context',
-                'lines': diff_lines,
-                'line_numbers': [(None, None)] * len(diff_lines),
-                'core_indices': [],
-                'original_core_diff': [],
-                'modified_core_diff': [],
-                'parsed_lines': parsed_lines
-            }]
-
-        return fragments
-
-    def _escape_html(self, text):
-        return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;').replace("'", '&#39;')
-
-    def _build_diff_html(self, diff_lines, file_a, file_b):
-        fragments = self._group_diff_fragments_with_context(diff_lines, context_lines=3)
-        
-        html_header = f"""<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>文件差异对比: {os.path.basename(file_a)} vs {os.path.basename(file_b)}</title>
-    <style>
-        body {{
-            font-family: 'Consolas', 'Microsoft YaHei', monospace;
-            margin: 20px;
-            background-color: #f5f5f5;
-            overflow-x: auto;
-            font-size: 14px;
-        }}
-        .diff-container {{
-            max-width: 100%;
-            margin: 0 auto;
-            background-color: white;
-            border-radius: 8px;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-            overflow: hidden;
-        }}
-        .diff-header {{
-            background-color: #2c3e50;
-            color: white;
-            padding: 15px;
-            font-size: 16px;
-            font-weight: bold;
-            white-space: nowrap;
-        }}
-        .control-bar {{
-            padding: 10px 15px;
-            background-color: #f1f1f1;
-            display: flex;
-            align-items: center;
-            gap: 15px;
-            flex-wrap: wrap;
-        }}
-        .control-btn {{
-            padding: 6px 12px;
-            border: none;
-            border-radius: 4px;
-            background-color: #3498db;
-            color: white;
-            cursor: pointer;
-            transition: background-color 0.2s;
-            font-size: 12px;
-        }}
-        .control-btn.active {{
-            background-color: #2980b9;
-        }}
-        .control-btn:hover {{
-            background-color: #2980b9;
-        }}
-        .legend {{
-            display: flex;
-            gap: 15px;
-            font-size: 14px;
-        }}
-        .legend-item {{
-            display: flex;
-            align-items: center;
-            gap: 5px;
-        }}
-        .legend-item.deleted {{
-            color: #c0392b;
-        }}
-        .legend-item.added {{
-            color: #27ae60;
-        }}
-        .legend-item.changed {{
-            color: #f39c12;
-        }}
-        .legend-item.reference {{
-            color: #7f8c8d;
-        }}
-        .file-info {{
-            margin: 10px 15px;
-            padding: 10px;
-            background-color: #f8f9fa;
-            border-radius: 4px;
-            white-space: nowrap;
-            overflow-x: auto;
-        }}
-        .diff-fragment {{
-            margin: 10px 15px;
-            border-radius: 4px;
-            overflow: hidden;
-            box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-        }}
-        .fragment-header {{
-            padding: 8px 12px;
-            background-color: #34495e;
-            color: white;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-        }}
-        .fragment-title {{
-            font-weight: bold;
-        }}
-        .fragment-reference {{
-            font-size: 12px;
-            color: #bdc3c7;
-        }}
-        .diff-fragment-deleted {{
-            border-left: 4px solid #c0392b;
-        }}
-        .diff-fragment-added {{
-            border-left: 4px solid #27ae60;
-        }}
-        .diff-fragment-changed {{
-            border-left: 4px solid #f39c12;
-        }}
-        .diff-fragment-context {{
-            border-left: 4px solid #bdc3c7;
-            background-color: #f8f9fa;
-        }}
-        .copy-fragment-btn {{
-            padding: 4px 8px;
-            font-size: 12px;
-            background-color: #3498db;
-            color: white;
-            border: none;
-            border-radius: 4px;
-            cursor: pointer;
-            margin-left: 5px;
-        }}
-        .copy-fragment-btn:hover {{
-            background-color: #2980b9;
-        }}
-        .fragment-table {{
-            width: 100%;
-            border-collapse: collapse;
-            font-size: 14px;
-            table-layout: fixed;
-        }}
-        .fragment-table th {{
-            background-color: #34495e;
-            color: white;
-            padding: 10px;
-            text-align: left;
-            position: sticky;
-            top: 0;
-            white-space: nowrap;
-        }}
-        .fragment-table td {{
-            padding: 8px 10px;
-            vertical-align: middle;
-            position: relative;
-            border-bottom: 1px solid #eee;
-            min-height: 32px;
-            box-sizing: border-box;
-            line-height: 1.5;
-        }}
-        .col-line-num {{
-            width: 60px !important;
-            min-width: 60px !important;
-            max-width: 60px !important;
-        }}
-        .col-content {{
-            width: calc(50% - 60px) !important;
-            min-width: calc(50% - 60px) !important;
-            padding-right: 40px !important;
-        }}
-        .line-num {{
-            text-align: right;
-            color: #7f8c8d;
-            background-color: rgba(0,0,0,0.05);
-            font-family: monospace;
-            white-space: nowrap;
-            padding: 0 5px;
-            vertical-align: middle;
-        }}
-        .content {{
-            word-wrap: break-word;
-            white-space: pre-wrap;
-            font-family: 'Consolas', monospace;
-            line-height: 1.5;
-            overflow-wrap: break-word;
-            min-height: 24px;
-        }}
-        .content del {{
-            background-color: #ffcccc;
-            color: #c0392b;
-            text-decoration: none;
-        }}
-        .content ins {{
-            background-color: #ccffcc;
-            color: #27ae60;
-            text-decoration: none;
-        }}
-        .reference-line {{
-            background-color: #f8f9fa;
-            color: #7f8c8d;
-        }}
-        .reference-line .content {{
-            color: #7f8c8d;
-        }}
-        .diff-line {{
-            background-color: rgba(243, 156, 18, 0.1);
-        }}
-        .delete-line {{
-            background-color: rgba(192, 57, 43, 0.1);
-        }}
-        .add-line {{
-            background-color: rgba(39, 174, 96, 0.1);
-        }}
-        .copy-btn {{
-            position: absolute;
-            right: 8px;
-            top: 50%;
-            transform: translateY(-50%);
-            padding: 4px 8px;
-            font-size: 12px;
-            background-color: #3498db;
-            color: white;
-            border: none;
-            border-radius: 4px;
-            cursor: pointer;
-            opacity: 0;
-            transition: opacity 0.2s;
-            height: 24px;
-            line-height: 16px;
-        }}
-        .diff-row:hover .copy-btn {{
-            opacity: 1;
-        }}
-        .copy-btn:hover {{
-            background-color: #2980b9;
-        }}
-        .copy-toast {{
-            position: fixed;
-            bottom: 20px;
-            right: 20px;
-            padding: 10px 20px;
-            background-color: #2ecc71;
-            color: white;
-            border-radius: 4px;
-            opacity: 0;
-            transition: opacity 0.3s;
-            pointer-events: none;
-            z-index: 100;
-        }}
-        .diff-content {{
-            overflow-x: auto;
-        }}
-        .content:empty {{
-            min-height: 24px;
-            display: inline-block;
-            width: 100%;
-        }}
-    </style>
-</head>
-<body>
-    <div class="diff-container">
-        <div class="diff-header">文件差异对比</div>
-        <div class="control-bar">
-            <button id="showAllBtn" class="control-btn active" onclick="toggleDisplay('all')">全部显示</button>
-            <button id="showDiffBtn" class="control-btn" onclick="toggleDisplay('diff')">只显示差异</button>
-            <div class="legend">
-                <span class="legend-item deleted">🟥 已删除</span>
-                <span class="legend-item added">🟩 已新增</span>
-                <span class="legend-item changed">🟨 已修改</span>
-                <span class="legend-item reference">⬜ 参考代码</span>
-            </div>
-        </div>
-        <div class="file-info">
-            <div><strong>原始文件:</strong> {self._escape_html(file_a)}</div>
-            <div><strong>修改文件:</strong> {self._escape_html(file_b)}</div>
-            <div><strong>对比时间:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</div>
-        </div>
-        <div class="diff-content">"""
-
-        html_fragments = []
-        for fragment_idx, fragment in enumerate(fragments):
-            frag_type = fragment['type']
-            frag_lines = fragment['lines']
-            line_numbers = fragment['line_numbers']
-            fragment_parsed_lines = fragment['parsed_lines']
-            
-            min_a = max_a = min_b = max_b = None
-            for num_a, num_b in line_numbers:
-                if num_a is not None:
-                    min_a = num_a if min_a is None else min(min_a, num_a)
-                    max_a = num_a if max_a is None else max(max_a, num_a)
-                if num_b is not None:
-                    min_b = num_b if min_b is None else min(min_b, num_b)
-                    max_b = num_b if max_b is None else max(max_b, num_b)
-            
-            frag_html = f'<div class="diff-fragment diff-fragment-{frag_type}" data-type="{frag_type}">'
-            range_text = ""
-            if min_a and max_a and min_b and max_b:
-                range_text = f"（源文件：{min_a}-{max_a} | 修改文件：{min_b}-{max_b}）"
-            elif min_a and max_a:
-                range_text = f"（源文件：{min_a}-{max_a}）"
-            elif min_b and max_b:
-                range_text = f"（修改文件：{min_b}-{max_b}）"
-            
-            original_core_json = json.dumps(fragment['original_core_diff'], ensure_ascii=False).replace('"', '\\"')
-            modified_core_json = json.dumps(fragment['modified_core_diff'], ensure_ascii=False).replace('"', '\\"')
-            
-            if frag_type == 'changed':
-                frag_html += f'''<div class="fragment-header">
-                    <div>
-                        <span class="fragment-title">差异片段 #{fragment_idx + 1}</span>
-                        <span class="fragment-reference">{range_text}</span>
-                    </div>
-                    <div>
-                        <button class="copy-fragment-btn" onclick="copyCoreDiff('{original_core_json}', 'original')">复制修改前差异</button>
-                        <button class="copy-fragment-btn" onclick="copyCoreDiff('{modified_core_json}', 'modified')">复制修改后差异</button>
-                    </div>
-                </div>'''
-            
-            frag_html += f'''<table class="fragment-table">
-                <thead>
-                    <tr>
-                        <th class="col-line-num">源文件行号</th>
-                        <th class="col-content">原始文件 ({os.path.basename(file_a)})</th>
-                        <th class="col-line-num">修改文件行号</th>
-                        <th class="col-content">修改文件 ({os.path.basename(file_b)})</th>
-                    </tr>
-                </thead>
-                <tbody>'''
-            
-            for line_idx, (line, (num_a, num_b)) in enumerate(zip(frag_lines, line_numbers)):
-                p_line = fragment_parsed_lines[line_idx] if line_idx < len(fragment_parsed_lines) else None
-                is_core_diff = p_line['is_core_diff'] if p_line else False
-                line_type = p_line['line_type'] if p_line else (line[0] if line else '')
-                
-                row_class = ''
-                if line_type == '-':
-                    row_class = 'delete-line diff-row'
-                elif line_type == '+':
-                    row_class = 'add-line diff-row'
-                elif line_type == ' ':
-                    row_class = 'reference-line diff-row'
-                elif line_type == '?':
-                    row_class = 'diff-line diff-row'
-                else:
-                    row_class = 'diff-row'
-                
-                line_content = line[1:].rstrip('\n') if len(line) > 1 else ''
-                original_line = ''
-                modified_line = ''
-                
-                if line_type == '-':
-                    original_line = self._escape_html(line_content)
-                elif line_type == '+':
-                    modified_line = self._escape_html(line_content)
-                elif line_type == ' ':
-                    original_line = self._escape_html(line_content)
-                    modified_line = self._escape_html(line_content)
-                elif line_type == '?':
-                    continue
-                
-                display_num_a = str(num_a) if num_a is not None else ''
-                display_num_b = str(num_b) if num_b is not None else ''
-                
-                frag_html += f'''<tr class="{row_class}" data-line-type="{line_type}" data-is-core="{str(is_core_diff).lower()}">
-                    <td class="line-num col-line-num">{display_num_a}</td>
-                    <td class="content col-content">{original_line}<button class="copy-btn" onclick="copyOnlyCoreLine(this)">复制</button></td>
-                    <td class="line-num col-line-num">{display_num_b}</td>
-                    <td class="content col-content">{modified_line}<button class="copy-btn" onclick="copyOnlyCoreLine(this)">复制</button></td>
-                </tr>'''
-            
-            frag_html += '''</tbody></table></div>'''
-            html_fragments.append(frag_html)
-
-        html_footer = f"""
-        </div>
-        </div>
-        
-        <div id="copyToast" class="copy-toast">复制成功！</div>
-        
-        <script>
-            async function copyCoreDiff(coreDiffJson, type) {{
-                try {{
-                    coreDiffJson = coreDiffJson.replace(/\\\\"/g, '"');
-                    const diffLines = JSON.parse(coreDiffJson || '[]');
-                    
-                    if (!diffLines.length || diffLines.every(line => line.trim() === '')) {{
-                        alert('该片段无' + (type === 'original' ? '修改前' : '修改后') + '核心差异内容！');
-                        return;
-                    }}
-
-                    const text = diffLines.join('\\n');
-                    let copySuccess = false;
-                    if (navigator.clipboard && window.isSecureContext) {{
-                        try {{
-                            await navigator.clipboard.writeText(text);
-                            copySuccess = true;
-                        }} catch (err) {{
-                            copySuccess = false;
-                        }}
-                    }}
-                    
-                    if (!copySuccess) {{
-                        const textArea = document.createElement('textarea');
-                        textArea.value = text;
-                        textArea.style.position = 'fixed';
-                        textArea.style.opacity = 0;
-                        document.body.appendChild(textArea);
-                        textArea.select();
-                        try {{
-                            document.execCommand('copy');
-                            copySuccess = true;
-                        }} catch (err) {{
-                            alert('复制失败，请手动复制：\\n' + text);
-                            return;
-                        }} finally {{
-                            document.body.removeChild(textArea);
-                        }}
-                    }}
-                    
-                    if (copySuccess) {{
-                        showToast();
-                    }}
-                }} catch (e) {{
-                    console.error('复制失败:', e);
-                    alert('复制失败：' + e.message);
-                }}
-            }}
-
-            async function copyOnlyCoreLine(btn) {{
-                try {{
-                    const row = btn.closest('tr');
-                    if (row.dataset.isCore !== 'true') {{
-                        alert('仅可复制核心差异行，参考行不支持单独复制！');
-                        return;
-                    }}
-
-                    const contentCell = btn.parentElement;
-                    const text = contentCell.textContent.replace('复制', '').trim();
-                    
-                    if (!text) {{
-                        alert('该行无内容可复制！');
-                        return;
-                    }}
-
-                    let copySuccess = false;
-                    if (navigator.clipboard && window.isSecureContext) {{
-                        try {{
-                            await navigator.clipboard.writeText(text);
-                            copySuccess = true;
-                        }} catch (err) {{
-                            copySuccess = false;
-                        }}
-                    }}
-                    
-                    if (!copySuccess) {{
-                        const textArea = document.createElement('textarea');
-                        textArea.value = text;
-                        textArea.style.position = 'fixed';
-                        textArea.style.opacity = 0;
-                        document.body.appendChild(textArea);
-                        textArea.select();
-                        try {{
-                            document.execCommand('copy');
-                            copySuccess = true;
-                        }} catch (err) {{
-                            alert('复制失败，请手动复制：\\n' + text);
-                            return;
-                        }} finally {{
-                            document.body.removeChild(textArea);
-                        }}
-                    }}
-                    
-                    if (copySuccess) {{
-                        showToast();
-                    }}
-                }} catch (e) {{
-                    console.error('单行复制失败:', e);
-                    alert('复制失败：' + e.message);
-                }}
-            }}
-
-            function showToast() {{
-                const toast = document.getElementById('copyToast');
-                toast.style.opacity = '1';
-                setTimeout(() => {{
-                    toast.style.opacity = '0';
-                }}, 2000);
-            }}
-
-            function toggleDisplay(mode) {{
-                const allBtns = document.querySelectorAll('.control-btn');
-                allBtns.forEach(btn => btn.classList.remove('active'));
-                
-                const activeBtn = document.getElementById(mode === 'all' ? 'showAllBtn' : 'showDiffBtn');
-                activeBtn.classList.add('active');
-                
-                const fragments = document.querySelectorAll('.diff-fragment');
-                fragments.forEach(fragment => {{
-                    fragment.style.display = mode === 'all' ? 'block' : (fragment.dataset.type === 'changed' ? 'block' : 'none');
-                }});
-            }}
-            
-            document.addEventListener('DOMContentLoaded', function() {{
-                toggleDisplay('all');
-            }});
-        </script>
-        </body>
-        </html>"""
-        
-        full_html = html_header + '\n'.join(html_fragments) + html_footer
-        return full_html
+    def start_comparison(self):
+        if self.is_comparing.get():
+            messagebox.showinfo("提示", "正在比较中，请等待完成或停止当前操作")
+            return
 
-    def generate_diff_reports(self, modified_files, dir_a, dir_b, reports_dir):
-        for rel_path in modified_files:
-            if self.stop_flag:
-                self.log("生成差异报告已停止")
-                return
-                
-            file_a = os.path.join(dir_a, rel_path)
-            file_b = os.path.join(dir_b, rel_path)
-            
-            try:
-                content_a = self.read_file_content(file_a)
-                content_b = self.read_file_content(file_b)
-                
-                diff_lines = list(difflib.unified_diff(
-                    content_a.splitlines(),
-                    content_b.splitlines(),
-                    fromfile=file_a,
-                    tofile=file_b,
-                    lineterm='',
-                    n=3
-                ))
-                
-                diff_html = self._build_diff_html(diff_lines, file_a, file_b)
-                
-                report_filename = f"{rel_path.replace(os.path.sep, '_')}_diff.html"
-                report_path = os.path.join(reports_dir, report_filename)
-                
-                os.makedirs(os.path.dirname(report_path), exist_ok=True)
-                
-                with open(report_path, 'w', encoding='utf-8') as f:
-                    f.write(diff_html)
-                
-                self.log(f"已生成差异报告: {report_path}")
-                
-            except Exception as e:
-                self.log(f"生成差异报告失败: {rel_path} - {str(e)}")
+        dir_a = self.dir_a.get()
+        dir_b = self.dir_b.get()
+        # A may also be a manifest / checksum file exported from an earlier baseline
+        if not os.path.isdir(dir_a) and not os.path.isfile(dir_a):
+            messagebox.showerror("错误", f"原始文件夹不存在: {dir_a}")
+            return
+        if not os.path.isdir(dir_b):
+            messagebox.showerror("错误", f"修改文件夹不存在: {dir_b}")
+            return
 
-    def generate_summary_html(self, modified_files, added_files, deleted_files, dir_a, dir_b, output_file):
-        try:
-            modified_list = ""
-            for file in modified_files:
-                report_filename = f"{file.replace(os.path.sep, '_')}_diff.html"
-                report_path = report_filename
-                modified_list += f"<li><a href='{self._escape_html(report_path)}' target='_blank'>{self._escape_html(file)}</a></li>"
-            
-            added_list = ""
-            for file in added_files:
-                added_list += f"<li>{self._escape_html(file)}</li>"
-            
-            deleted_list = ""
-            for file in deleted_files:
-                deleted_list += f"<li>{self._escape_html(file)}</li>"
-            
-            html_content = f"""<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>文件夹对比汇总报告</title>
-    <style>
-        body {{
-            font-family: 'Microsoft YaHei', sans-serif;
-            margin: 20px;
-            line-height: 1.6;
-        }}
-        .container {{
-            max-width: 1200px;
-            margin: 0 auto;
-            background: white;
-            padding: 20px;
-            border-radius: 8px;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-        }}
-        h1 {{
-            color: #2c3e50;
-            border-bottom: 2px solid #3498db;
-            padding-bottom: 10px;
-        }}
-        h2 {{
-            color: #34495e;
-            margin-top: 30px;
-        }}
-        .info-box {{
-            background: #f8f9fa;
-            padding: 15px;
-            border-radius: 4px;
-            margin: 20px 0;
-        }}
-        .file-list {{
-            list-style: none;
-            padding: 0;
-        }}
-        .file-list li {{
-            padding: 8px;
-            border-bottom: 1px solid #eee;
-        }}
-        .file-list li:hover {{
-            background: #f1f1f1;
-        }}
-        .file-list a {{
-            color: #3498db;
-            text-decoration: none;
-        }}
-        .file-list a:hover {{
-            text-decoration: underline;
-        }}
-        .summary {{
-            display: flex;
-            flex-wrap: wrap;
-            gap: 20px;
-            margin: 20px 0;
-        }}
-        .summary-item {{
-            background: #e3f2fd;
-            padding: 15px;
-            border-radius: 8px;
-            flex: 1;
-            min-width: 200px;
-            text-align: center;
-        }}
-        .summary-item h3 {{
-            margin: 0 0 10px 0;
-            color: #2c3e50;
-        }}
-        .summary-item .count {{
-            font-size: 24px;
-            font-weight: bold;
-            color: #3498db;
-        }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>文件夹对比汇总报告</h1>
-        
-        <div class="info-box">
-            <p><strong>原始文件夹:</strong> {self._escape_html(dir_a)}</p>
-            <p><strong>修改文件夹:</strong> {self._escape_html(dir_b)}</p>
-            <p><strong>对比时间:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-        </div>
-        
-        <div class="summary">
-            <div class="summary-item">
-                <h3>修改的文件</h3>
-                <div class="count">{len(modified_files)}</div>
-            </div>
-            <div class="summary-item">
-                <h3>新增的文件</h3>
-                <div class="count">{len(added_files)}</div>
-            </div>
-            <div class="summary-item">
-                <h3>删除的文件</h3>
-                <div class="count">{len(deleted_files)}</div>
-            </div>
-            <div class="summary-item">
-                <h3>总计差异</h3>
-                <div class="count">{len(modified_files) + len(added_files) + len(deleted_files)}</div>
-            </div>
-        </div>
-        
-        <h2>修改的文件 ({len(modified_files)})</h2>
-        {f"<ul class='file-list'>{modified_list}</ul>" if modified_files else "<p>无修改的文件</p>"}
-        
-        <h2>新增的文件 ({len(added_files)})</h2>
-        {f"<ul class='file-list'>{added_list}</ul>" if added_files else "<p>无新增的文件</p>"}
-        
-        <h2>删除的文件 ({len(deleted_files)})</h2>
-        {f"<ul class='file-list'>{deleted_list}</ul>" if deleted_files else "<p>无删除的文件</p>"}
-    </div>
-</body>
-</html>"""
-            
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(html_content)
-            
-            self.log(f"已生成汇总报告: {output_file}")
-            
-        except Exception as e:
-            self.log(f"生成汇总报告失败: {str(e)}")
+        strict_mode = messagebox.askyesno(
+            "严格模式", 
+            "是否启用严格模式？\n\n严格模式会在文件大小不同时仍然比较内容，可能会增加比较时间，但可以避免因编码不同导致的误判。"
+        )
+
+        options = ComparisonOptions(
+            excluded_folders=self.excluded_folders,
+            strict_mode=strict_mode,
+            ignore_whitespace=self.ignore_whitespace.get(),
+            ignore_case=self.ignore_case.get(),
+            ignore_line_endings=self.ignore_line_endings.get(),
+            compare_mode='bytes' if self.byte_compare.get() else 'hash',
+            report_mode='lazy' if self.lazy_reports.get() else 'html',
+            log_level='debug' if self.verbose_log.get() else 'info',
+        )
+        # The engine reports through the same queue messages the GUI already handles
+        self.engine = ComparisonEngine(dir_a, dir_b, self.output_dir.get(), options,
+                                       emit=lambda msg_type, data: self._post((msg_type, data)))
+
+        self.is_comparing.set(True)
+        self.compare_button.config(state=tk.DISABLED)
+        self.stop_button.config(state=tk.NORMAL)
+        self.open_result_button.config(state=tk.DISABLED)
+        self.open_summary_button.config(state=tk.DISABLED)
+        self._post(('tree_clear', None))
+            
+        comparison_thread = threading.Thread(target=self.compare_directories, args=(self.engine,))
+        comparison_thread.daemon = True
+        comparison_thread.start()
 
-    def compare_directories(self):
+    def compare_directories(self, engine):
+        """Background thread body: run the engine and report back through the queue."""
+        summary_text = None
         try:
-            self.is_comparing.set(True)
-            self.stop_flag = False
-            self.compare_button.config(state=tk.DISABLED)
-            self.stop_button.config(state=tk.NORMAL)
-            self.open_result_button.config(state=tk.DISABLED)
-            self.open_summary_button.config(state=tk.DISABLED)
-            
-            # --- Optimization: Send clear signal via queue ---
-            self.gui_queue.put(('tree_clear', None))
-            # -------------------------------------------------
-            
-            dir_a = self.dir_a.get()
-            dir_b = self.dir_b.get()
-            output_dir = self.output_dir.get()
-            
-            if not os.path.isdir(dir_a):
-                messagebox.showerror("错误", f"原始文件夹不存在: {dir_a}")
-                return
-            if not os.path.isdir(dir_b):
-                messagebox.showerror("错误", f"修改文件夹不存在: {dir_b}")
-                return
-            
-            if self.excluded_folders:
-                self.log("排除的文件夹:")
-                for folder in self.excluded_folders:
-                    self.log(f"  - {folder}")
-            else:
-                self.log("未排除任何文件夹")
-            
-            self.strict_mode = messagebox.askyesno(
-                "严格模式", 
-                "是否启用严格模式？\n\n严格模式会在文件大小不同时仍然比较内容，可能会增加比较时间，但可以避免因编码不同导致的误判。"
-            )
-            
-            self.log(f"{'启用' if self.strict_mode else '未启用'}严格模式")
-            
-            os.makedirs(output_dir, exist_ok=True)
-            reports_dir = os.path.join(output_dir, "报告")
-            modified_files_dir = os.path.join(output_dir, "修改文件")
-            added_files_dir = os.path.join(output_dir, "新增文件")
-            deleted_files_dir = os.path.join(output_dir, "删除文件")
-            
-            os.makedirs(reports_dir, exist_ok=True)
-            os.makedirs(modified_files_dir, exist_ok=True)
-            os.makedirs(added_files_dir, exist_ok=True)
-            os.makedirs(deleted_files_dir, exist_ok=True)
-            
-            self.log(f"开始比较文件夹: {dir_a} 和 {dir_b}")
-            self.log(f"结果将保存到: {output_dir}")
-            
-            self.log("正在扫描原始文件夹...")
-            text_files_a = {}
-            total_files_a = 0
-            processed_files = 0
-            
-            for root, _, files in os.walk(dir_a):
-                if self.stop_flag:
-                    self.log("扫描原始文件夹已停止")
-                    break
-                
-                for file in files:
-                    if self.stop_flag:
-                        break
-                    
-                    file_path = os.path.join(root, file)
-                    rel_path = os.path.relpath(file_path, dir_a)
-                    
-                    if self.is_excluded(rel_path):
-                        self.log(f"跳过排除的文件: {rel_path}")
-                        continue
-                    
-                    # --- Optimization: Check file type fast ---
-                    if self.is_text_file(file_path):
-                        text_files_a[rel_path] = file_path
-                        # self.log(f"发现文本文件: {rel_path}") # Removed for speed
-                        total_files_a += 1
-                    # else:
-                        # self.log(f"跳过非文本文件: {rel_path}") # Removed for speed
-            
-            if self.stop_flag:
-                self.log("对比操作已停止")
-                return
-            
-            self.log(f"在原始文件夹中发现 {total_files_a} 个文本文件")
-            
-            self.log("正在扫描修改文件夹并比较...")
-            modified_files = []
-            added_files = []
-            
-            for root, _, files in os.walk(dir_b):
-                if self.stop_flag:
-                    self.log("扫描修改文件夹已停止")
-                    break
-                
-                for file in files:
-                    if self.stop_flag:
-                        break
-                    
-                    file_path = os.path.join(root, file)
-                    rel_path = os.path.relpath(file_path, dir_b)
-                    
-                    processed_files += 1
-                    # Update progress only every 10 files to save GUI calls
-                    if processed_files % 10 == 0:
-                        progress = (processed_files / max(total_files_a, 1)) * 100
-                        self.update_status(f"正在比较: {processed_files}/{max(total_files_a, 1)}", progress)
-                    
-                    if self.is_excluded(rel_path):
-                        continue
-                    
-                    if self.is_text_file(file_path):
-                        if rel_path in text_files_a:
-                            original_file = text_files_a[rel_path]
-                            if not self.compare_files(original_file, file_path):
-                                modified_files.append(rel_path)
-                                # Send directly to queue for display
-                                self.gui_queue.put(('tree_insert', ('modified', (rel_path, "修改"))))
-                        else:
-                            added_files.append(rel_path)
-                            self.gui_queue.put(('tree_insert', ('added', (rel_path, "新增"))))
-            
-            self.log("正在检测删除文件...")
-            deleted_files = []
-            processed_deleted = 0
-            
-            for rel_path in text_files_a.keys():
-                if self.stop_flag:
-                    break
-                
-                processed_deleted += 1
-                if processed_deleted % 10 == 0:
-                    progress = (processed_deleted / len(text_files_a)) * 100
-                    self.update_status(f"检测删除文件: {processed_deleted}/{len(text_files_a)}", progress)
-                
-                if self.is_excluded(rel_path):
-                    continue
-                
-                file_b_path = os.path.join(dir_b, rel_path)
-                if not os.path.exists(file_b_path):
-                    deleted_files.append(rel_path)
-                    self.log(f"发现删除文件: {rel_path}")
-                    self.gui_queue.put(('tree_insert', ('deleted', (rel_path, "删除"))))
-            
-            if self.stop_flag:
-                self.log("对比操作已停止")
-                return
-            
-            self.modified_files = modified_files
-            self.added_files = added_files
-            self.deleted_files = deleted_files
-            
-            self.log(f"比较完成: 发现 {len(modified_files)} 个修改的文件，{len(added_files)} 个新增的文件，{len(deleted_files)} 个删除的文件")
-            
-            if modified_files:
-                self.log("正在生成差异报告...")
-                self.generate_diff_reports(modified_files, dir_a, dir_b, reports_dir)
-            
-            if modified_files or added_files or deleted_files:
-                self.log("正在复制差异文件...")
-                self.copy_modified_files(modified_files, dir_a, dir_b, modified_files_dir)
-                self.copy_added_files(added_files, dir_b, added_files_dir)
-                self.copy_deleted_files(deleted_files, dir_a, deleted_files_dir)
-            
-            self.log("正在生成汇总报告...")
-            summary_file = os.path.join(reports_dir, "汇总报告.html")
-            self.generate_summary_html(modified_files, added_files, deleted_files, dir_a, dir_b, summary_file)
-            
-            self.log("比较完成!")
-            self.update_status("比较完成", 100)
-            
-            summary_text = f"比较完成!\n发现 {len(modified_files)} 个修改的文件、{len(added_files)} 个新增的文件、{len(deleted_files)} 个删除的文件"
-            self.gui_queue.put(('completion', summary_text))
-            
+            if engine.compare_directories():
+                self.modified_files = engine.modified_files
+                self.added_files = engine.added_files
+                self.deleted_files = engine.deleted_files
+                summary_text = engine.summary_text()
         except Exception as e:
             self.log(f"比较文件夹时发生错误: {str(e)}")
-            self.gui_queue.put(('status', (f"错误: {str(e)}", 0)))
+            self._post(('status', (f"错误: {str(e)}", 0)))
         finally:
-            pass # Cleanup handled in queue processor based on flags
-
-    def copy_modified_files(self, modified_files, dir_a, dir_b, target_dir):
-        try:
-            for rel_path in modified_files:
-                if self.stop_flag:
-                    return
-                    
-                src_a = os.path.join(dir_a, rel_path)
-                src_b = os.path.join(dir_b, rel_path)
-                
-                dest_a = os.path.join(target_dir, "原始文件", rel_path)
-                dest_b = os.path.join(target_dir, "修改文件", rel_path)
-                
-                os.makedirs(os.path.dirname(dest_a), exist_ok=True)
-                os.makedirs(os.path.dirname(dest_b), exist_ok=True)
-                
-                shutil.copy2(src_a, dest_a)
-                shutil.copy2(src_b, dest_b)
-                
-        except Exception as e:
-            self.log(f"复制修改文件失败: {str(e)}")
-
-    def copy_added_files(self, added_files, dir_b, target_dir):
-        try:
-            for rel_path in added_files:
-                if self.stop_flag:
-                    return
-                    
-                src = os.path.join(dir_b, rel_path)
-                dest = os.path.join(target_dir, rel_path)
-                
-                os.makedirs(os.path.dirname(dest), exist_ok=True)
-                shutil.copy2(src, dest)
-                
-        except Exception as e:
-            self.log(f"复制新增文件失败: {str(e)}")
-
-    def copy_deleted_files(self, deleted_files, dir_a, target_dir):
-        try:
-            for rel_path in deleted_files:
-                if self.stop_flag:
-                    return
-                    
-                src = os.path.join(dir_a, rel_path)
-                dest = os.path.join(target_dir, rel_path)
-                
-                os.makedirs(os.path.dirname(dest), exist_ok=True)
-                shutil.copy2(src, dest)
-                
-        except Exception as e:
-            self.log(f"复制删除文件失败: {str(e)}")
-
-    def start_comparison(self):
-        if self.is_comparing.get():
-            messagebox.showinfo("提示", "正在比较中，请等待完成或停止当前操作")
-            return
-            
-        comparison_thread = threading.Thread(target=self.compare_directories)
-        comparison_thread.daemon = True
-        comparison_thread.start()
+            # Buttons are re-enabled on the main thread; no dialog when stopped or failed
+            self._post(('completion', summary_text))
 
     def on_modified_file_double_click(self, event):
         try:
@@ -1723,37 +757,51 @@ class FolderComparisonTool:
                 messagebox.showwarning("警告", "文件不存在，无法打开")
                 return
                 
-            temp_dir = os.path.join(self.output_dir.get(), "临时报告")
-            os.makedirs(temp_dir, exist_ok=True)
-            temp_report = os.path.join(temp_dir, f"{rel_path.replace(os.path.sep, '_')}_temp_diff.html")
-            
-            content_a = self.read_file_content(file_a)
-            content_b = self.read_file_content(file_b)
-            
-            diff_lines = list(difflib.unified_diff(
-                content_a.splitlines(),
-                content_b.splitlines(),
-                fromfile=file_a,
-                tofile=file_b,
-                lineterm='',
-                n=3
-            ))
-            
-            diff_html = self._build_diff_html(diff_lines, file_a, file_b)
-            
-            with open(temp_report, 'w', encoding='utf-8') as f:
-                f.write(diff_html)
+            # --- Optimization: Reuse Rendered Views ---
+            index, temp_cache = self._get_report_views(self.output_dir.get())
+            existing = index.find(rel_path, file_a, file_b) if index is not None else None
+            if existing:
+                webbrowser.open(existing)
+                self.log(f"已打开差异报告: {existing}")
+                return
+
+            def render(temp_report):
+                content_a = read_file_content(file_a)
+                content_b = read_file_content(file_b)
+                diff = report.compute_diff(content_a, content_b, file_a, file_b)
+                report.write_diff_html(temp_report, diff.lines, file_a, file_b, coarse=diff.coarse)
+
+            report.write_report_assets(temp_cache.temp_dir)
+            temp_report, hit = temp_cache.get_or_render(rel_path, file_a, file_b, render)
             
             webbrowser.open(temp_report)
-            self.log(f"已打开临时差异报告: {temp_report}")
+            if hit:
+                self.log(f"已打开缓存的临时差异报告: {temp_report}")
+            else:
+                self.log(f"已打开临时差异报告: {temp_report}")
             
         except Exception as e:
             self.log(f"打开修改文件差异报告失败: {str(e)}")
             messagebox.showerror("错误", f"打开文件失败: {str(e)}")
 
+    def _get_report_views(self, output_dir):
+        if output_dir not in self._report_views:
+            if archive_format(output_dir):
+                # Reports of an archive output cannot be opened in place; views are rendered into a
+                # local temp folder (the cache key includes both files' absolute paths)
+                self._report_views[output_dir] = (
+                    None, views.TempReportCache(os.path.join(tempfile.gettempdir(), "folder-eye-临时报告")))
+            else:
+                self._report_views[output_dir] = (views.ReportIndex(os.path.join(output_dir, "报告")),
+                                                  views.TempReportCache(os.path.join(output_dir, "临时报告")))
+        return self._report_views[output_dir]
+
     def open_result_dir(self):
         try:
             output_dir = self.output_dir.get()
+            if archive_format(output_dir) and os.path.isfile(output_dir):
+                # An archive output is a single file; open the folder that contains it
+                output_dir = os.path.dirname(os.path.abspath(output_dir))
             if os.path.exists(output_dir):
                 if sys.platform == "win32":
                     os.startfile(output_dir)
@@ -1769,6 +817,9 @@ class FolderComparisonTool:
             messagebox.showerror("错误", f"打开文件夹失败: {str(e)}")
 
     def open_summary_report(self):
+        if archive_format(self.output_dir.get()):
+            messagebox.showinfo("提示", f"结果已写入压缩包，请解压后打开 报告/汇总报告.html:\n{self.output_dir.get()}")
+            return
         try:
             summary_file = os.path.join(self.output_dir.get(), "报告", "汇总报告.html")
             if os.path.exists(summary_file):
@@ -1782,6 +833,8 @@ class FolderComparisonTool:
 
 
 if __name__ == "__main__":
+    # Diff reports are rendered in spawned worker processes; required for frozen builds
+    multiprocessing.freeze_support()
     try:
         root = tk.Tk()
         app = FolderComparisonTool(root)
@@ -1796,4 +849,4 @@ if __name__ == "__main__":
         
     except Exception as e:
         print(f"程序启动失败: {str(e)}")
-        input("按回车键退出...")
+        input("按回车键退出...")
@@ -0,0 +1,232 @@
+"""Single-file result archives for Folder-Eye.
+
+When the output path ends in .tar.zst, .tar.gz or .zip, the result is written
+as one archive instead of a folder tree. Its layout is the one the folder
+would have had: 报告/, 修改文件/原始文件/, 修改文件/修改文件/, 新增文件/, 删除文件/.
+
+Entries are appended by one writer thread, in the order they are produced.
+Archived originals and targets are streamed straight from the compared trees.
+Diff reports pass through a local work folder, because the report processes
+write files; each one is appended and deleted as soon as it is done. Producers
+block when the queue is full, or when the bytes queued in memory exceed the
+buffer budget, so memory stays bounded however fast the comparison runs.
+
+.tar.zst needs the optional ``zstandard`` package.
+"""
+import io
+import os
+import time
+import gzip
+import queue
+import tarfile
+import zipfile
+import threading
+
+try:
+    import zstandard  # Optional: .tar.zst output
+except ImportError:
+    zstandard = None
+
+ARCHIVE_FORMATS = {
+    '.tar.zst': 'tar.zst',
+    '.tzst': 'tar.zst',
+    '.tar.gz': 'tar.gz',
+    '.tgz': 'tar.gz',
+    '.zip': 'zip',
+}
+
+# Entries waiting for the writer thread / bytes of in-memory entries among them
+QUEUE_ENTRIES = 256
+DEFAULT_BUFFER_BYTES = 64 * 1024 * 1024
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+_CHUNK = 1024 * 1024
+_STOP = object()
+
+
+def archive_format(path):
+    """'tar.zst', 'tar.gz' or 'zip' if path names an archive output, else None."""
+    lower = path.lower()
+    for suffix, fmt in ARCHIVE_FORMATS.items():
+        if lower.endswith(suffix):
+            return fmt
+    return None
+
+
+class _ExactReader:
+    """Reads exactly size bytes from f, zero-padded, so a file that shrinks cannot break a tar stream."""
+
+    def __init__(self, f, size):
+        self.f = f
+        self.remaining = size
+        self.short = False
+
+    def read(self, n=-1):
+        n = self.remaining if n < 0 else min(n, self.remaining)
+        data = self.f.read(n) if n else b''
+        if len(data) < n:
+            self.short = True
+            data += b'\0' * (n - len(data))
+        self.remaining -= len(data)
+        return data
+
+
+class StreamingArchive:
+    """
+    Appends files and in-memory bytes to one .tar.zst/.tar.gz/.zip on a
+    writer thread. on_error(arcname, exception) is called from that thread
+    for entries that could not be added; the archive stays valid. An error
+    writing the archive itself is raised by close().
+    """
+
+    def __init__(self, path, buffer_bytes=DEFAULT_BUFFER_BYTES, on_error=None):
+        self.path = path
+        self.format = archive_format(path)
+        if self.format is None:
+            raise ValueError(f"不支持的压缩包格式: {path}（支持 {'、'.join(ARCHIVE_FORMATS)}）")
+        if self.format == 'tar.zst' and zstandard is None:
+            raise ValueError("写入 .tar.zst 需要安装 zstandard (pip install zstandard)")
+        self.buffer_bytes = buffer_bytes
+        self.on_error = on_error or (lambda arcname, e: None)
+        self.files = 0
+        self.bytes = 0
+        self._queue = queue.Queue(QUEUE_ENTRIES)
+        self._buffered = 0
+        self._buffer_cond = threading.Condition()
+        self._fatal = None
+
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        self._raw = open(path, 'wb', buffering=_CHUNK)
+        try:
+            if self.format == 'zip':
+                self._compressor = None
+                self._zip = zipfile.ZipFile(self._raw, 'w', zipfile.ZIP_DEFLATED)
+            else:
+                if self.format == 'tar.gz':
+                    self._compressor = gzip.GzipFile(fileobj=self._raw, mode='wb', compresslevel=GZIP_LEVEL)
+                else:
+                    self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, threads=-1).stream_writer(
+                        self._raw, closefd=False)
+                self._tar = tarfile.open(fileobj=self._compressor, mode='w|', format=tarfile.PAX_FORMAT)
+        except Exception:
+            self._raw.close()
+            raise
+        self._thread = threading.Thread(target=self._write_loop, name="folder-eye-archive", daemon=True)
+        self._thread.start()
+
+    # --- Producer side (any thread) ---
+    def add_file(self, arcname, path, remove=False, on_written=None):
+        """Queue path for the archive; with remove, it is deleted once appended."""
+        self._queue.put((arcname, path, None, None, remove, on_written))
+
+    def add_bytes(self, arcname, data, st=None, on_written=None):
+        """Queue data (mode and mtime from st when given); blocks while the buffer budget is used up."""
+        size = len(data)
+        with self._buffer_cond:
+            # An entry larger than the whole budget still goes through once the buffer is empty
+            while self._buffered and self._buffered + size > self.buffer_bytes:
+                self._buffer_cond.wait()
+            self._buffered += size
+        self._queue.put((arcname, None, data, st, False, on_written))
+
+    def wait(self):
+        """Block until everything queued so far is in the archive."""
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+        try:
+            if self.format == 'zip':
+                self._zip.close()
+            else:
+                self._tar.close()
+                self._compressor.close()
+        except Exception as e:
+            self._fatal = self._fatal or e
+        finally:
+            self._raw.close()
+        if self._fatal is not None:
+            raise self._fatal
+
+    # --- Writer thread ---
+    def _write_loop(self):
+        while True:
+            entry = self._queue.get()
+            try:
+                if entry is _STOP:
+                    return
+                self._write_entry(*entry)
+            finally:
+                self._queue.task_done()
+
+    def _write_entry(self, arcname, path, data, st, remove, on_written):
+        try:
+            # After a failure of the archive itself, entries are only drained so producers never block
+            if self._fatal is not None:
+                return
+            src = None
+            if path is not None:
+                # A missing or unreadable source skips its entry before anything is written
+                try:
+                    src = open(path, 'rb')
+                    st = os.fstat(src.fileno())
+                except OSError as e:
+                    self.on_error(arcname, e)
+                    return
+            try:
+                nbytes = self._append(arcname.replace(os.path.sep, '/'), src, data, st)
+            except Exception as e:
+                # A half-written entry leaves the archive unusable; close() reports it
+                self._fatal = e
+                self.on_error(arcname, e)
+                return
+            finally:
+                if src is not None:
+                    src.close()
+            self.files += 1
+            self.bytes += nbytes
+            if on_written is not None:
+                on_written(nbytes)
+        finally:
+            if data is not None:
+                with self._buffer_cond:
+                    self._buffered -= len(data)
+                    self._buffer_cond.notify_all()
+            if remove:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _append(self, arcname, src, data, st):
+        mtime = st.st_mtime if st is not None else time.time()
+        mode = (st.st_mode & 0o7777) if st is not None else 0o644
+        size = len(data) if data is not None else st.st_size
+        if data is not None:
+            src = io.BytesIO(data)
+
+        if self.format == 'zip':
+            # Zip timestamps cannot predate 1980
+            info = zipfile.ZipInfo(arcname, time.localtime(max(mtime, 315532800))[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = (0o100000 | mode) << 16
+            nbytes = 0
+            with self._zip.open(info, 'w', force_zip64=True) as dest:
+                while True:
+                    block = src.read(_CHUNK)
+                    if not block:
+                        return nbytes
+                    dest.write(block)
+                    nbytes += len(block)
+
+        info = tarfile.TarInfo(arcname)
+        info.mtime = mtime
+        info.mode = mode
+        info.size = size
+        reader = _ExactReader(src, size)
+        self._tar.addfile(info, reader)
+        if reader.short:
+            self.on_error(arcname, OSError("文件在写入压缩包时变短，已用零字节补齐"))
+        return size
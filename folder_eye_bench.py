@@ -0,0 +1,452 @@
+"""Benchmark harness for Folder-Eye.
+
+Generates reproducible synthetic A/B tree pairs and times each stage of a
+comparison on them, writing machine-readable JSON that can be compared
+between commits:
+
+    python folder_eye_bench.py generate /tmp/bench --files 5000 --change-rate 0.1 --pathological all
+    python folder_eye_bench.py run /tmp/bench --repeat 3 --json before.json
+    (check out another commit)
+    python folder_eye_bench.py run /tmp/bench --repeat 3 --json after.json
+    python folder_eye_bench.py compare before.json after.json --threshold 10
+
+The same parameters and seed always produce the same trees. Stages are timed
+one at a time and single-threaded (walk, is_text_file, compare_files, diff
+report rendering, copies, summary), followed by one end-to-end run whose
+per-phase numbers come from metrics.json. The hash cache is disabled
+throughout so runs do not warm each other up; the OS page cache is not
+flushed, so the first repeat may be slower.
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+
+import folder_eye_report as report
+from folder_eye_engine import (ComparisonEngine, ComparisonOptions, scan_tree, is_text_file,
+                               render_diff_report)
+from folder_eye_metrics import METRICS_NAME
+
+BENCH_FORMAT = "folder-eye-bench"
+BENCH_VERSION = 1
+TREE_INFO_NAME = "bench-tree.json"
+
+SIZE_DISTRIBUTIONS = ('lognormal', 'uniform', 'fixed')
+PATHOLOGICAL_CASES = ('repetitive', 'long-lines', 'gbk', 'utf16')
+STAGES = ('walk', 'is_text', 'compare', 'diff', 'copy', 'summary', 'end_to_end')
+
+_WORDS = ("alpha beta gamma delta config value return import class def self data "
+          "index count total result error warning path file folder report summary "
+          "begin end start stop next prev item list dict set map filter").split()
+_CHINESE_WORDS = "文件 比较 报告 修改 新增 删除 目录 配置 数据 结果 错误 警告 开始 结束 版本 用户".split()
+
+
+# --- Synthetic Tree Generator ---
+class TreeSpec:
+    """Parameters of a generated tree pair; stored next to it as bench-tree.json."""
+
+    def __init__(self, files=1000, depth=3, fanout=8, size_dist='lognormal', mean_size=8 * 1024,
+                 binary_ratio=0.1, change_rate=0.1, add_rate=0.02, delete_rate=0.02,
+                 pathological=(), huge_size=32 * 1024 * 1024, seed=0):
+        if size_dist not in SIZE_DISTRIBUTIONS:
+            raise ValueError(f"未知的大小分布: {size_dist}")
+        unknown = set(pathological) - set(PATHOLOGICAL_CASES)
+        if unknown:
+            raise ValueError(f"未知的极端用例: {', '.join(sorted(unknown))}")
+        self.files = files
+        self.depth = depth
+        self.fanout = fanout
+        self.size_dist = size_dist
+        self.mean_size = mean_size
+        self.binary_ratio = binary_ratio
+        self.change_rate = change_rate
+        self.add_rate = add_rate
+        self.delete_rate = delete_rate
+        self.pathological = sorted(pathological)
+        self.huge_size = huge_size
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+def _file_size(rng, spec):
+    if spec.size_dist == 'fixed':
+        return spec.mean_size
+    if spec.size_dist == 'uniform':
+        return rng.randint(0, 2 * spec.mean_size)
+    # Median at mean_size with a long tail, capped so one draw cannot dominate the run
+    return min(int(rng.lognormvariate(math.log(max(spec.mean_size, 1)), 1.0)), 64 * spec.mean_size)
+
+
+def _text_lines(rng, size, words=_WORDS, line_words=(4, 14)):
+    lines = []
+    total = 0
+    while total < size:
+        line = ' ' * (4 * rng.randint(0, 3)) + ' '.join(rng.choice(words) for _ in range(rng.randint(*line_words)))
+        lines.append(line)
+        total += len(line) + 1
+    return lines
+
+
+def _edit_lines(rng, lines, words=_WORDS):
+    """A few replaced, inserted and deleted lines, like a typical source change."""
+    lines = list(lines)
+    for _ in range(rng.randint(1, 5)):
+        position = rng.randrange(len(lines) + 1)
+        kind = rng.random()
+        new_line = ' '.join(rng.choice(words) for _ in range(rng.randint(3, 10)))
+        if kind < 0.5 and position < len(lines):
+            lines[position] = new_line
+        elif kind < 0.8 or not lines:
+            lines.insert(position, new_line)
+        elif position < len(lines):
+            del lines[position]
+    return lines
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _encode_lines(lines, encoding='utf-8'):
+    return ('\n'.join(lines) + '\n').encode(encoding)
+
+
+def _pathological_files(rng, spec):
+    """Yield (rel_path, content_a, content_b) for the requested pathological cases."""
+    if 'repetitive' in spec.pathological:
+        # Few distinct lines repeated over a huge file: worst case for difflib's matcher
+        pool = [f"    value = {i}  # repeated" for i in range(8)]
+        lines_a = [pool[i % len(pool)] for i in range(spec.huge_size // 28)]
+        lines_b = list(lines_a)
+        for _ in range(50):
+            lines_b[rng.randrange(len(lines_b))] = f"    value = {rng.randint(100, 999)}  # changed"
+        yield os.path.join('pathological', 'repetitive.txt'), _encode_lines(lines_a), _encode_lines(lines_b)
+
+    if 'long-lines' in spec.pathological:
+        # Minified-style content: a handful of lines of 200k+ characters each
+        lines_a = [' '.join(rng.choice(_WORDS) for _ in range(40000)) for _ in range(4)]
+        lines_b = list(lines_a)
+        words = lines_b[1].split(' ')
+        words[rng.randrange(len(words))] = 'CHANGED'
+        lines_b[1] = ' '.join(words)
+        yield os.path.join('pathological', 'long-lines.txt'), _encode_lines(lines_a), _encode_lines(lines_b)
+
+    for case, encoding in (('gbk', 'gbk'), ('utf16', 'utf-16')):
+        if case in spec.pathological:
+            lines_a = _text_lines(rng, 256 * 1024, _CHINESE_WORDS, (6, 20))
+            lines_b = _edit_lines(rng, lines_a, _CHINESE_WORDS)
+            yield (os.path.join('pathological', f'{case}.txt'),
+                   _encode_lines(lines_a, encoding), _encode_lines(lines_b, encoding))
+
+
+def generate_tree_pair(root, spec):
+    """
+    Write root/A and root/B (replacing any previous pair) plus root/bench-tree.json.
+    Returns counts of what was generated.
+    """
+    rng = random.Random(spec.seed)
+    dir_a = os.path.join(root, 'A')
+    dir_b = os.path.join(root, 'B')
+    for path in (dir_a, dir_b):
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+
+    counts = {'files_a': 0, 'files_b': 0, 'changed': 0, 'added': 0, 'deleted': 0, 'bytes_a': 0, 'bytes_b': 0}
+
+    def emit(rel_path, content_a, content_b):
+        if content_a is not None:
+            _write(os.path.join(dir_a, rel_path), content_a)
+            counts['files_a'] += 1
+            counts['bytes_a'] += len(content_a)
+        if content_b is not None:
+            _write(os.path.join(dir_b, rel_path), content_b)
+            counts['files_b'] += 1
+            counts['bytes_b'] += len(content_b)
+
+    for n in range(spec.files):
+        level = rng.randint(0, spec.depth)
+        parts = [f"d{rng.randrange(spec.fanout)}" for _ in range(level)]
+        is_binary = rng.random() < spec.binary_ratio
+        rel_path = os.path.join(*parts, f"f{n}.{'bin' if is_binary else 'txt'}")
+        size = _file_size(rng, spec)
+
+        if is_binary:
+            content_a = rng.randbytes(size)
+        else:
+            lines_a = _text_lines(rng, size)
+            content_a = _encode_lines(lines_a)
+        content_b = content_a
+
+        roll = rng.random()
+        if roll < spec.delete_rate:
+            content_b = None
+            counts['deleted'] += 1
+        elif roll < spec.delete_rate + spec.change_rate:
+            if is_binary:
+                data = bytearray(content_a or b'\0')
+                data[rng.randrange(len(data))] ^= 0xFF
+                content_b = bytes(data)
+            else:
+                content_b = _encode_lines(_edit_lines(rng, lines_a))
+            counts['changed'] += 1
+        emit(rel_path, content_a, content_b)
+
+        if rng.random() < spec.add_rate:
+            emit(os.path.join(*parts, f"new{n}.txt"), None, _encode_lines(_text_lines(rng, _file_size(rng, spec))))
+            counts['added'] += 1
+
+    for rel_path, content_a, content_b in _pathological_files(rng, spec):
+        emit(rel_path, content_a, content_b)
+        counts['changed'] += 1
+
+    with open(os.path.join(root, TREE_INFO_NAME), 'w', encoding='utf-8') as f:
+        json.dump({'spec': spec.to_dict(), 'counts': counts}, f, ensure_ascii=False, indent=2)
+    return counts
+
+
+# --- Stage Timing ---
+def _stage(seconds, files, nbytes):
+    return {
+        'seconds': round(seconds, 4),
+        'files': files,
+        'bytes': nbytes,
+        'files_per_second': round(files / seconds, 1) if seconds else None,
+        'mb_per_second': round(nbytes / seconds / (1024 * 1024), 2) if seconds else None,
+    }
+
+
+def run_stages(dir_a, dir_b, work_dir, options, stages=STAGES):
+    """Time each requested stage once on dir_a / dir_b; scratch output goes to work_dir."""
+    results = {}
+    engine = ComparisonEngine(dir_a, dir_b, os.path.join(work_dir, 'end_to_end'), options)
+
+    start = time.perf_counter()
+    files_a = scan_tree(dir_a)
+    files_b = scan_tree(dir_b)
+    walk_seconds = time.perf_counter() - start
+    if 'walk' in stages:
+        results['walk'] = _stage(walk_seconds, len(files_a) + len(files_b), 0)
+
+    common = sorted(files_a.keys() & files_b.keys())
+    only_a = sorted(files_a.keys() - files_b.keys())
+    only_b = sorted(files_b.keys() - files_a.keys())
+
+    if 'is_text' in stages:
+        records = list(files_a.values()) + list(files_b.values())
+        start = time.perf_counter()
+        for record in records:
+            is_text_file(record.path)
+        results['is_text'] = _stage(time.perf_counter() - start, len(records), 0)
+
+    # The compare stage also finds the modified pairs the later stages need
+    modified = []
+    start = time.perf_counter()
+    for rel_path in common:
+        record_a, record_b = files_a[rel_path], files_b[rel_path]
+        result = engine.compare_files(record_a.path, record_b.path, record_a.stat, record_b.stat)
+        if result is not None and result.is_text_a and result.is_text_b and not result.identical:
+            modified.append(rel_path)
+    if 'compare' in stages:
+        results['compare'] = _stage(time.perf_counter() - start, len(common),
+                                    sum(files_a[p].stat.st_size + files_b[p].stat.st_size for p in common))
+    engine.release_kept_content()
+
+    if 'diff' in stages:
+        reports_dir = os.path.join(work_dir, 'reports')
+        os.makedirs(reports_dir, exist_ok=True)
+        if not options.inline_assets:
+            report.write_report_assets(reports_dir)
+        start = time.perf_counter()
+        for rel_path in modified:
+            render_diff_report(files_a[rel_path].path, files_b[rel_path].path,
+                               os.path.join(reports_dir, report.report_filename(rel_path)), options)
+        results['diff'] = _stage(time.perf_counter() - start, len(modified),
+                                 sum(files_a[p].stat.st_size + files_b[p].stat.st_size for p in modified))
+
+    if 'copy' in stages:
+        copy_dir = os.path.join(work_dir, 'copy')
+        start = time.perf_counter()
+        engine.copy_modified_files(modified, dir_a, dir_b, os.path.join(copy_dir, '修改文件'))
+        engine.copy_added_files(only_b, dir_b, os.path.join(copy_dir, '新增文件'))
+        engine.copy_deleted_files(only_a, dir_a, os.path.join(copy_dir, '删除文件'))
+        results['copy'] = _stage(time.perf_counter() - start, len(modified) * 2 + len(only_a) + len(only_b),
+                                 sum(files_a[p].stat.st_size + files_b[p].stat.st_size for p in modified) +
+                                 sum(files_b[p].stat.st_size for p in only_b) +
+                                 sum(files_a[p].stat.st_size for p in only_a))
+
+    if 'summary' in stages:
+        start = time.perf_counter()
+        html = report.build_summary_html(modified, only_b, only_a, dir_a, dir_b)
+        results['summary'] = _stage(time.perf_counter() - start, len(modified) + len(only_a) + len(only_b),
+                                    len(html))
+
+    if 'end_to_end' in stages:
+        start = time.perf_counter()
+        engine.compare_directories()
+        seconds = time.perf_counter() - start
+        stage = _stage(seconds, len(files_a) + len(files_b),
+                       sum(r.stat.st_size for r in files_a.values()) + sum(r.stat.st_size for r in files_b.values()))
+        with open(os.path.join(engine.output_dir, '报告', METRICS_NAME), 'r', encoding='utf-8') as f:
+            stage['phases'] = {phase['name']: phase['wall_seconds'] for phase in json.load(f)['phases']}
+        results['end_to_end'] = stage
+
+    return results, {'common': len(common), 'modified': len(modified), 'added': len(only_b), 'deleted': len(only_a)}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(tree_root, repeat=3, stages=STAGES, options=None):
+    """Run the stages repeat times and summarize each as min / median over the repeats."""
+    dir_a = os.path.join(tree_root, 'A')
+    dir_b = os.path.join(tree_root, 'B')
+    options = options or ComparisonOptions(hash_cache=False, log_file=False, log_level='info')
+
+    runs = []
+    for _ in range(repeat):
+        work_dir = tempfile.mkdtemp(prefix='folder-eye-bench-')
+        try:
+            stage_results, counts = run_stages(dir_a, dir_b, work_dir, options, stages)
+            runs.append(stage_results)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    summary = {}
+    for name in stages:
+        samples = [run[name]['seconds'] for run in runs if name in run]
+        if samples:
+            summary[name] = dict(runs[-1][name], seconds=min(samples),
+                                 median_seconds=round(statistics.median(samples), 4), samples=samples)
+
+    tree_info = None
+    try:
+        with open(os.path.join(tree_root, TREE_INFO_NAME), 'r', encoding='utf-8') as f:
+            tree_info = json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    return {
+        'format': BENCH_FORMAT,
+        'version': BENCH_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'tree': tree_info,
+        'counts': counts,
+        'repeat': repeat,
+        'stages': summary,
+    }
+
+
+def compare_results(old, new, threshold):
+    """Rows (stage, old seconds, new seconds, change %) plus whether any stage regressed past threshold %."""
+    rows = []
+    regressed = False
+    for name, stage in new['stages'].items():
+        before = old['stages'].get(name, {}).get('seconds')
+        after = stage['seconds']
+        change = (after - before) / before * 100 if before else None
+        if change is not None and change > threshold:
+            regressed = True
+        rows.append((name, before, after, change))
+    return rows, regressed
+
+
+# --- Command Line Entry Point ---
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="folder_eye_bench.py", description="Folder-Eye 性能基准：生成测试目录并测量各阶段耗时")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help="生成可复现的 A/B 测试目录")
+    generate.add_argument("root", help="输出目录（其中的 A、B 会被替换）")
+    generate.add_argument("--files", type=int, default=1000, help="A 中的文件数（默认: %(default)s）")
+    generate.add_argument("--depth", type=int, default=3, help="最大目录深度（默认: %(default)s）")
+    generate.add_argument("--fanout", type=int, default=8, help="每层子目录数（默认: %(default)s）")
+    generate.add_argument("--size-dist", choices=SIZE_DISTRIBUTIONS, default='lognormal',
+                          help="文件大小分布（默认: %(default)s）")
+    generate.add_argument("--mean-size", type=int, default=8 * 1024, help="文件大小中位数，字节（默认: %(default)s）")
+    generate.add_argument("--binary-ratio", type=float, default=0.1, help="二进制文件比例（默认: %(default)s）")
+    generate.add_argument("--change-rate", type=float, default=0.1, help="B 中修改的文件比例（默认: %(default)s）")
+    generate.add_argument("--add-rate", type=float, default=0.02, help="B 中新增的文件比例（默认: %(default)s）")
+    generate.add_argument("--delete-rate", type=float, default=0.02, help="B 中删除的文件比例（默认: %(default)s）")
+    generate.add_argument("--pathological", action='append', default=[],
+                          choices=PATHOLOGICAL_CASES + ('all',),
+                          help="加入极端用例，可重复（all 表示全部）")
+    generate.add_argument("--huge-size", type=int, default=32, help="repetitive 用例的大小，MB（默认: %(default)s）")
+    generate.add_argument("--seed", type=int, default=0, help="随机种子（默认: %(default)s）")
+
+    run = commands.add_parser('run', help="在测试目录上测量各阶段耗时")
+    run.add_argument("root", help="generate 生成的目录")
+    run.add_argument("--repeat", type=int, default=3, help="重复次数，结果取最小值和中位数（默认: %(default)s）")
+    run.add_argument("--stage", action='append', choices=STAGES, help="只运行指定阶段，可重复")
+    run.add_argument("--json", metavar="FILE", help="结果写入 JSON 文件（默认输出到标准输出）")
+
+    compare = commands.add_parser('compare', help="比较两次 run 的结果")
+    compare.add_argument("old", help="基准结果 JSON")
+    compare.add_argument("new", help="新结果 JSON")
+    compare.add_argument("--threshold", type=float, default=10.0,
+                         help="任一阶段变慢超过该百分比时返回 1（默认: %(default)s）")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+
+    if args.command == 'generate':
+        pathological = PATHOLOGICAL_CASES if 'all' in args.pathological else args.pathological
+        spec = TreeSpec(files=args.files, depth=args.depth, fanout=args.fanout, size_dist=args.size_dist,
+                        mean_size=args.mean_size, binary_ratio=args.binary_ratio, change_rate=args.change_rate,
+                        add_rate=args.add_rate, delete_rate=args.delete_rate, pathological=pathological,
+                        huge_size=args.huge_size * 1024 * 1024, seed=args.seed)
+        counts = generate_tree_pair(args.root, spec)
+        print(json.dumps(counts, ensure_ascii=False))
+        return 0
+
+    if args.command == 'run':
+        result = run_benchmark(args.root, args.repeat, tuple(args.stage or STAGES))
+        text = json.dumps(result, ensure_ascii=False, indent=2)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
+        else:
+            print(text)
+        for name, stage in result['stages'].items():
+            print(f"{name:<12} {stage['seconds']:>9.3f} s  (中位数 {stage['median_seconds']:.3f} s)", file=sys.stderr)
+        return 0
+
+    with open(args.old, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(args.new, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    rows, regressed = compare_results(old, new, args.threshold)
+    print(f"{'阶段':<12} {'之前':>10} {'之后':>10} {'变化':>8}")
+    for name, before, after, change in rows:
+        before_text = f"{before:.3f}" if before is not None else "-"
+        change_text = f"{change:+.1f}%" if change is not None else "-"
+        print(f"{name:<12} {before_text:>10} {after:>10.3f} {change_text:>8}")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""Persistent file-hash cache for Folder-Eye.
+
+Maps (path, algorithm) plus the stat identity (device, inode, size, mtime_ns)
+to a content digest and the text/binary flag in a small SQLite database, so
+unchanged files are never re-read across runs. Any change to the stat identity
+of a file turns its entries into misses. A path may hold several digests, one
+per algorithm key (e.g. the raw digest and a normalized-text digest).
+"""
+import os
+import sys
+import time
+import sqlite3
+import threading
+
+DEFAULT_CACHE_NAME = "hash_cache.sqlite3"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Bump when the table layout changes; older caches are simply discarded
+SCHEMA_VERSION = 4
+
+# Files modified this recently may still change within the same mtime tick
+# without their size changing, so their digests are not trusted for reuse.
+RACY_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+
+def default_cache_path():
+    """Per-user cache location, so the program folder (or a source checkout) stays clean."""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+        cache_dir = os.path.join(base, 'FolderEye')
+    elif sys.platform == 'darwin':
+        cache_dir = os.path.expanduser('~/Library/Caches/FolderEye')
+    else:
+        cache_dir = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'folder-eye')
+    return os.path.join(cache_dir, DEFAULT_CACHE_NAME)
+
+
+class HashCache:
+    """
+    Thread-safe digest cache. Lookups and stores may come from any hashing
+    worker; writes are buffered and flushed in batches under one lock.
+    """
+
+    def __init__(self, db_path, max_bytes=DEFAULT_MAX_BYTES, flush_every=500):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.flush_every = flush_every
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending = []
+        self._touched = []
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        # auto_vacuum must be set before the first table is created to take effect
+        self._conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self._conn.execute("DROP TABLE IF EXISTS file_hash")
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS file_hash (
+                path TEXT NOT NULL,
+                device INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                algorithm TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                is_text INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (path, algorithm)
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_file_hash_last_used ON file_hash (last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def _key(path, st):
+        return (os.path.abspath(path), st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def lookup(self, path, st, algorithm, count=True):
+        """
+        Return (digest, is_text) for path if its stat identity and algorithm
+        match, else None. count=False keeps lookups that only want the text
+        flag out of the hit rate.
+        """
+        key = self._key(path, st)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT device, inode, size, mtime_ns, digest, is_text FROM file_hash "
+                "WHERE path = ? AND algorithm = ?",
+                (key[0], algorithm)
+            ).fetchone()
+            if row is not None and tuple(row[:4]) == key[1:]:
+                if count:
+                    self.hits += 1
+                self._touched.append((time.time(), key[0], algorithm))
+                return row[4], bool(row[5])
+            if count:
+                self.misses += 1
+            return None
+
+    def store(self, path, st, algorithm, digest, is_text):
+        if not digest:
+            return
+        if time.time_ns() - st.st_mtime_ns < RACY_WINDOW_NS:
+            return
+        with self._lock:
+            self._pending.append(self._key(path, st) + (algorithm, digest, int(is_text), time.time()))
+            if len(self._pending) >= self.flush_every:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._pending:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO file_hash "
+                "(path, device, inode, size, mtime_ns, algorithm, digest, is_text, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self._pending
+            )
+            self._pending = []
+        if self._touched:
+            self._conn.executemany("UPDATE file_hash SET last_used = ? WHERE path = ? AND algorithm = ?", self._touched)
+            self._touched = []
+        self._conn.commit()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def size_bytes(self):
+        page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+        return page_count * page_size
+
+    def evict(self):
+        """Drop least recently used entries until the database fits in max_bytes. Returns rows removed."""
+        with self._lock:
+            self._flush_locked()
+            size = self.size_bytes()
+            if size <= self.max_bytes:
+                return 0
+            total = self._conn.execute("SELECT COUNT(*) FROM file_hash").fetchone()[0]
+            # Aim for 90% of the budget so eviction does not run on every close
+            excess = int(total * (1 - (self.max_bytes * 0.9) / size)) + 1
+            cur = self._conn.execute(
+                "DELETE FROM file_hash WHERE rowid IN "
+                "(SELECT rowid FROM file_hash ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+            self._conn.commit()
+            self._conn.execute("PRAGMA incremental_vacuum")
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            return cur.rowcount
+
+    def stats_text(self):
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0
+        return f"哈希缓存: 命中 {self.hits}，未命中 {self.misses}，命中率 {rate:.1f}%"
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._conn.close()
@@ -0,0 +1,235 @@
+"""Concurrent file copies for Folder-Eye's result archive.
+
+Each copy tries the cheapest method the platform and filesystem allow, in
+order:
+
+1. hardlink (only in ``hardlink`` mode): no data is written at all, but the
+   archive shares the inode with the source, so later edits to the source show
+   up in the archive too;
+2. reflink clone (``FICLONE``; btrfs, XFS, bcachefs...): copy-on-write, instant;
+3. ``os.copy_file_range``: in-kernel copy, offloaded by NFS/SMB servers;
+4. ``os.sendfile``: in-kernel copy without user-space buffers;
+5. ``shutil.copyfile``.
+
+A method that fails as unsupported for a (source device, target device) pair
+is not tried again for that pair. Metadata is copied with ``shutil.copystat``
+like ``shutil.copy2``. Target folders are created once each through a shared
+cache instead of ``os.makedirs`` before every file.
+"""
+import os
+import sys
+import errno
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+COPY_MODES = ('copy', 'hardlink')
+
+# ioctl number of FICLONE (_IOW(0x94, 9, int)) on Linux
+_FICLONE = 0x40049409
+# errno values meaning "this method does not work here", as opposed to a real I/O error
+_UNSUPPORTED = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EPERM, errno.EBADF,
+                getattr(errno, 'EOPNOTSUPP', errno.EINVAL), getattr(errno, 'ENOTSUP', errno.EINVAL),
+                getattr(errno, 'ENOTTY', errno.EINVAL)}
+_CHUNK = 1 << 30
+
+METHOD_LABELS = {
+    'hardlink': "硬链接",
+    'reflink': "克隆",
+    'copy_file_range': "copy_file_range",
+    'sendfile': "sendfile",
+    'copyfile': "普通复制",
+    'memory': "内存写入",
+    'stored': "新对象",
+    'deduplicated': "已存在对象",
+    'archived': "写入压缩包",
+}
+
+
+def default_copy_worker_count():
+    # Copies are I/O bound; a few more threads than cores keeps several requests queued per disk
+    return min(16, (os.cpu_count() or 1) + 4)
+
+
+class DirectoryCache:
+    """Creates each target folder once; safe to share between copy threads."""
+
+    def __init__(self):
+        self._created = set()
+        self._lock = threading.Lock()
+
+    def ensure(self, path):
+        if path in self._created:
+            return
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            while path and path not in self._created:
+                self._created.add(path)
+                parent = os.path.dirname(path)
+                if parent == path:
+                    break
+                path = parent
+
+
+class CopyStats:
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.errors = 0
+        self.methods = {}
+
+    def methods_text(self):
+        return "，".join(f"{METHOD_LABELS.get(method, method)} {count}"
+                        for method, count in sorted(self.methods.items(), key=lambda item: -item[1]))
+
+
+class CopyEngine:
+    """
+    Copies (src, dest, content) jobs on a thread pool. content, when not None,
+    is the file's bytes already in memory and is written directly. on_copied
+    (nbytes) and on_error(src, exception) are called from the copy threads.
+    """
+
+    def __init__(self, workers=None, mode='copy', on_copied=None, on_error=None, should_stop=None):
+        if mode not in COPY_MODES:
+            raise ValueError(f"未知的复制方式: {mode}")
+        self.workers = max(1, workers or default_copy_worker_count())
+        self.mode = mode
+        self.on_copied = on_copied or (lambda nbytes: None)
+        self.on_error = on_error or (lambda src, e: None)
+        self.should_stop = should_stop or (lambda: False)
+        self.dirs = DirectoryCache()
+        self.stats = CopyStats()
+        self._lock = threading.Lock()
+        # (method, source device, target device) combinations known not to work
+        self._unsupported = set()
+
+    def run(self, jobs):
+        """Copy every job; returns self.stats. Blocks until all submitted copies are done."""
+        slots = threading.BoundedSemaphore(self.workers * 4)
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="folder-eye-copy")
+        try:
+            for src, dest, content in jobs:
+                if self.should_stop():
+                    break
+                slots.acquire()
+                future = pool.submit(self._copy_job, src, dest, content)
+                future.add_done_callback(lambda f: slots.release())
+        finally:
+            pool.shutdown(wait=True, cancel_futures=self.should_stop())
+        return self.stats
+
+    def _copy_job(self, src, dest, content):
+        try:
+            method, nbytes = self.copy_file(src, dest, content)
+        except Exception as e:
+            with self._lock:
+                self.stats.errors += 1
+            self.on_error(src, e)
+            return
+        with self._lock:
+            self.stats.files += 1
+            self.stats.bytes += nbytes
+            self.stats.methods[method] = self.stats.methods.get(method, 0) + 1
+        self.on_copied(nbytes)
+
+    def copy_file(self, src, dest, content=None):
+        """Copy src to dest with data and metadata; returns (method, bytes)."""
+        self.dirs.ensure(os.path.dirname(dest))
+        if content is not None:
+            with open(dest, 'wb') as f:
+                f.write(content)
+            shutil.copystat(src, dest)
+            return 'memory', len(content)
+
+        st = os.stat(src)
+        dest_dev = self._target_device(dest)
+        if self.mode == 'hardlink' and self._usable('hardlink', st.st_dev, dest_dev):
+            try:
+                if os.path.lexists(dest):
+                    os.remove(dest)
+                os.link(src, dest)
+                return 'hardlink', st.st_size
+            except OSError as e:
+                self._note_failure(e, 'hardlink', st.st_dev, dest_dev)
+
+        with open(src, 'rb') as fsrc, open(dest, 'wb') as fdst:
+            method = self._copy_data(fsrc, fdst, st, dest_dev)
+        shutil.copystat(src, dest)
+        return method, st.st_size
+
+    @staticmethod
+    def _target_device(dest):
+        try:
+            return os.stat(os.path.dirname(dest) or '.').st_dev
+        except OSError:
+            return None
+
+    def _usable(self, method, src_dev, dest_dev):
+        return (method, src_dev, dest_dev) not in self._unsupported
+
+    def _note_failure(self, error, method, src_dev, dest_dev):
+        if error.errno not in _UNSUPPORTED:
+            raise error
+        with self._lock:
+            self._unsupported.add((method, src_dev, dest_dev))
+
+    def _copy_data(self, fsrc, fdst, st, dest_dev):
+        src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+        size = st.st_size
+
+        if fcntl is not None and sys.platform.startswith('linux') and self._usable('reflink', st.st_dev, dest_dev):
+            try:
+                fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+                return 'reflink'
+            except OSError as e:
+                self._note_failure(e, 'reflink', st.st_dev, dest_dev)
+
+        # The kernel copies below may stop short. A failure after the first chunk is a real error that
+        # _copy_loop raises as EIO; only one before any data moved falls back to the next method
+        if hasattr(os, 'copy_file_range') and size and self._usable('copy_file_range', st.st_dev, dest_dev):
+            try:
+                self._copy_loop(os.copy_file_range, src_fd, dst_fd, size)
+                return 'copy_file_range'
+            except OSError as e:
+                self._note_failure(e, 'copy_file_range', st.st_dev, dest_dev)
+                fdst.truncate(0)
+                os.lseek(dst_fd, 0, os.SEEK_SET)
+
+        if hasattr(os, 'sendfile') and sys.platform.startswith('linux') and size and \
+                self._usable('sendfile', st.st_dev, dest_dev):
+            try:
+                self._copy_loop(lambda src, dst, count, offset: os.sendfile(dst, src, offset, count),
+                                src_fd, dst_fd, size)
+                return 'sendfile'
+            except OSError as e:
+                self._note_failure(e, 'sendfile', st.st_dev, dest_dev)
+                fdst.truncate(0)
+                os.lseek(dst_fd, 0, os.SEEK_SET)
+
+        fsrc.seek(0)
+        fdst.seek(0)
+        shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+        return 'copyfile'
+
+    @staticmethod
+    def _copy_loop(copy, src_fd, dst_fd, size):
+        """Call copy(src_fd, dst_fd, count, offset) until size bytes are copied or the source ends."""
+        offset = 0
+        while offset < size:
+            try:
+                copied = copy(src_fd, dst_fd, min(_CHUNK, size - offset), offset)
+            except OSError as e:
+                if offset:
+                    raise OSError(errno.EIO, f"复制在写入 {offset} 字节后中断: {e}") from e
+                raise
+            if copied == 0:
+                break
+            offset += copied
+        # Offsets were explicit for sendfile; copy_file_range advanced the fds, so set both to the end
+        os.lseek(dst_fd, offset, os.SEEK_SET)
@@ -0,0 +1,356 @@
+"""Line diff engines for Folder-Eye reports.
+
+``difflib.SequenceMatcher`` is fine for ordinary source files but can go
+quadratic on large inputs with many repeated lines (generated code, lockfiles,
+CSV exports). Above a size threshold the reports switch to a histogram diff:
+it anchors on the rarest lines shared by both sides and recurses between
+anchors, which stays close to linear on such inputs. Regions with no rare line
+to anchor on fall back to a greedy O(ND) Myers diff with a capped edit count.
+
+Every diff runs under a time budget, checked between the steps of either
+engine (for difflib, between its longest-match searches). When it runs out,
+regions that are not resolved yet are emitted as whole replaced blocks. That
+coarse, hunk-level result is still a correct diff and is flagged so the report
+can say so.
+
+Before either engine runs, the common leading and trailing lines are trimmed
+and the remaining lines are interned to integer ids, so the core algorithm
+only sees the changed middle and compares ints instead of re-hashing strings.
+
+The unified diff output has the same format as ``difflib.unified_diff``, so
+the report renderer does not care which engine produced it. It is not always
+the same diff: SequenceMatcher only sees the trimmed middle, and its longest
+match search and autojunk heuristic depend on what it sees, so where lines
+repeat, changes can be aligned differently. Both are valid diffs of the
+same files.
+"""
+import time
+import difflib
+
+DIFF_ALGORITHMS = ('auto', 'difflib', 'histogram')
+
+# 'auto' switches to the histogram engine once the untrimmed middles together exceed this many lines
+LARGE_DIFF_LINES = 20000
+DEFAULT_TIME_BUDGET = 10.0
+
+# Lines occurring more often than this in a region are never used as anchors (as in git)
+MAX_ANCHOR_OCCURRENCES = 64
+# Anchor-less regions up to this many line pairs are still matched by difflib
+SMALL_REGION_PAIRS = 250000
+# Larger anchor-less regions use Myers up to this many edits before going coarse
+MYERS_MAX_EDITS = 2000
+# Operations between two clock reads
+_BUDGET_CHECK_EVERY = 4096
+
+
+class DiffResult:
+    """Unified diff lines plus whether part of the diff was degraded to whole-block hunks."""
+    __slots__ = ('lines', 'coarse', 'algorithm')
+
+    def __init__(self, lines, coarse=False, algorithm='difflib'):
+        self.lines = lines
+        self.coarse = coarse
+        self.algorithm = algorithm
+
+
+class _Budget:
+    def __init__(self, seconds):
+        self.deadline = time.monotonic() + seconds if seconds else None
+        self.ops = 0
+        self.exhausted = False
+
+    def spend(self, ops=1):
+        if self.exhausted:
+            return False
+        self.ops += ops
+        if self.deadline is not None and self.ops >= _BUDGET_CHECK_EVERY:
+            self.ops = 0
+            if time.monotonic() > self.deadline:
+                self.exhausted = True
+        return not self.exhausted
+
+
+class _BlockMatcher(difflib.SequenceMatcher):
+    """SequenceMatcher over precomputed matching blocks, to reuse difflib's opcode grouping."""
+
+    def __init__(self, a, b, matching_blocks):
+        self.a = a
+        self.b = b
+        self.matching_blocks = matching_blocks
+        self.opcodes = None
+
+
+def _find_anchor(a, b, alo, ahi, blo, bhi, budget):
+    """
+    The histogram step: among runs of equal lines in the region, pick the one
+    containing the line that is rarest in a (then the longest run). Returns
+    (i, j, length) or None if no line of b below the occurrence limit appears in a.
+    """
+    positions = {}
+    for i in range(alo, ahi):
+        positions.setdefault(a[i], []).append(i)
+    budget.spend(ahi - alo)
+
+    best = None
+    best_count = MAX_ANCHOR_OCCURRENCES + 1
+    # Diagonal (i - j) -> end of the run last extended on it, so no run is walked twice
+    reached = {}
+    for j in range(blo, bhi):
+        occurrences = positions.get(b[j])
+        if occurrences is None or len(occurrences) > best_count:
+            continue
+        count = len(occurrences)
+        for i in occurrences:
+            if reached.get(i - j, -1) > j:
+                continue
+            back = 0
+            while i - back > alo and j - back > blo and a[i - back - 1] == b[j - back - 1]:
+                back += 1
+            length = 1
+            while i + length < ahi and j + length < bhi and a[i + length] == b[j + length]:
+                length += 1
+            reached[i - j] = j + length
+            budget.spend(back + length)
+            if best is None or count < best_count or (count == best_count and back + length > best[2]):
+                best = (i - back, j - back, back + length)
+                best_count = count
+        if not budget.spend():
+            break
+    return best
+
+
+def _myers_blocks(a, b, alo, ahi, blo, bhi, budget, max_edits=MYERS_MAX_EDITS):
+    """
+    Matching blocks for one region by Myers' greedy algorithm, or None if it
+    needs more than max_edits edits or the budget runs out. Only the live
+    part of the V array is kept per step, so memory is O(D^2), not O(N*D).
+    """
+    n = ahi - alo
+    m = bhi - blo
+    v = {1: 0}
+    trace = []
+    for d in range(max_edits + 1):
+        trace.append(v)
+        v = dict(v)
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                x = v[k + 1]
+            else:
+                x = v[k - 1] + 1
+            y = x - k
+            start = x
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            v[k] = x
+            if not budget.spend(x - start + 1):
+                return None
+            if x >= n and y >= m:
+                return _myers_backtrack(trace, n, m, alo, blo)
+    return None
+
+
+def _myers_backtrack(trace, x, y, alo, blo):
+    """Walk the saved V arrays back from (x, y) and collect the diagonal runs (snakes)."""
+    blocks = []
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[k - 1] < v[k + 1]):
+            prev_k = k + 1
+            prev_x = v[prev_k]
+            start_x = prev_x
+        else:
+            prev_k = k - 1
+            prev_x = v[prev_k]
+            start_x = prev_x + 1
+        snake = x - start_x
+        if snake > 0:
+            blocks.append((alo + start_x, blo + y - snake, snake))
+        x, y = prev_x, prev_x - prev_k
+    return blocks
+
+
+def _difflib_blocks(a, b, budget):
+    """
+    SequenceMatcher's matching blocks for a and b, found region by region as
+    get_matching_blocks() does, so the budget is checked between longest-match
+    searches. Regions left when it runs out stay unmatched; returns (blocks, coarse).
+    """
+    matcher = difflib.SequenceMatcher(None, a, b)
+    blocks = []
+    coarse = False
+    queue = [(0, len(a), 0, len(b))]
+    while queue:
+        alo, ahi, blo, bhi = queue.pop()
+        if budget.exhausted:
+            coarse = True
+            continue
+        i, j, k = matcher.find_longest_match(alo, ahi, blo, bhi)
+        budget.spend((ahi - alo) + (bhi - blo))
+        if k:
+            blocks.append((i, j, k))
+            if alo < i and blo < j:
+                queue.append((alo, i, blo, j))
+            if i + k < ahi and j + k < bhi:
+                queue.append((i + k, ahi, j + k, bhi))
+    return blocks, coarse
+
+
+def _histogram_blocks(a, b, budget):
+    """Matching blocks (i, j, n) for a and b; returns (blocks, coarse)."""
+    blocks = []
+    coarse = False
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+
+        # Common prefix and suffix of the region are matches without any search
+        start = alo
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            alo += 1
+            blo += 1
+        if alo > start:
+            blocks.append((start, blo - (alo - start), alo - start))
+        end = ahi
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+        if end > ahi:
+            blocks.append((ahi, bhi, end - ahi))
+        if alo == ahi or blo == bhi:
+            continue
+
+        if budget.exhausted:
+            coarse = True
+            continue
+
+        anchor = _find_anchor(a, b, alo, ahi, blo, bhi, budget)
+        if anchor is None:
+            if (ahi - alo) * (bhi - blo) <= SMALL_REGION_PAIRS:
+                matcher = difflib.SequenceMatcher(None, a[alo:ahi], b[blo:bhi], autojunk=False)
+                for i, j, n in matcher.get_matching_blocks():
+                    if n:
+                        blocks.append((alo + i, blo + j, n))
+                budget.spend((ahi - alo) + (bhi - blo))
+            else:
+                region_blocks = _myers_blocks(a, b, alo, ahi, blo, bhi, budget)
+                if region_blocks is None:
+                    # Too many edits or out of time: the region stays one replaced block
+                    coarse = True
+                else:
+                    blocks.extend(region_blocks)
+            continue
+
+        i, j, n = anchor
+        blocks.append((i, j, n))
+        stack.append((i + n, ahi, j + n, bhi))
+        stack.append((alo, i, blo, j))
+
+    return blocks, coarse or budget.exhausted
+
+
+def _finish_blocks(blocks, len_a, len_b):
+    """Sort and merge matching blocks and add difflib's (len_a, len_b, 0) sentinel."""
+    blocks.sort()
+    # Adjacent blocks must be merged, or difflib's grouping would split hunks differently
+    merged = []
+    for i, j, n in blocks:
+        if merged and merged[-1][0] + merged[-1][2] == i and merged[-1][1] + merged[-1][2] == j:
+            merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + n)
+        else:
+            merged.append((i, j, n))
+    merged.append((len_a, len_b, 0))
+    return merged
+
+
+# --- Optimization: Affix Trimming and Line Interning ---
+def _common_affixes(a, b):
+    """Lengths of the common leading and trailing runs of lines (never overlapping)."""
+    limit = min(len(a), len(b))
+    prefix = 0
+    while prefix < limit and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+    return prefix, suffix
+
+
+def _intern_lines(a, b):
+    """Map both line lists to integer ids through one per-pair table; equal lines get equal ids."""
+    table = {}
+    a_ids = [table.setdefault(line, len(table)) for line in a]
+    b_ids = [table.setdefault(line, len(table)) for line in b]
+    return a_ids, b_ids
+
+
+def _format_range_unified(start, stop):
+    # Same as difflib's private helper: 'start,length', 1-based, length 1 omitted
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return f'{beginning}'
+    if not length:
+        beginning -= 1
+    return f'{beginning},{length}'
+
+
+def _unified_lines(a, b, matcher, fromfile, tofile, n):
+    started = False
+    for group in matcher.get_grouped_opcodes(n):
+        if not started:
+            started = True
+            yield f'--- {fromfile}'
+            yield f'+++ {tofile}'
+        first, last = group[0], group[-1]
+        yield (f'@@ -{_format_range_unified(first[1], last[2])} '
+               f'+{_format_range_unified(first[3], last[4])} @@')
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                for line in a[i1:i2]:
+                    yield ' ' + line
+                continue
+            if tag in ('replace', 'delete'):
+                for line in a[i1:i2]:
+                    yield '-' + line
+            if tag in ('replace', 'insert'):
+                for line in b[j1:j2]:
+                    yield '+' + line
+
+
+def choose_algorithm(len_a, len_b, algorithm='auto', large_lines=LARGE_DIFF_LINES):
+    if algorithm == 'auto':
+        return 'histogram' if len_a + len_b > large_lines else 'difflib'
+    if algorithm not in DIFF_ALGORITHMS:
+        raise ValueError(f"未知的差异算法: {algorithm}")
+    return algorithm
+
+
+def unified_diff(a, b, fromfile, tofile, n=3, algorithm='auto', time_budget=DEFAULT_TIME_BUDGET,
+                 large_lines=LARGE_DIFF_LINES):
+    """
+    Unified diff of two line lists as a DiffResult. Only the middle left after
+    trimming common leading/trailing lines is diffed, as interned ids.
+    'difflib' matches it with SequenceMatcher, 'histogram' (chosen by 'auto'
+    for large middles) with the histogram engine. Both run under time_budget
+    seconds and mark the result coarse if they had to give up. Even with 'difflib' the hunks can be aligned
+    differently from difflib.unified_diff on the untrimmed lists.
+    """
+    prefix, suffix = _common_affixes(a, b)
+    a_ids, b_ids = _intern_lines(a[prefix:len(a) - suffix], b[prefix:len(b) - suffix])
+    algorithm = choose_algorithm(len(a_ids), len(b_ids), algorithm, large_lines)
+
+    if algorithm == 'difflib':
+        blocks, coarse = _difflib_blocks(a_ids, b_ids, _Budget(time_budget))
+    else:
+        blocks, coarse = _histogram_blocks(a_ids, b_ids, _Budget(time_budget))
+    del a_ids, b_ids
+
+    blocks = [(i + prefix, j + prefix, size) for i, j, size in blocks]
+    if prefix:
+        blocks.append((0, 0, prefix))
+    if suffix:
+        blocks.append((len(a) - suffix, len(b) - suffix, suffix))
+    matcher = _BlockMatcher(a, b, _finish_blocks(blocks, len(a), len(b)))
+    return DiffResult(list(_unified_lines(a, b, matcher, fromfile, tofile, n)), coarse, algorithm)
@@ -0,0 +1,1806 @@
+"""Headless comparison engine for Folder-Eye.
+
+Scans two directory trees, classifies modified / added / deleted files, writes
+the HTML reports and archives the differing files. Nothing in this module
+imports tkinter, so it can run on build servers and from cron; the GUI in
+folder-eye.py is a thin client that forwards engine events into its queue.
+
+Command line:
+    python folder_eye_engine.py DIR_A DIR_B [-o OUTPUT] [--strict] [-x REL_PATH ...]
+"""
+import os
+import re
+import sys
+import json
+import codecs
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+import itertools
+import time
+import multiprocessing
+import chardet
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+try:
+    import xxhash  # Optional: fast non-cryptographic digests
+except ImportError:
+    xxhash = None
+
+import folder_eye_report as report
+import folder_eye_views as views
+from folder_eye_cache import HashCache, DEFAULT_MAX_BYTES, default_cache_path
+from folder_eye_manifest import ManifestWriter, iter_manifest, sized_blake2
+from folder_eye_diff import DIFF_ALGORITHMS, DEFAULT_TIME_BUDGET
+from folder_eye_log import (DEBUG, INFO, WARNING, ERROR, LOG_LEVELS, LOG_FILE_NAME, DEFAULT_LOG_MAX_BYTES,
+                            RotatingLogFile, parse_log_level)
+from folder_eye_progress import ProgressTracker, format_size
+from folder_eye_metrics import RunMetrics, PHASE_LABELS, METRICS_NAME
+from folder_eye_copy import CopyEngine, CopyStats, COPY_MODES, default_copy_worker_count
+from folder_eye_store import ArchiveStore, ArchiveWriter, ARCHIVE_INDEX_NAME, write_index
+from folder_eye_archive import StreamingArchive, archive_format
+
+
+def get_app_dir(app_name="FolderComparisonTool"):
+    if getattr(sys, "frozen", False):
+        return os.path.dirname(sys.executable)
+    else:
+        return os.path.dirname(os.path.abspath(__file__))
+
+
+def detect_encoding(file_path):
+    try:
+        with open(file_path, 'rb') as f:
+            raw_data = f.read(8192)
+            result = chardet.detect(raw_data)
+            encoding = result.get('encoding', 'utf-8')
+            return encoding
+    except:
+        return 'utf-8'
+
+
+# Binary files are recognised by a null byte in their first SNIFF_BYTES
+SNIFF_BYTES = 1024
+# Differing files up to this size keep their bytes in memory for the diff stage
+KEEP_CONTENT_MAX = 1024 * 1024
+KEEP_CONTENT_BUDGET = 256 * 1024 * 1024
+
+DEFAULT_HASH_ALGORITHM = 'sha256'
+XXHASH_ALGORITHMS = ('xxh3_128', 'xxh3_64', 'xxh64')
+
+# Tier 1 of the tiered comparison: large same-size pairs first compare a few sampled blocks
+SAMPLE_MIN_SIZE = 4 * 1024 * 1024
+SAMPLE_BLOCK = 65536
+SAMPLE_MIDDLE_BLOCKS = 3
+
+
+def available_hash_algorithms():
+    names = ['sha256', 'blake2b', 'blake2s', 'sha1', 'md5']
+    if xxhash is not None:
+        names.extend(XXHASH_ALGORITHMS)
+    return names
+
+
+def new_hasher(algorithm):
+    if algorithm in XXHASH_ALGORITHMS:
+        if xxhash is None:
+            raise ValueError(f"哈希算法 {algorithm} 需要安装 xxhash (pip install xxhash)")
+        return getattr(xxhash, algorithm)()
+    return sized_blake2(algorithm) or hashlib.new(algorithm)
+
+
+def adaptive_block_size(size):
+    # Small reads keep latency low for small files; big reads cut syscalls on multi-GB artifacts
+    if size < 1024 * 1024:
+        return 65536
+    if size < 1024 * 1024 * 1024:
+        return 1024 * 1024
+    return 4 * 1024 * 1024
+
+
+# --- Optimization: Fast Check for Text Files ---
+def is_text_file(file_path):
+    # Read the first 1KB and check for null bytes to detect binary
+    try:
+        with open(file_path, 'rb') as f:
+            chunk = f.read(SNIFF_BYTES)
+            if b'\x00' in chunk:
+                return False
+            return True
+    except:
+        return False
+
+
+class FileRead:
+    """Result of one pass over a file: digest ('' if not computed or unreadable), text flag, raw bytes."""
+    __slots__ = ('digest', 'is_text', 'content')
+
+    def __init__(self, digest, is_text, content=None):
+        self.digest = digest
+        self.is_text = is_text
+        self.content = content
+
+
+# --- Optimization: Read-Once File Access ---
+def read_file_once(filepath, want_digest=True, keep_content=False, block_size=None,
+                   algorithm=DEFAULT_HASH_ALGORITHM):
+    """
+    Open filepath once and derive everything a phase needs from that stream:
+    the binary sniff from the first block, the digest from all blocks and,
+    with keep_content, the raw bytes. Without a digest only the sniff block
+    (or the whole file for keep_content) is read. block_size defaults to
+    adaptive_block_size of the file.
+    """
+    try:
+        with open(filepath, 'rb') as f:
+            if not want_digest and not keep_content:
+                return FileRead('', b'\x00' not in f.read(SNIFF_BYTES))
+
+            if block_size is None:
+                block_size = adaptive_block_size(os.fstat(f.fileno()).st_size)
+            hasher = new_hasher(algorithm) if want_digest else None
+            first = f.read(block_size)
+            is_text = b'\x00' not in first[:SNIFF_BYTES]
+            blocks = [first] if keep_content else None
+            if hasher is not None:
+                hasher.update(first)
+            block = first
+            while block:
+                block = f.read(block_size)
+                if hasher is not None:
+                    hasher.update(block)
+                if keep_content:
+                    blocks.append(block)
+            return FileRead(hasher.hexdigest() if hasher is not None else '', is_text,
+                            b''.join(blocks) if keep_content else None)
+    except OSError:
+        return FileRead('', False)
+
+
+# --- Optimization: Early-Exit Block Comparison ---
+def compare_bytes(path_a, path_b, algorithm=None, keep_content=False,
+                  first_block=65536, max_block=1024 * 1024):
+    """
+    Read two same-size files in lockstep and stop at the first differing
+    block. Blocks start small, so early differences cost almost nothing, and
+    grow to max_block for long identical runs.
+
+    Returns (identical, FileRead a, FileRead b). A digest is only computed when
+    algorithm is given and the files turn out identical; since the bytes are
+    equal, one hasher serves both sides. With keep_content, differing files are
+    read to the end so the diff stage gets their full bytes.
+    """
+    try:
+        with open(path_a, 'rb') as fa, open(path_b, 'rb') as fb:
+            hasher = new_hasher(algorithm) if algorithm else None
+            blocks_a = [] if keep_content else None
+            blocks_b = [] if keep_content else None
+            is_text_a = is_text_b = None
+            block_size = first_block
+            while True:
+                block_a = fa.read(block_size)
+                block_b = fb.read(block_size)
+                if is_text_a is None:
+                    is_text_a = b'\x00' not in block_a[:SNIFF_BYTES]
+                    is_text_b = b'\x00' not in block_b[:SNIFF_BYTES]
+                if keep_content:
+                    blocks_a.append(block_a)
+                    blocks_b.append(block_b)
+                if block_a != block_b:
+                    if keep_content:
+                        blocks_a.append(fa.read())
+                        blocks_b.append(fb.read())
+                        return (False, FileRead('', is_text_a, b''.join(blocks_a)),
+                                FileRead('', is_text_b, b''.join(blocks_b)))
+                    return False, FileRead('', is_text_a), FileRead('', is_text_b)
+                if not block_a:
+                    digest = hasher.hexdigest() if hasher is not None else ''
+                    return True, FileRead(digest, is_text_a), FileRead(digest, is_text_b)
+                if hasher is not None:
+                    hasher.update(block_a)
+                block_size = min(block_size * 2, max_block)
+    except OSError:
+        return False, FileRead('', False), FileRead('', False)
+
+
+# --- Optimization: Tiered Hashing, Tier 1 (Sampled Pre-Check) ---
+def sample_offsets(size):
+    """Head, tail and SAMPLE_MIDDLE_BLOCKS evenly spaced block-aligned offsets."""
+    last = size - SAMPLE_BLOCK
+    offsets = {0, last}
+    for i in range(1, SAMPLE_MIDDLE_BLOCKS + 1):
+        offsets.add(last * i // (SAMPLE_MIDDLE_BLOCKS + 1) // SAMPLE_BLOCK * SAMPLE_BLOCK)
+    return sorted(offsets)
+
+
+def samples_differ(path_a, path_b, size):
+    """
+    Compare the sampled blocks of two same-size files. Returns (differ,
+    is_text_a, is_text_b), or None if either file cannot be read, in which case
+    the full comparison decides. A match proves nothing; a mismatch is final.
+    """
+    try:
+        with open(path_a, 'rb') as fa, open(path_b, 'rb') as fb:
+            is_text_a = is_text_b = None
+            for offset in sample_offsets(size):
+                fa.seek(offset)
+                fb.seek(offset)
+                block_a = fa.read(SAMPLE_BLOCK)
+                block_b = fb.read(SAMPLE_BLOCK)
+                if is_text_a is None:
+                    is_text_a = b'\x00' not in block_a[:SNIFF_BYTES]
+                    is_text_b = b'\x00' not in block_b[:SNIFF_BYTES]
+                if block_a != block_b:
+                    return True, is_text_a, is_text_b
+            return False, is_text_a, is_text_b
+    except OSError:
+        return None
+
+
+class PairResult:
+    """Outcome of comparing one same-name pair: both text flags, equality, any kept bytes and raw digests."""
+    __slots__ = ('is_text_a', 'is_text_b', 'identical', 'content_a', 'content_b', 'digest_a', 'digest_b')
+
+    def __init__(self, is_text_a, is_text_b, identical, content_a=None, content_b=None, digest_a='', digest_b=''):
+        self.is_text_a = is_text_a
+        self.is_text_b = is_text_b
+        self.identical = identical
+        self.content_a = content_a
+        self.content_b = content_b
+        self.digest_a = digest_a
+        self.digest_b = digest_b
+
+
+# --- Optimization: Improved Reading ---
+def read_file_content(file_path):
+    """Read and decode a text file. Raises OSError if the file cannot be read."""
+    with open(file_path, 'rb') as f:
+        return decode_text(f.read())
+
+
+def decode_text(raw):
+    # List of common encodings to try before expensive detection
+    encodings = ['utf-8', 'gb18030', 'gbk', 'utf-16', 'latin-1']
+
+    # Try common encodings first (Fast)
+    for enc in encodings:
+        try:
+            return raw.decode(enc)
+        except UnicodeDecodeError:
+            continue
+
+    # Fallback to Chardet (Slow)
+    try:
+        detected = chardet.detect(raw[:10000])
+        if detected['encoding']:
+            return raw.decode(detected['encoding'], errors='replace')
+    except:
+        pass
+
+    return raw.decode('utf-8', errors='ignore')
+
+
+# --- Optimization: Streaming Normalized Hashing ---
+# All whitespace except the newline itself, so line structure survives
+_INLINE_WHITESPACE = re.compile(r'[^\S\n]+')
+
+
+def guess_stream_encoding(first_block):
+    """Pick a decoder for a stream from its first block: utf-8 (with or without BOM), gb18030, else latin-1."""
+    if first_block.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    sample = first_block[:65536]
+    for enc in ('utf-8', 'gb18030'):
+        try:
+            # final=False tolerates a multi-byte character cut off at the end of the sample
+            codecs.getincrementaldecoder(enc)().decode(sample, False)
+            return enc
+        except UnicodeDecodeError:
+            continue
+    return 'latin-1'
+
+
+class TextNormalizer:
+    """
+    Incremental normalization for the ignore-whitespace / ignore-case /
+    ignore-line-endings options. feed() takes raw byte blocks and returns
+    normalized UTF-8 bytes, so a file can be hashed block by block. Undecodable
+    bytes are carried through as surrogates. The codec is guessed per file, so
+    the same text in two encodings normalizes to the same bytes; callers keep
+    such pairs apart through the encoding attribute (see normalized_digest).
+    """
+
+    def __init__(self, first_block, ignore_whitespace, ignore_case, ignore_line_endings):
+        self.ignore_whitespace = ignore_whitespace
+        self.ignore_case = ignore_case
+        self.ignore_line_endings = ignore_line_endings
+        # 'utf-8-sig' vs 'utf-8' also records whether the file starts with a BOM
+        self.encoding = guess_stream_encoding(first_block)
+        self._decoder = codecs.getincrementaldecoder(self.encoding)('surrogateescape')
+        self._pending_cr = False
+
+    def feed(self, block, final=False):
+        text = self._decoder.decode(block, final)
+        if self.ignore_line_endings:
+            # Hold back a trailing '\r' in case the '\n' of a CRLF starts the next block
+            if self._pending_cr:
+                text = '\r' + text
+            self._pending_cr = not final and text.endswith('\r')
+            if self._pending_cr:
+                text = text[:-1]
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        if self.ignore_whitespace:
+            text = _INLINE_WHITESPACE.sub('', text)
+        if self.ignore_case:
+            text = text.casefold()
+        return text.encode('utf-8', 'surrogatepass')
+
+
+def normalized_digest(filepath, ignore_whitespace, ignore_case, ignore_line_endings,
+                      algorithm=DEFAULT_HASH_ALGORITHM, content=None):
+    """
+    Digest of the normalized text of filepath, streamed block by block, or of
+    content when the raw bytes are already in memory. Raises OSError.
+
+    The decoding codec (with its BOM state) is hashed in first: a file that was
+    only re-encoded, or gained or lost a BOM, is a real change that none of the
+    ignore options covers, so it must not normalize to the same digest.
+    """
+    hasher = new_hasher(algorithm)
+    if content is not None:
+        normalizer = TextNormalizer(content, ignore_whitespace, ignore_case, ignore_line_endings)
+        hasher.update(normalizer.encoding.encode('ascii') + b'\0')
+        hasher.update(normalizer.feed(content, final=True))
+        return hasher.hexdigest()
+
+    with open(filepath, 'rb') as f:
+        block_size = adaptive_block_size(os.fstat(f.fileno()).st_size)
+        block = f.read(block_size)
+        normalizer = TextNormalizer(block, ignore_whitespace, ignore_case, ignore_line_endings)
+        hasher.update(normalizer.encoding.encode('ascii') + b'\0')
+        while block:
+            hasher.update(normalizer.feed(block))
+            block = f.read(block_size)
+        hasher.update(normalizer.feed(b'', final=True))
+    return hasher.hexdigest()
+
+
+class FileRecord:
+    """A file seen during the scan, with the stat result taken at that time."""
+    __slots__ = ('path', 'stat')
+
+    def __init__(self, path, stat):
+        self.path = path
+        self.stat = stat
+
+
+def compact_exclusion_rules(rules):
+    """
+    Normalize exclusion rules and keep only the top-level ones: a folder rule
+    already covers everything below it, so nested entries are redundant.
+    """
+    normalized = set()
+    for rule in rules:
+        rule = os.path.normpath(rule.replace('/', os.sep)) if rule else ''
+        if rule and rule != '.':
+            normalized.add(rule)
+
+    compact = []
+    for rule in sorted(normalized):
+        parts = rule.split(os.sep)
+        if not any(os.sep.join(parts[:i]) in normalized for i in range(1, len(parts))):
+            compact.append(rule)
+    return compact
+
+
+# --- Optimization: Compiled Exclusion Matcher ---
+class ExclusionMatcher:
+    """
+    Prefix trie over the path components of the exclusion rules. The scan
+    carries its current trie node down the tree, so each entry costs one dict
+    lookup instead of a pass over every rule, and excluded folders are pruned
+    before they are entered.
+    """
+
+    def __init__(self, rules=()):
+        self.rules = compact_exclusion_rules(rules)
+        self.root = {}
+        for rule in self.rules:
+            node = self.root
+            for part in rule.split(os.sep):
+                node = node.setdefault(part, {})
+            # None marks a node whose path is itself excluded
+            node[None] = True
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    @staticmethod
+    def child(node, name):
+        """Descend one path component: returns (excluded, child_node or None)."""
+        if not node:
+            return False, None
+        child = node.get(name)
+        if child is None:
+            return False, None
+        return None in child, child
+
+    def matches(self, rel_path):
+        node = self.root
+        for part in rel_path.split(os.sep):
+            node = node.get(part)
+            if node is None:
+                return False
+            if None in node:
+                return True
+        return False
+
+
+# --- Optimization: Single-Pass Scandir Traversal ---
+def scan_tree(root, matcher=None, should_stop=None, on_excluded=None, on_error=None, on_file=None):
+    """
+    Walk root once with os.scandir and return {rel_path: FileRecord}.
+
+    Relative paths are built while descending instead of with os.path.relpath,
+    and the DirEntry stat is kept so later phases never stat the file again.
+    Folders excluded by matcher are never entered. Like os.walk, symlinked
+    directories are listed but not followed.
+    """
+    records = {}
+    stack = [(root, '', matcher.root if matcher else None)]
+    while stack:
+        if should_stop and should_stop():
+            break
+        dir_path, rel_dir, node = stack.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                entries = list(it)
+        except OSError as e:
+            if on_error:
+                on_error(dir_path, e)
+            continue
+
+        for entry in entries:
+            rel_path = rel_dir + entry.name
+            excluded, child_node = ExclusionMatcher.child(node, entry.name)
+            try:
+                is_dir = entry.is_dir()
+                if excluded:
+                    if on_excluded:
+                        on_excluded(rel_path, is_dir)
+                    continue
+                if is_dir:
+                    if not entry.is_symlink():
+                        stack.append((entry.path, rel_path + os.sep, child_node))
+                    continue
+                records[rel_path] = record = FileRecord(entry.path, entry.stat())
+                if on_file:
+                    on_file(record)
+            except OSError as e:
+                if on_error:
+                    on_error(entry.path, e)
+    return records
+
+
+def file_size(path):
+    """Size of path, or 0 if it cannot be statted (progress weights only)."""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def default_worker_count():
+    # Hashing is I/O bound and hashlib releases the GIL, so oversubscribe the CPUs a little
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+def default_report_worker_count():
+    # Diff rendering is pure-Python and CPU bound: one process per core, no more
+    return os.cpu_count() or 1
+
+
+# --- Optimization: Process-Pool Diff Reports ---
+def render_diff_report(file_a, file_b, report_path, options, raw_a=None, raw_b=None, known=None):
+    """
+    Build and write the diff report for one modified pair. Module-level so it
+    can run in a report worker process, where only the paths and the
+    ComparisonOptions are sent and the files are read. raw_a / raw_b are bytes
+    already in memory (in-process rendering only). known holds the
+    fingerprints the comparison already has ({'a': ..., 'b': ...}); they are
+    reused while the file's size and mtime still match, otherwise the digest
+    is computed from the bytes read here. Returns (report_path, coarse,
+    fingerprints), where fingerprints is the size, mtime and digest of both
+    files as rendered, for the report index; raises on failure.
+    """
+    st_a = os.stat(file_a)
+    st_b = os.stat(file_b)
+    if raw_a is None:
+        with open(file_a, 'rb') as f:
+            raw_a = f.read()
+    if raw_b is None:
+        with open(file_b, 'rb') as f:
+            raw_b = f.read()
+    algorithm = views.fingerprint_algorithm(options.hash_algorithm)
+    fingerprints = {}
+    for side, st, raw in (('a', st_a, raw_a), ('b', st_b, raw_b)):
+        fingerprint = (known or {}).get(side)
+        if fingerprint is None or fingerprint[:2] != [st.st_size, st.st_mtime_ns]:
+            fingerprint = views.file_fingerprint(st, raw, algorithm)
+        fingerprints[side] = fingerprint
+    content_a = decode_text(raw_a)
+    content_b = decode_text(raw_b)
+    del raw_a, raw_b
+
+    diff = report.compute_diff(content_a, content_b, file_a, file_b,
+                               options.diff_algorithm, options.diff_time_budget)
+    # Only the diff is needed from here on; drop the decoded texts before rendering
+    del content_a, content_b
+
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    if options.report_mode == 'lazy':
+        report.write_diff_data(report_path, diff.lines, file_a, file_b, diff.coarse)
+    else:
+        report.write_diff_html(report_path, diff.lines, file_a, file_b, options.inline_assets, diff.coarse)
+    return report_path, diff.coarse, fingerprints
+
+
+class ComparisonOptions:
+    """Settings for one comparison run, shared by the GUI and the CLI."""
+
+    def __init__(self, excluded_folders=None, strict_mode=False,
+                 ignore_whitespace=True, ignore_case=False, ignore_line_endings=True,
+                 workers=None, max_in_flight=None, compare_mode='hash',
+                 hash_algorithm=DEFAULT_HASH_ALGORITHM, sample_check=True, report_workers=None,
+                 inline_assets=False, diff_algorithm='auto', diff_time_budget=DEFAULT_TIME_BUDGET,
+                 report_mode='html', log_level='debug', log_file=True, log_max_bytes=DEFAULT_LOG_MAX_BYTES,
+                 profile=False, trace_memory=False, copy_workers=None, copy_mode='copy', archive_store=None,
+                 checksum_algorithm=None,
+                 hash_cache=True, hash_cache_path=None, hash_cache_max_bytes=DEFAULT_MAX_BYTES):
+        # Only top-level folder rules are kept; see compact_exclusion_rules
+        self.excluded_folders = compact_exclusion_rules(excluded_folders or [])
+        self.strict_mode = strict_mode
+        self.ignore_whitespace = ignore_whitespace
+        self.ignore_case = ignore_case
+        self.ignore_line_endings = ignore_line_endings
+        self.workers = max(1, workers or default_worker_count())
+        # Cap on queued + running comparisons so the scan cannot run far ahead of the pool
+        self.max_in_flight = max(self.workers, max_in_flight or self.workers * 4)
+        # 'hash': digest both files; 'bytes': lockstep read that stops at the first difference
+        self.compare_mode = compare_mode
+        # Fails early with ValueError for unknown algorithms or a missing xxhash
+        new_hasher(hash_algorithm)
+        self.hash_algorithm = hash_algorithm
+        self.sample_check = sample_check
+        # Diff report processes; 1 renders in the comparison thread
+        self.report_workers = max(1, report_workers or default_report_worker_count())
+        # Embed CSS/JS in every diff report instead of linking the shared bundle in 报告/assets
+        self.inline_assets = inline_assets
+        # 'auto' uses the histogram engine for large files; each diff gets diff_time_budget seconds
+        self.diff_algorithm = diff_algorithm
+        self.diff_time_budget = diff_time_budget
+        # 'html': render every *_diff.html now; 'lazy': store compressed diff data, rendered when opened
+        self.report_mode = report_mode
+        # Messages below log_level are dropped; 'info' also skips formatting per-file messages
+        self.log_level = parse_log_level(log_level)
+        # Stream the full log to output_dir/运行日志.log, rotated at log_max_bytes
+        self.log_file = log_file
+        self.log_max_bytes = log_max_bytes
+        # cProfile the comparison thread / tracemalloc the run; results go next to metrics.json
+        self.profile = profile
+        self.trace_memory = trace_memory
+        # Archive copy threads; 'hardlink' links instead of copying when output and source share a filesystem
+        self.copy_workers = max(1, copy_workers or default_copy_worker_count())
+        if copy_mode not in COPY_MODES:
+            raise ValueError(f"未知的复制方式: {copy_mode}")
+        self.copy_mode = copy_mode
+        # Content-addressed store directory; differing files go there instead of the output folders
+        self.archive_store = archive_store
+        # Algorithm of untagged checksum-file baselines; None infers it from the digest length
+        if checksum_algorithm is not None:
+            new_hasher(checksum_algorithm)
+        self.checksum_algorithm = checksum_algorithm
+        self.hash_cache = hash_cache
+        self.hash_cache_path = hash_cache_path or default_cache_path()
+        self.hash_cache_max_bytes = hash_cache_max_bytes
+
+
+class ComparisonEngine:
+    """
+    Runs a full comparison without any UI.
+
+    Progress is reported through ``emit(msg_type, data)`` using the same
+    messages the GUI queue understands: ('log', (text, category)), ('status',
+    (message, progress)) and ('tree_insert', (tree_type, values)). category
+    groups repeated per-file messages and is None for one-off ones.
+    """
+
+    def __init__(self, dir_a, dir_b, output_dir, options=None, emit=None):
+        self.dir_a = dir_a
+        self.dir_b = dir_b
+        self.output_dir = output_dir
+        self.options = options or ComparisonOptions()
+        self.emit = emit or (lambda msg_type, data: None)
+        self.stop_flag = False
+        # Hot-path log calls check this before formatting their message
+        self.debug_log = self.options.log_level <= DEBUG
+        self._log_file = None
+        # --- Optimization: Byte-Weighted Progress ---
+        self.progress = ProgressTracker(self.update_status)
+        # --- Optimization: Per-Phase Metrics ---
+        self.metrics = RunMetrics(self.options.profile, self.options.trace_memory)
+        self._phase = None
+        self.exclusions = ExclusionMatcher(self.options.excluded_folders)
+        self.hash_cache = None
+        self.normalization = self._normalization_key()
+        # Set when dir_a is a manifest / checksum file instead of a live folder
+        self.baseline_is_manifest = False
+        # rel_path -> (raw_a, raw_b) for small modified files, reused by diff and copy
+        self._kept_content = {}
+        self._kept_bytes = 0
+        self._kept_lock = threading.Lock()
+        self._report_index = {}
+        # path -> raw digest of differing files, so the archive store does not hash them again
+        self._known_digests = {}
+        # rel_path -> {'a', 'b'} fingerprints from the comparison, so report workers do not hash again
+        self._known_fingerprints = {}
+        self.archive_store = None
+        # Where results are written: output_dir, or a local work folder when output_dir names an archive
+        self._result_dir = output_dir
+        self.archive = None
+        self._archive_errors = 0
+        self.modified_files = []
+        self.added_files = []
+        self.deleted_files = []
+
+    @property
+    def excluded_folders(self):
+        return self.options.excluded_folders
+
+    @property
+    def strict_mode(self):
+        return self.options.strict_mode
+
+    def stop(self):
+        self.stop_flag = True
+
+    def _normalization_key(self):
+        """Hash cache algorithm key for normalized-text digests, or None if no normalization is selected."""
+        flags = ''.join(flag for flag, enabled in (('w', self.options.ignore_whitespace),
+                                                    ('c', self.options.ignore_case),
+                                                    ('l', self.options.ignore_line_endings)) if enabled)
+        # norm2: digests include the codec; cached digests of the older scheme must not match
+        return f"{self.options.hash_algorithm}+norm2-{flags}" if flags else None
+
+    def log(self, message, level=INFO, category=None):
+        if level < self.options.log_level:
+            return
+        now = datetime.now()
+        log_msg = f"[{now:%H:%M:%S}] {message}\n"
+        log_file = self._log_file
+        if log_file is not None:
+            log_file.write(now, level, message)
+        self.emit('log', (log_msg, category))
+
+    # --- Optimization: On-Disk Log Sink ---
+    def _open_log_file(self, output_dir):
+        if not self.options.log_file:
+            return
+        try:
+            self._log_file = RotatingLogFile(os.path.join(output_dir, LOG_FILE_NAME),
+                                             self.options.log_max_bytes)
+        except OSError as e:
+            self.log(f"打开日志文件失败: {str(e)}", WARNING)
+
+    def _close_log_file(self):
+        log_file, self._log_file = self._log_file, None
+        if log_file is not None:
+            log_file.close()
+
+    def update_status(self, message, progress=None):
+        self.emit('status', (message, progress))
+
+    def _start_phase(self, name, total_bytes=None, total_files=None):
+        """Start measuring a phase of compare_directories and tracking its progress."""
+        self._phase = self.metrics.begin(name)
+        self.progress.start(PHASE_LABELS[name], total_bytes, total_files)
+        return self._phase
+
+    def _finish_phase(self):
+        stats = self.progress.finish()
+        if stats is not None:
+            self.log(stats.summary_text())
+        phase, self._phase = self._phase, None
+        if phase is not None:
+            if stats is not None:
+                phase.files = stats.files
+                phase.bytes = stats.bytes
+            self.metrics.end(phase)
+
+    def _write_metrics(self, reports_dir):
+        self.metrics.stop()
+        try:
+            path = self.metrics.write(
+                reports_dir, dir_a=os.path.abspath(self.dir_a), dir_b=os.path.abspath(self.dir_b),
+                workers=self.options.workers, report_workers=self.options.report_workers,
+                compare_mode=self.options.compare_mode, hash_algorithm=self.options.hash_algorithm,
+                modified=len(self.modified_files), added=len(self.added_files), deleted=len(self.deleted_files))
+            self.log(f"已写入运行指标: {path}")
+        except OSError as e:
+            self.log(f"写入运行指标失败: {str(e)}", WARNING)
+
+    def is_text_file(self, file_path, st=None):
+        if st is not None:
+            cached = self._lookup_cached(file_path, st, count=False)
+            if cached is not None:
+                return cached.is_text
+        return is_text_file(file_path)
+
+    def read_file_content(self, file_path):
+        try:
+            return read_file_content(file_path)
+        except Exception as e:
+            self.log(f"读取文件失败: {file_path} - {e}", WARNING, "读取文件失败")
+            return ""
+
+    # --- Optimization: Persistent Hash Cache ---
+    def _lookup_cached(self, filepath, st, count=True):
+        """
+        FileRead from the hash cache if filepath is unchanged since it was
+        hashed, else None. Pass count=False when only the text flag is wanted.
+        """
+        if self.hash_cache is None:
+            return None
+        cached = self.hash_cache.lookup(filepath, st, self.options.hash_algorithm, count)
+        return FileRead(cached[0], cached[1]) if cached is not None else None
+
+    def _hash_file(self, filepath, st, want_digest=True, keep_content=False):
+        result = read_file_once(filepath, want_digest, keep_content, algorithm=self.options.hash_algorithm)
+        if want_digest and self.hash_cache is not None:
+            self.hash_cache.store(filepath, st, self.options.hash_algorithm, result.digest, result.is_text)
+        return result
+
+    def _read_file(self, filepath, st, want_digest=True, keep_content=False):
+        """
+        FileRead for filepath, served from the hash cache when its stat identity
+        is unchanged (no open at all); otherwise the file is read exactly once.
+        """
+        cached = self._lookup_cached(filepath, st, count=want_digest)
+        if cached is not None:
+            return cached
+        return self._hash_file(filepath, st, want_digest, keep_content)
+
+    def _keep_content(self, rel_path, content_a, content_b):
+        if content_a is None or content_b is None:
+            return
+        size = len(content_a) + len(content_b)
+        with self._kept_lock:
+            if self._kept_bytes + size > KEEP_CONTENT_BUDGET:
+                return
+            self._kept_bytes += size
+            self._kept_content[rel_path] = (content_a, content_b)
+
+    def _release_content(self, rel_path):
+        with self._kept_lock:
+            kept = self._kept_content.pop(rel_path, None)
+            if kept is not None:
+                self._kept_bytes -= len(kept[0]) + len(kept[1])
+            return kept
+
+    def release_kept_content(self):
+        """Drop all file contents kept from the compare phase, e.g. when the caller runs the phases itself."""
+        with self._kept_lock:
+            self._kept_content.clear()
+            self._kept_bytes = 0
+
+    def _remember_digest(self, path, digest):
+        if digest and path and self.options.archive_store:
+            self._known_digests[path] = digest
+
+    def _remember_fingerprints(self, rel_path, baseline, record_b, result):
+        # Only digests hashlib can recompute are usable when a report view is checked later
+        algorithm = self.options.hash_algorithm
+        if (self.baseline_is_manifest or not result.digest_a or not result.digest_b
+                or views.fingerprint_algorithm(algorithm) != algorithm):
+            return
+        with self._kept_lock:
+            self._known_fingerprints[rel_path] = {
+                'a': views.known_fingerprint(baseline.stat, result.digest_a, algorithm),
+                'b': views.known_fingerprint(record_b.stat, result.digest_b, algorithm),
+            }
+
+    def _open_hash_cache(self):
+        if not self.options.hash_cache:
+            return
+        try:
+            self.hash_cache = HashCache(self.options.hash_cache_path, self.options.hash_cache_max_bytes)
+            self.log(f"已启用哈希缓存: {self.options.hash_cache_path}")
+        except Exception as e:
+            self.hash_cache = None
+            self.log(f"打开哈希缓存失败，将直接计算哈希: {str(e)}")
+
+    def _close_hash_cache(self):
+        if self.hash_cache is None:
+            return
+        try:
+            self.log(self.hash_cache.stats_text())
+            evicted = self.hash_cache.evict()
+            if evicted:
+                self.log(f"哈希缓存超出大小上限，已淘汰 {evicted} 条记录")
+            self.hash_cache.close()
+        except Exception as e:
+            self.log(f"关闭哈希缓存失败: {str(e)}")
+        finally:
+            self.hash_cache = None
+
+    def compare_files(self, file_a, file_b, st_a=None, st_b=None):
+        """
+        Compare one same-name pair, opening each file at most once. Returns a
+        PairResult with both text flags (sniffed from the first block of the
+        same read), whether the pair is identical and, for small files, the
+        raw bytes so the diff stage does not read them again.
+        """
+        try:
+            if self.stop_flag:
+                return None
+
+            # 1. Size Check (reuses the stat taken during the scan when given)
+            st_a = st_a or os.stat(file_a)
+            st_b = st_b or os.stat(file_b)
+            size_a = st_a.st_size
+            size_b = st_b.st_size
+            keep = size_a <= KEEP_CONTENT_MAX and size_b <= KEEP_CONTENT_MAX
+
+            # If not strict mode, different size = different raw bytes (no hashing, sniff only)
+            if size_a != size_b and not self.strict_mode:
+                read_a = self._read_file(file_a, st_a, want_digest=False, keep_content=keep)
+                read_b = self._read_file(file_b, st_b, want_digest=False, keep_content=keep)
+                identical, reason = False, "大小"
+            else:
+                # 2. Content Check
+                identical, read_a, read_b = self._compare_contents(file_a, file_b, st_a, st_b, keep)
+                reason = "内容"
+
+            # 3. Normalized Check: only text pairs whose raw bytes differ pay for it
+            if not identical and self.normalization and read_a.is_text and read_b.is_text:
+                identical = (self._normalized_digest(file_a, st_a, read_a.content) ==
+                             self._normalized_digest(file_b, st_b, read_b.content))
+
+            if identical:
+                return PairResult(read_a.is_text, read_b.is_text, True)
+            else:
+                if read_a.is_text and read_b.is_text and self.debug_log:
+                    self.log(f"差异({reason}): {os.path.basename(file_a)}", DEBUG, "差异文件")
+                return PairResult(read_a.is_text, read_b.is_text, False, read_a.content, read_b.content,
+                                  read_a.digest, read_b.digest)
+
+        except Exception as e:
+            self.log(f"比较文件时出错: {os.path.basename(file_a)} - {str(e)}", WARNING, "比较文件时出错")
+            return PairResult(True, True, False)
+
+    def _normalized_digest(self, filepath, st, content=None):
+        """Normalized-text digest of filepath (cached per normalization key); content avoids a re-read."""
+        if self.hash_cache is not None:
+            cached = self.hash_cache.lookup(filepath, st, self.normalization)
+            if cached is not None:
+                return cached[0]
+        digest = normalized_digest(filepath, self.options.ignore_whitespace, self.options.ignore_case,
+                                   self.options.ignore_line_endings, self.options.hash_algorithm, content)
+        if self.hash_cache is not None:
+            self.hash_cache.store(filepath, st, self.normalization, digest, True)
+        return digest
+
+    # --- Optimization: Tiered Hashing ---
+    def _compare_contents(self, file_a, file_b, st_a, st_b, keep):
+        """
+        Decide whether a pair's contents match, cheapest evidence first:
+        cached digests (no read), then sampled blocks of large same-size files,
+        then a full hash or an early-exit block comparison.
+        Returns (identical, FileRead a, FileRead b).
+        """
+        cached_a = self._lookup_cached(file_a, st_a)
+        cached_b = self._lookup_cached(file_b, st_b)
+        if cached_a is not None and cached_b is not None:
+            return cached_a.digest == cached_b.digest, cached_a, cached_b
+
+        size = st_a.st_size
+        if (self.options.sample_check and size == st_b.st_size and size >= SAMPLE_MIN_SIZE
+                and cached_a is None and cached_b is None):
+            sampled = samples_differ(file_a, file_b, size)
+            if sampled is not None and sampled[0]:
+                return False, FileRead('', sampled[1]), FileRead('', sampled[2])
+
+        if self.options.compare_mode == 'bytes':
+            return self._compare_bytes(file_a, file_b, st_a, st_b, keep)
+
+        read_a = cached_a or self._hash_file(file_a, st_a, keep_content=keep)
+        read_b = cached_b or self._hash_file(file_b, st_b, keep_content=keep)
+        return bool(read_a.digest) and read_a.digest == read_b.digest, read_a, read_b
+
+    def _compare_bytes(self, file_a, file_b, st_a, st_b, keep):
+        """
+        Block-wise comparison for compare_mode 'bytes'. Identical pairs are
+        hashed on the way through so the hash cache keeps receiving digests.
+        """
+        algorithm = self.options.hash_algorithm if self.hash_cache is not None else None
+        identical, read_a, read_b = compare_bytes(file_a, file_b, algorithm, keep)
+        if identical and self.hash_cache is not None:
+            self.hash_cache.store(file_a, st_a, algorithm, read_a.digest, read_a.is_text)
+            self.hash_cache.store(file_b, st_b, algorithm, read_b.digest, read_b.is_text)
+        return identical, read_a, read_b
+
+    def compare_with_manifest(self, entry, file_b, st_b=None):
+        """Compare a live file against its baseline manifest entry (digest only, no baseline read)."""
+        # Checksum files carry no text flag; treat their entries as text
+        is_text_a = entry.is_text is not False
+        try:
+            if self.stop_flag:
+                return None
+
+            st_b = st_b or os.stat(file_b)
+            if entry.size is not None and entry.size != st_b.st_size and not self.strict_mode:
+                read_b = self._read_file(file_b, st_b, want_digest=False)
+                if is_text_a and read_b.is_text and self.debug_log:
+                    self.log(f"差异(大小): {os.path.basename(file_b)}", DEBUG, "差异文件")
+                return PairResult(is_text_a, read_b.is_text, False)
+
+            if entry.algorithm == self.options.hash_algorithm:
+                read_b = self._read_file(file_b, st_b)
+            else:
+                read_b = read_file_once(file_b, algorithm=entry.algorithm)
+
+            if read_b.digest and read_b.digest == entry.digest.lower():
+                return PairResult(is_text_a, read_b.is_text, True)
+            else:
+                if is_text_a and read_b.is_text and self.debug_log:
+                    self.log(f"差异(内容): {os.path.basename(file_b)}", DEBUG, "差异文件")
+                digest_b = read_b.digest if entry.algorithm == self.options.hash_algorithm else ''
+                return PairResult(is_text_a, read_b.is_text, False, digest_b=digest_b)
+
+        except Exception as e:
+            self.log(f"比较文件时出错: {os.path.basename(file_b)} - {str(e)}", WARNING, "比较文件时出错")
+            return PairResult(is_text_a, True, False)
+
+    # --- Optimization: Parallel Hashing Pool ---
+    def _submit_bounded(self, pool, slots, on_result, fn, *args, on_error=None, progress_bytes=None):
+        """
+        Run fn(*args) on the pool, blocking while the slots are exhausted.
+        on_result(result) is called as each task finishes; if fn raised and
+        on_error is given, on_error(exception) is called instead. With
+        progress_bytes, the finished task advances self.progress by one file
+        and that many bytes.
+        """
+        slots.acquire()
+        try:
+            future = pool.submit(fn, *args)
+        except Exception:
+            slots.release()
+            raise
+
+        def on_done(f):
+            slots.release()
+            if f.cancelled() or self.stop_flag:
+                return
+            if progress_bytes is not None:
+                self.progress.advance(progress_bytes)
+            if on_error is not None and f.exception() is not None:
+                on_error(f.exception())
+                return
+            on_result(f.result())
+
+        future.add_done_callback(on_done)
+
+    def _submit_comparison(self, pool, slots, rel_path, baseline, record_b, modified_files, added_files):
+        """
+        Queue one same-name pair; results stream into modified_files as they
+        finish. baseline is a FileRecord, or a ManifestEntry for manifest baselines.
+        Only text pairs are compared; a binary baseline with a text target counts as added.
+        """
+        def on_result(result):
+            if result is None:
+                return
+            if not result.identical:
+                self._remember_digest(baseline_path, result.digest_a)
+                self._remember_digest(record_b.path, result.digest_b)
+            if result.is_text_a and result.is_text_b:
+                if not result.identical:
+                    self._keep_content(rel_path, result.content_a, result.content_b)
+                    self._remember_fingerprints(rel_path, baseline, record_b, result)
+                    modified_files.append(rel_path)
+                    self.emit('tree_insert', ('modified', (rel_path, "修改")))
+            elif result.is_text_b:
+                added_files.append(rel_path)
+                self.emit('tree_insert', ('added', (rel_path, "新增")))
+
+        baseline_path = None if self.baseline_is_manifest else baseline.path
+        if self.baseline_is_manifest:
+            self._submit_bounded(pool, slots, on_result, self.compare_with_manifest,
+                                 baseline, record_b.path, record_b.stat,
+                                 progress_bytes=record_b.stat.st_size)
+        else:
+            self._submit_bounded(pool, slots, on_result, self.compare_files,
+                                 baseline.path, record_b.path, baseline.stat, record_b.stat,
+                                 progress_bytes=baseline.stat.st_size + record_b.stat.st_size)
+
+    def _submit_sniff(self, pool, slots, rel_path, record, on_text):
+        """Queue a text check for a file present on one side only; on_text(rel_path) if it is text."""
+        def on_result(is_text):
+            if is_text:
+                on_text(rel_path)
+
+        # Only the head of the file is read, so it weighs as one file and no bytes
+        self._submit_bounded(pool, slots, on_result, self.is_text_file, record.path, record.stat,
+                             progress_bytes=0)
+
+    def is_excluded(self, rel_path):
+        if not rel_path:
+            return False
+        return self.exclusions.matches(rel_path)
+
+    def generate_diff_reports(self, modified_files, dir_a, dir_b, reports_dir):
+        if self.baseline_is_manifest:
+            self.log("基线为清单文件，没有原始内容，跳过差异报告")
+            return
+
+        lazy = self.options.report_mode == 'lazy'
+        if lazy:
+            target_dir = os.path.join(reports_dir, report.DATA_DIR)
+            target_name = report.report_data_filename
+        else:
+            target_dir = reports_dir
+            target_name = report.report_filename
+        jobs = []
+        for rel_path in modified_files:
+            file_a = os.path.join(dir_a, rel_path)
+            file_b = os.path.join(dir_b, rel_path)
+            jobs.append((rel_path, file_a, file_b, os.path.join(target_dir, target_name(rel_path)),
+                         file_size(file_a) + file_size(file_b)))
+        try:
+            if lazy:
+                report.write_diff_viewer(reports_dir)
+            elif not self.options.inline_assets:
+                report.write_report_assets(reports_dir)
+        except OSError as e:
+            self.log(f"写入报告样式文件失败: {str(e)}")
+        self._report_index = {}
+        self._start_phase('diff_reports', sum(job[4] for job in jobs), len(jobs))
+        try:
+            workers = min(self.options.report_workers, len(jobs))
+            if workers > 1:
+                jobs = self._render_reports_in_pool(jobs, workers)
+            self._render_reports_serial(jobs)
+        finally:
+            self._finish_phase()
+            self._known_fingerprints = {}
+
+        # --- Optimization: Report Index ---
+        # Lets the GUI's double-click open these reports instead of re-rendering them
+        if not lazy:
+            try:
+                views.write_report_index(reports_dir, self._report_index)
+            except OSError as e:
+                self.log(f"写入报告索引失败: {str(e)}")
+
+    def _log_report(self, rel_path, report_path, coarse, fingerprints):
+        with self._kept_lock:
+            self._report_index[rel_path] = dict(fingerprints, report=os.path.basename(report_path))
+        if self.archive is not None:
+            self.archive.add_file(os.path.relpath(report_path, self._result_dir), report_path, remove=True)
+        if coarse:
+            self.log(f"差异计算超出时间预算，已降级为粗粒度差异: {rel_path}", WARNING, "粗粒度差异")
+        if not self.debug_log:
+            return
+        if self.options.report_mode == 'lazy':
+            self.log(f"已记录差异数据: {report_path}", DEBUG, "已记录差异数据")
+        else:
+            self.log(f"已生成差异报告: {report_path}", DEBUG, "已生成差异报告")
+
+    def _render_reports_serial(self, jobs):
+        for rel_path, file_a, file_b, report_path, nbytes in jobs:
+            if self.stop_flag:
+                self.log("生成差异报告已停止")
+                return
+
+            try:
+                # Small modified files were kept in memory by the compare phase
+                with self._kept_lock:
+                    kept = self._kept_content.get(rel_path) or (None, None)
+                    known = self._known_fingerprints.get(rel_path)
+                self._log_report(rel_path, *render_diff_report(file_a, file_b, report_path, self.options,
+                                                               *kept, known=known))
+            except Exception as e:
+                self.log(f"生成差异报告失败: {rel_path} - {str(e)}", ERROR, "生成差异报告失败")
+
+            self.progress.advance(nbytes)
+
+    def _render_reports_in_pool(self, jobs, workers):
+        """
+        Render reports in worker processes. Only paths cross the process
+        boundary; log lines and progress come back through emit from the done
+        callbacks. Returns the jobs left unfinished because the pool could not
+        start or broke, which the caller renders in-process instead.
+        """
+        finished = set()
+        broken = []
+        lock = threading.Lock()
+
+        def submit(rel_path, file_a, file_b, report_path, nbytes):
+            def on_result(result):
+                with lock:
+                    finished.add(rel_path)
+                self._log_report(rel_path, *result)
+                self.progress.advance(nbytes)
+
+            def on_error(e):
+                if isinstance(e, BrokenProcessPool):
+                    broken.append(e)
+                    return
+                with lock:
+                    finished.add(rel_path)
+                self.log(f"生成差异报告失败: {rel_path} - {str(e)}", ERROR, "生成差异报告失败")
+                self.progress.advance(nbytes)
+
+            with self._kept_lock:
+                known = self._known_fingerprints.get(rel_path)
+            self._submit_bounded(pool, slots, on_result, render_diff_report,
+                                 file_a, file_b, report_path, self.options, None, None, known, on_error=on_error)
+
+        self.log(f"差异报告并发进程: {workers}")
+        # spawn: workers must not inherit the GUI / comparison threads through fork
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        slots = threading.BoundedSemaphore(workers * 2)
+        try:
+            for job in jobs:
+                if self.stop_flag:
+                    self.log("生成差异报告已停止")
+                    break
+                submit(*job)
+        except (OSError, BrokenProcessPool) as e:
+            broken.append(e)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=self.stop_flag or bool(broken))
+
+        if self.stop_flag:
+            return []
+        if broken:
+            self.log(f"差异报告进程池不可用，改为单进程生成: {str(broken[0])}")
+        return [job for job in jobs if job[0] not in finished]
+
+    def generate_summary_html(self, modified_files, added_files, deleted_files, dir_a, dir_b, output_file):
+        try:
+            metrics_rows = [dict(phase.to_dict(), label=PHASE_LABELS[phase.name],
+                                 previous_wall_seconds=self.metrics.previous_wall(phase.name))
+                            for phase in self.metrics.phases]
+            html_content = report.build_summary_html(modified_files, added_files, deleted_files, dir_a, dir_b,
+                                                     link_reports=not self.baseline_is_manifest,
+                                                     lazy_reports=self.options.report_mode == 'lazy',
+                                                     metrics=metrics_rows)
+
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write(html_content)
+
+            self.log(f"已生成汇总报告: {output_file}")
+
+        except Exception as e:
+            self.log(f"生成汇总报告失败: {str(e)}")
+
+    def compare_directories(self):
+        """
+        Run the whole comparison. Returns True when it ran to completion and
+        False when it was stopped; raises ValueError for missing folders.
+        """
+        self.stop_flag = False
+        self.metrics = RunMetrics(self.options.profile, self.options.trace_memory)
+        self.metrics.start()
+        try:
+            completed = self._compare_directories()
+        except BaseException:
+            self._finish_run(propagating=True)
+            raise
+        self._finish_run()
+        return completed
+
+    def _finish_run(self, propagating=False):
+        self.metrics.stop()
+        self._close_log_file()
+        try:
+            self._close_output_archive()
+        except Exception as e:
+            # Failing to finish the archive must not mask the error (or interrupt) that ended the run
+            if not propagating:
+                raise
+            self.log(f"完成压缩包失败: {self.output_dir} - {str(e)}", ERROR)
+
+    def _compare_directories(self):
+        dir_a = self.dir_a
+        dir_b = self.dir_b
+        output_dir = self.output_dir
+
+        self.baseline_is_manifest = os.path.isfile(dir_a)
+        if not os.path.isdir(dir_a) and not self.baseline_is_manifest:
+            raise ValueError(f"原始文件夹不存在: {dir_a}")
+        if not os.path.isdir(dir_b):
+            raise ValueError(f"修改文件夹不存在: {dir_b}")
+
+        if archive_format(output_dir):
+            output_dir = self._open_output_archive()
+        else:
+            self._result_dir = output_dir
+            os.makedirs(output_dir, exist_ok=True)
+        self._open_log_file(output_dir)
+
+        if self.excluded_folders:
+            self.log("排除的文件夹:")
+            for folder in self.excluded_folders:
+                self.log(f"  - {folder}")
+        else:
+            self.log("未排除任何文件夹")
+
+        self.log(f"{'启用' if self.strict_mode else '未启用'}严格模式")
+        ignored = [name for name, enabled in (("空白", self.options.ignore_whitespace),
+                                              ("大小写", self.options.ignore_case),
+                                              ("换行符", self.options.ignore_line_endings)) if enabled]
+        if ignored:
+            self.log(f"比较时忽略: {'、'.join(ignored)}")
+
+        reports_dir = os.path.join(output_dir, "报告")
+        modified_files_dir = os.path.join(output_dir, "修改文件")
+        added_files_dir = os.path.join(output_dir, "新增文件")
+        deleted_files_dir = os.path.join(output_dir, "删除文件")
+
+        os.makedirs(reports_dir, exist_ok=True)
+        if self.options.archive_store:
+            # Fails early, before any comparison work, if the directory is not a store
+            self.archive_store = ArchiveStore(self.options.archive_store, create=True)
+            self.log(f"差异文件将归档到内容寻址存储: {self.options.archive_store}")
+        elif self.archive is None:
+            os.makedirs(modified_files_dir, exist_ok=True)
+            os.makedirs(added_files_dir, exist_ok=True)
+            os.makedirs(deleted_files_dir, exist_ok=True)
+        # The last run's numbers are shown next to this run's in the summary report. An archive
+        # output is rewritten from scratch and its metrics are not read back out of the old one.
+        if self.archive is None:
+            self.metrics.load_previous(os.path.join(reports_dir, METRICS_NAME))
+        else:
+            self.log("输出为压缩包，汇总报告不与上次运行的耗时对比")
+
+        self.log(f"开始比较文件夹: {dir_a} 和 {dir_b}")
+        self.log(f"结果将保存到: {self.output_dir}")
+
+        if self.baseline_is_manifest:
+            self.log(f"正在读取基线清单并扫描修改文件夹: {dir_a}")
+        else:
+            self.log("正在扫描原始文件夹和修改文件夹...")
+
+        # --- Optimization: Single-Pass Scan, Both Trees Concurrently ---
+        phase = self._start_phase('scan')
+
+        def timed(name, fn, *args):
+            start = time.perf_counter()
+            result = fn(*args)
+            phase.extra[name] = round(time.perf_counter() - start, 4)
+            return result
+
+        scan_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="folder-eye-scan")
+        try:
+            future_b = scan_pool.submit(timed, 'scan_b_seconds', self._scan_files, dir_b, False)
+            if self.baseline_is_manifest:
+                files_a = timed('baseline_manifest_seconds', self._load_baseline_manifest, dir_a)
+            else:
+                files_a = timed('scan_a_seconds', self._scan_files, dir_a, True)
+            files_b = future_b.result()
+        finally:
+            scan_pool.shutdown(wait=True)
+            self._finish_phase()
+
+        if self.stop_flag:
+            self.log("对比操作已停止")
+            return False
+
+        if self.baseline_is_manifest:
+            self.log(f"在基线清单中发现 {len(files_a)} 个文件")
+        else:
+            self.log(f"在原始文件夹中发现 {len(files_a)} 个文件")
+        self.log(f"在修改文件夹中发现 {len(files_b)} 个文件")
+
+        # Classification is pure set arithmetic on relative paths: no extra stat calls.
+        # Text/binary flags come from the single read each file gets below.
+        common_files = sorted(files_a.keys() & files_b.keys())
+        only_b = sorted(files_b.keys() - files_a.keys())
+        only_a = sorted(files_a.keys() - files_b.keys())
+
+        modified_files = []
+        added_files = []
+        deleted_files = []
+
+        def on_added(rel_path):
+            added_files.append(rel_path)
+            self.emit('tree_insert', ('added', (rel_path, "新增")))
+
+        def on_deleted(rel_path):
+            deleted_files.append(rel_path)
+            if self.debug_log:
+                self.log(f"发现删除文件: {rel_path}", DEBUG, "发现删除文件")
+            self.emit('tree_insert', ('deleted', (rel_path, "删除")))
+
+        self.log(f"正在比较 {len(common_files)} 个同名文件... (并发线程: {self.options.workers})")
+        if self.baseline_is_manifest:
+            compare_bytes = sum(files_b[rel_path].stat.st_size for rel_path in common_files)
+        else:
+            compare_bytes = sum(files_a[rel_path].stat.st_size + files_b[rel_path].stat.st_size
+                                for rel_path in common_files)
+        phase = self._start_phase('compare', compare_bytes, len(common_files) + len(only_a) + len(only_b))
+        # Deletion and addition checks share the compare pool, so only their counts are separate
+        phase.extra.update(common_files=len(common_files), only_a=len(only_a), only_b=len(only_b))
+
+        self._open_hash_cache()
+        pool = ThreadPoolExecutor(max_workers=self.options.workers, thread_name_prefix="folder-eye-hash")
+        slots = threading.BoundedSemaphore(self.options.max_in_flight)
+        try:
+            for rel_path in only_b:
+                if self.stop_flag:
+                    break
+                self._submit_sniff(pool, slots, rel_path, files_b[rel_path], on_added)
+
+            for rel_path in common_files:
+                if self.stop_flag:
+                    self.log("比较已停止")
+                    break
+
+                self._submit_comparison(pool, slots, rel_path, files_a[rel_path],
+                                        files_b[rel_path], modified_files, added_files)
+
+            self.log("正在检测删除文件...")
+            for rel_path in only_a:
+                if self.stop_flag:
+                    break
+                if self.baseline_is_manifest:
+                    # Checksum files carry no text flag; treat their entries as text
+                    if files_a[rel_path].is_text is not False:
+                        on_deleted(rel_path)
+                    self.progress.advance()
+                else:
+                    self._submit_sniff(pool, slots, rel_path, files_a[rel_path], on_deleted)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=self.stop_flag)
+            self._close_hash_cache()
+            self._finish_phase()
+
+        # Results complete in arbitrary order; keep reports and archives deterministic
+        modified_files.sort()
+        added_files.sort()
+        deleted_files.sort()
+
+        if self.stop_flag:
+            self.log("对比操作已停止")
+            return False
+
+        self.modified_files = modified_files
+        self.added_files = added_files
+        self.deleted_files = deleted_files
+
+        self.log(f"比较完成: 发现 {len(modified_files)} 个修改的文件，{len(added_files)} 个新增的文件，{len(deleted_files)} 个删除的文件")
+
+        if modified_files:
+            self.log("正在生成差异报告...")
+            self.generate_diff_reports(modified_files, dir_a, dir_b, reports_dir)
+
+        if modified_files or added_files or deleted_files:
+            self.log("正在复制差异文件...")
+            copied_b = modified_files + added_files
+            # A manifest baseline has nothing on the A side to copy
+            copied_a = [] if self.baseline_is_manifest else modified_files + deleted_files
+            self._start_phase('copy',
+                              sum(file_size(os.path.join(dir_b, rel_path)) for rel_path in copied_b) +
+                              sum(file_size(os.path.join(dir_a, rel_path)) for rel_path in copied_a),
+                              len(copied_b) + len(copied_a))
+            try:
+                if self.archive_store is not None:
+                    stats = self.store_difference_files(modified_files, added_files, deleted_files,
+                                                        dir_a, dir_b, reports_dir)
+                elif self.archive is not None:
+                    stats = self.pack_difference_files(modified_files, added_files, deleted_files, dir_a, dir_b)
+                else:
+                    stats = self.copy_difference_files(modified_files, added_files, deleted_files, dir_a, dir_b)
+                self._phase.extra['copy_methods'] = dict(stats.methods)
+                self._phase.extra['copy_errors'] = stats.errors
+            finally:
+                self._finish_phase()
+
+        self.log("正在生成汇总报告...")
+        phase = self.metrics.begin('summary')
+        summary_file = os.path.join(reports_dir, "汇总报告.html")
+        self.generate_summary_html(modified_files, added_files, deleted_files, dir_a, dir_b, summary_file)
+        self.metrics.end(phase)
+        self._write_metrics(reports_dir)
+
+        self.log("比较完成!")
+        self.update_status("比较完成", 100)
+        return True
+
+    def _scan_files(self, root_dir, log_excluded):
+        """
+        One scandir pass over root_dir returning {rel_path: FileRecord}. No file
+        is opened here; the text check happens during the compare phase read.
+        """
+        def on_excluded(rel_path, is_dir):
+            if log_excluded and self.debug_log:
+                kind = '文件夹' if is_dir else '文件'
+                self.log(f"跳过排除的{kind}: {rel_path}", DEBUG, f"跳过排除的{kind}")
+
+        def on_error(path, error):
+            self.log(f"无法读取: {path} - {error}", WARNING, "无法读取")
+
+        def on_file(record):
+            self.progress.advance()
+
+        return scan_tree(root_dir, self.exclusions, lambda: self.stop_flag, on_excluded, on_error, on_file)
+
+    def _load_baseline_manifest(self, manifest_path):
+        """rel_path -> ManifestEntry for every file recorded in a manifest or checksum file."""
+        entries = {}
+        for entry in iter_manifest(manifest_path, self.options.checksum_algorithm):
+            if self.is_excluded(entry.rel_path):
+                continue
+            entries[entry.rel_path] = entry
+        return entries
+
+    # --- Manifest Export ---
+    def _write_manifest_record(self, writer, record, rel_path):
+        try:
+            # Digest and text flag come from the same single read
+            result = self._read_file(record.path, record.stat)
+            writer.write(rel_path, record.stat, result.digest, result.is_text)
+        except Exception as e:
+            self.log(f"写入清单记录失败: {rel_path} - {str(e)}")
+
+    def export_manifest(self, manifest_path):
+        """
+        Snapshot dir_a into a streaming manifest. Returns True when complete and
+        False when stopped; raises ValueError if the folder does not exist.
+        """
+        self.stop_flag = False
+        root_dir = self.dir_a
+        if not os.path.isdir(root_dir):
+            raise ValueError(f"文件夹不存在: {root_dir}")
+
+        self.log(f"正在导出清单: {root_dir} -> {manifest_path}")
+        self._open_hash_cache()
+        pool = ThreadPoolExecutor(max_workers=self.options.workers, thread_name_prefix="folder-eye-hash")
+        slots = threading.BoundedSemaphore(self.options.max_in_flight)
+        writer = ManifestWriter(manifest_path, root_dir, self.options.hash_algorithm)
+        try:
+            files = scan_tree(root_dir, self.exclusions, lambda: self.stop_flag,
+                              on_error=lambda path, error: self.log(f"无法读取: {path} - {error}", WARNING, "无法读取"))
+            self.progress.start("导出清单", sum(record.stat.st_size for record in files.values()), len(files))
+            for rel_path, record in files.items():
+                if self.stop_flag:
+                    break
+                self._submit_bounded(pool, slots, lambda _: None,
+                                     self._write_manifest_record, writer, record, rel_path,
+                                     progress_bytes=record.stat.st_size)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=self.stop_flag)
+            writer.close()
+            self._close_hash_cache()
+            self._finish_phase()
+
+        if self.stop_flag:
+            self.log("导出清单已停止")
+            return False
+
+        self.log(f"清单导出完成: 共 {writer.count} 个文件")
+        return True
+
+    def summary_text(self):
+        return (f"比较完成!\n发现 {len(self.modified_files)} 个修改的文件、"
+                f"{len(self.added_files)} 个新增的文件、{len(self.deleted_files)} 个删除的文件")
+
+    # --- Optimization: Parallel Copy Engine ---
+    def _copy_callbacks(self):
+        def on_error(src, error):
+            self.log(f"复制文件失败: {src} - {error}", WARNING, "复制文件失败")
+
+        return dict(on_copied=self.progress.advance, on_error=on_error, should_stop=lambda: self.stop_flag)
+
+    def _run_copies(self, jobs, copier=None):
+        """Copy (src, dest, content) jobs on the copy pool; returns its CopyStats."""
+        copier = copier or CopyEngine(self.options.copy_workers, self.options.copy_mode, **self._copy_callbacks())
+        stats = copier.run(jobs)
+        if stats.files:
+            self.log(f"复制方式: {stats.methods_text()}")
+        return stats
+
+    def _modified_copy_jobs(self, modified_files, dir_a, dir_b, target_dir):
+        for rel_path in modified_files:
+            # Released as the job is queued, so kept bytes leave memory with the copy
+            kept = self._release_content(rel_path)
+            # A manifest baseline has no original content to archive
+            if not self.baseline_is_manifest:
+                yield (os.path.join(dir_a, rel_path), os.path.join(target_dir, "原始文件", rel_path),
+                       kept[0] if kept else None)
+            yield (os.path.join(dir_b, rel_path), os.path.join(target_dir, "修改文件", rel_path),
+                   kept[1] if kept else None)
+
+    def _added_copy_jobs(self, added_files, dir_b, target_dir):
+        for rel_path in added_files:
+            yield os.path.join(dir_b, rel_path), os.path.join(target_dir, rel_path), None
+
+    def _deleted_copy_jobs(self, deleted_files, dir_a, target_dir):
+        if self.baseline_is_manifest and deleted_files:
+            self.log("基线为清单文件，删除的文件无法归档")
+            return
+        for rel_path in deleted_files:
+            yield os.path.join(dir_a, rel_path), os.path.join(target_dir, rel_path), None
+
+    def _difference_copy_jobs(self, modified_files, added_files, deleted_files, dir_a, dir_b):
+        output_dir = self._result_dir
+        return itertools.chain(
+            self._modified_copy_jobs(modified_files, dir_a, dir_b, os.path.join(output_dir, "修改文件")),
+            self._added_copy_jobs(added_files, dir_b, os.path.join(output_dir, "新增文件")),
+            self._deleted_copy_jobs(deleted_files, dir_a, os.path.join(output_dir, "删除文件")),
+        )
+
+    def copy_difference_files(self, modified_files, added_files, deleted_files, dir_a, dir_b):
+        """Archive all three groups through one copy pool."""
+        return self._run_copies(self._difference_copy_jobs(modified_files, added_files, deleted_files, dir_a, dir_b))
+
+    # --- Optimization: Content-Addressed Archive Store ---
+    def store_difference_files(self, modified_files, added_files, deleted_files, dir_a, dir_b, reports_dir):
+        """
+        Put the differing files into the archive store (only contents it does
+        not hold yet are written) and write the run's path -> digest index.
+        """
+        writer = ArchiveWriter(self.archive_store, self._result_dir, self.options.hash_algorithm, new_hasher,
+                               known_digest=self._known_digests.get, workers=self.options.copy_workers,
+                               **self._copy_callbacks())
+        stats = self._run_copies(self._difference_copy_jobs(modified_files, added_files, deleted_files,
+                                                            dir_a, dir_b), writer)
+        self._known_digests = {}
+        index = writer.index(dir_a=os.path.abspath(dir_a), dir_b=os.path.abspath(dir_b),
+                             output_dir=os.path.abspath(self.output_dir))
+        write_index(os.path.join(reports_dir, ARCHIVE_INDEX_NAME), index)
+        self.archive_store.write_run(index)
+        self.log(f"已归档到存储 {self.options.archive_store}: {stats.files} 个文件，"
+                 f"新写入 {format_size(writer.written_bytes)}，运行 ID {writer.run_id}")
+        self._phase.extra['store_written_bytes'] = writer.written_bytes
+        return stats
+
+    # --- Optimization: Streaming Archive Output ---
+    def _open_output_archive(self):
+        """Start the archive named by output_dir; returns the local work folder results are written to."""
+        def on_error(arcname, error):
+            self._archive_errors += 1
+            self.log(f"写入压缩包失败: {arcname} - {error}", WARNING, "写入压缩包失败")
+
+        self._archive_errors = 0
+        self.archive = StreamingArchive(self.output_dir, on_error=on_error)
+        self._result_dir = tempfile.mkdtemp(prefix="folder-eye-")
+        self.log(f"结果将流式写入压缩包 ({self.archive.format})，临时工作目录: {self._result_dir}")
+        return self._result_dir
+
+    def _close_output_archive(self):
+        """Append what is left in the work folder (assets, indexes, summary, metrics, log) and finish the archive."""
+        archive, self.archive = self.archive, None
+        if archive is None:
+            return
+        work_dir = self._result_dir
+        try:
+            for dirpath, dirnames, filenames in os.walk(work_dir):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    path = os.path.join(dirpath, name)
+                    archive.add_file(os.path.relpath(path, work_dir), path, remove=True)
+            archive.close()
+            self.log(f"已写入压缩包: {self.output_dir} ({archive.files} 个文件，"
+                     f"{format_size(os.path.getsize(self.output_dir))})")
+        finally:
+            self._result_dir = self.output_dir
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def pack_difference_files(self, modified_files, added_files, deleted_files, dir_a, dir_b):
+        """Stream the differing files into the output archive, straight from both trees."""
+        archive = self.archive
+        files, nbytes, errors = archive.files, archive.bytes, self._archive_errors
+        for src, dest, content in self._difference_copy_jobs(modified_files, added_files, deleted_files,
+                                                             dir_a, dir_b):
+            if self.stop_flag:
+                break
+            arcname = os.path.relpath(dest, self._result_dir)
+            if content is None:
+                archive.add_file(arcname, src, on_written=self.progress.advance)
+                continue
+            try:
+                st = os.stat(src)
+            except OSError:
+                st = None
+            archive.add_bytes(arcname, content, st, on_written=self.progress.advance)
+        archive.wait()
+
+        stats = CopyStats()
+        stats.files = archive.files - files
+        stats.bytes = archive.bytes - nbytes
+        stats.errors = self._archive_errors - errors
+        if stats.files:
+            stats.methods['archived'] = stats.files
+            self.log(f"已写入压缩包: {stats.files} 个差异文件")
+        return stats
+
+    def copy_modified_files(self, modified_files, dir_a, dir_b, target_dir):
+        return self._run_copies(self._modified_copy_jobs(modified_files, dir_a, dir_b, target_dir))
+
+    def copy_added_files(self, added_files, dir_b, target_dir):
+        return self._run_copies(self._added_copy_jobs(added_files, dir_b, target_dir))
+
+    def copy_deleted_files(self, deleted_files, dir_a, target_dir):
+        return self._run_copies(self._deleted_copy_jobs(deleted_files, dir_a, target_dir))
+
+
+# --- Command Line Entry Point ---
+def load_excluded_folders(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        prog="folder_eye_engine.py",
+        description="文件夹比较工具（命令行模式）：比较两个文件夹并生成差异报告",
+    )
+    parser.add_argument("dir_a", help="原始文件夹 (A)，也可以是清单文件或 sha256sum 格式的校验文件")
+    parser.add_argument("dir_b", nargs="?", help="修改文件夹 (B)")
+    parser.add_argument("--export-manifest", metavar="FILE",
+                        help="只为 DIR_A 导出清单（.jsonl，后缀 .gz 时压缩），不做比较")
+    parser.add_argument("--checksum-algorithm", metavar="ALGORITHM",
+                        choices=available_hash_algorithms() + ['sha224', 'sha384', 'sha512'],
+                        help="基线为不带算法标记的校验文件时使用的算法，例如 b2sum 输出需指定 blake2b"
+                             "（默认按校验值长度推断；128 位十六进制无法区分 sha512 与 blake2b）")
+    parser.add_argument("-o", "--output", default=os.path.join(get_app_dir(), "对比结果"),
+                        help="输出文件夹（默认: 程序目录下的 对比结果）；以 .tar.zst、.tar.gz 或 .zip 结尾时，"
+                             "全部结果流式写入这一个压缩包")
+    parser.add_argument("--strict", action="store_true",
+                        help="严格模式：文件大小不同时仍然比较内容")
+    # Same defaults as ComparisonOptions and the GUI checkboxes: whitespace and line endings are ignored
+    parser.add_argument("--ignore-whitespace", dest="ignore_whitespace", action="store_true", default=True,
+                        help="忽略空白（默认开启）")
+    parser.add_argument("--no-ignore-whitespace", dest="ignore_whitespace", action="store_false",
+                        help="不忽略空白差异")
+    parser.add_argument("--ignore-case", action="store_true", help="忽略大小写")
+    parser.add_argument("--ignore-line-endings", dest="ignore_line_endings", action="store_true", default=True,
+                        help="忽略换行符差异 (CRLF/LF/CR)（默认开启）")
+    parser.add_argument("--no-ignore-line-endings", dest="ignore_line_endings", action="store_false",
+                        help="不忽略换行符差异")
+    parser.add_argument("-x", "--exclude", action="append", default=[], metavar="REL_PATH",
+                        help="排除的相对路径文件夹，可重复指定")
+    parser.add_argument("--exclude-config", metavar="FILE",
+                        help="从 exclude_config.json 格式的文件读取排除列表")
+    parser.add_argument("-j", "--workers", type=int, metavar="N",
+                        help=f"并发哈希线程数（默认: {default_worker_count()}）")
+    parser.add_argument("--max-in-flight", type=int, metavar="N",
+                        help="同时排队或进行中的文件对上限（默认: 线程数 x 4）")
+    parser.add_argument("--compare-mode", choices=("hash", "bytes"), default="hash",
+                        help="hash: 计算两侧哈希（可利用哈希缓存）；bytes: 逐块比较，发现差异立即停止（默认: %(default)s）")
+    parser.add_argument("--hash-algorithm", choices=available_hash_algorithms(), default=DEFAULT_HASH_ALGORITHM,
+                        help="完整哈希所用算法，记录在清单和哈希缓存中（默认: %(default)s；xxh3 需安装 xxhash）")
+    parser.add_argument("--no-sample-check", action="store_true",
+                        help="关闭大文件的首/尾/中间块抽样预检")
+    parser.add_argument("--report-workers", type=int, metavar="N",
+                        help=f"生成差异报告的进程数，1 表示不使用子进程（默认: {default_report_worker_count()}）")
+    parser.add_argument("--inline-assets", action="store_true",
+                        help="在每个差异报告中内嵌 CSS/JS，生成可单独拷贝的离线单文件")
+    parser.add_argument("--diff-algorithm", choices=DIFF_ALGORITHMS, default="auto",
+                        help="差异算法：auto 对大文件使用 histogram，小文件使用 difflib（默认: %(default)s）")
+    parser.add_argument("--diff-time-budget", type=float, metavar="SECONDS", default=DEFAULT_TIME_BUDGET,
+                        help="单个文件差异计算的时间预算，超出后降级为粗粒度差异（默认: %(default)s 秒）")
+    parser.add_argument("--report-mode", choices=("html", "lazy"), default="html",
+                        help="html: 为每个修改文件生成差异报告；lazy: 只保存压缩的差异数据，在汇总报告中打开时再渲染（默认: %(default)s）")
+    parser.add_argument("--log-level", choices=tuple(LOG_LEVELS), default="debug",
+                        help="日志级别；info 及以上会跳过逐个文件的日志（默认: %(default)s）")
+    parser.add_argument("--no-log-file", action="store_true", help=f"不在结果文件夹中写入 {LOG_FILE_NAME}")
+    parser.add_argument("--profile", action="store_true",
+                        help="用 cProfile 分析比较主线程，结果写入报告文件夹的 profile.pstats / profile.txt")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="用 tracemalloc 记录每个阶段的 Python 内存峰值和主要分配位置（写入 metrics.json，会变慢）")
+    parser.add_argument("--copy-workers", type=int, metavar="N",
+                        help=f"并发复制线程数（默认: {default_copy_worker_count()}）")
+    parser.add_argument("--hardlink", action="store_true",
+                        help="与源文件在同一文件系统时用硬链接代替复制（归档文件与源文件共享内容，源文件之后的修改会反映到归档中）")
+    parser.add_argument("--archive-store", metavar="DIR",
+                        help="把差异文件存入内容寻址存储（相同内容只保存一次），结果文件夹中只写入路径索引")
+    parser.add_argument("--no-hash-cache", action="store_true", help="不使用持久化哈希缓存")
+    parser.add_argument("--hash-cache", metavar="FILE",
+                        help=f"哈希缓存数据库路径（默认: {default_cache_path()}）")
+    parser.add_argument("--hash-cache-size", type=int, metavar="MB", default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="哈希缓存大小上限，超出后淘汰最久未使用的记录（默认: %(default)s MB）")
+    parser.add_argument("-q", "--quiet", action="store_true", help="不输出运行日志")
+    return parser
+
+
+def main(argv=None):
+    """
+    Exit codes follow diff(1): 0 = no differences, 1 = differences found,
+    2 = error, 130 = interrupted.
+    """
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if not args.export_manifest and not args.dir_b:
+        parser.error("需要指定修改文件夹 (B)，或使用 --export-manifest")
+
+    excluded_folders = list(args.exclude)
+    if args.exclude_config:
+        try:
+            excluded_folders.extend(load_excluded_folders(args.exclude_config))
+        except Exception as e:
+            print(f"加载排除文件夹配置失败: {e}", file=sys.stderr)
+            return 2
+
+    options = ComparisonOptions(
+        excluded_folders=excluded_folders,
+        strict_mode=args.strict,
+        ignore_whitespace=args.ignore_whitespace,
+        ignore_case=args.ignore_case,
+        ignore_line_endings=args.ignore_line_endings,
+        workers=args.workers,
+        max_in_flight=args.max_in_flight,
+        compare_mode=args.compare_mode,
+        hash_algorithm=args.hash_algorithm,
+        sample_check=not args.no_sample_check,
+        report_workers=args.report_workers,
+        inline_assets=args.inline_assets,
+        diff_algorithm=args.diff_algorithm,
+        diff_time_budget=args.diff_time_budget,
+        report_mode=args.report_mode,
+        log_level=args.log_level,
+        log_file=not args.no_log_file,
+        profile=args.profile,
+        trace_memory=args.trace_memory,
+        copy_workers=args.copy_workers,
+        copy_mode='hardlink' if args.hardlink else 'copy',
+        archive_store=args.archive_store,
+        checksum_algorithm=args.checksum_algorithm,
+        hash_cache=not args.no_hash_cache,
+        hash_cache_path=args.hash_cache,
+        hash_cache_max_bytes=args.hash_cache_size * 1024 * 1024,
+    )
+
+    # A live status line (progress, MB/s, ETA) only makes sense on a terminal
+    show_status = not args.quiet and sys.stderr.isatty()
+
+    def emit(msg_type, data):
+        if args.quiet:
+            return
+        if msg_type == 'log':
+            sys.stderr.write(("\r\033[K" if show_status else "") + data[0])
+            sys.stderr.flush()
+        elif msg_type == 'status' and show_status:
+            sys.stderr.write("\r\033[K" + data[0])
+            sys.stderr.flush()
+
+    engine = ComparisonEngine(args.dir_a, args.dir_b, args.output, options, emit)
+    try:
+        if args.export_manifest:
+            return 0 if engine.export_manifest(args.export_manifest) else 130
+        completed = engine.compare_directories()
+    except KeyboardInterrupt:
+        engine.stop()
+        print("对比操作已中断", file=sys.stderr)
+        return 130
+    except Exception as e:
+        print(f"比较文件夹时发生错误: {e}", file=sys.stderr)
+        return 2
+
+    if not completed:
+        return 130
+
+    print(engine.summary_text())
+    has_differences = engine.modified_files or engine.added_files or engine.deleted_files
+    return 1 if has_differences else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Logging helpers for Folder-Eye.
+
+* Levels: messages below the configured level are dropped by the engine, and
+  per-file (hot path) messages check ``ComparisonEngine.debug_log`` first so
+  their text is never even formatted when DEBUG is off.
+* ``RotatingLogFile`` streams the complete log of a run into the output
+  directory, rolling over to numbered backups at a size limit.
+* ``LogRing`` is the bounded on-screen log: a fixed number of entries, with
+  repeated messages of one category folded into a single counted entry.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LOG_LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR}
+_LEVEL_NAMES = {level: name.upper() for name, level in LOG_LEVELS.items()}
+
+LOG_FILE_NAME = "运行日志.log"
+DEFAULT_LOG_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_LOG_BACKUPS = 3
+DEFAULT_RING_SIZE = 2000
+
+
+def parse_log_level(level):
+    """Accept a level number or one of LOG_LEVELS' names."""
+    if isinstance(level, int):
+        return level
+    try:
+        return LOG_LEVELS[level.lower()]
+    except KeyError:
+        raise ValueError(f"未知的日志级别: {level}")
+
+
+class RotatingLogFile:
+    """Append-only log file shared by all engine threads; rotates to path.1 .. path.N past max_bytes."""
+
+    def __init__(self, path, max_bytes=DEFAULT_LOG_MAX_BYTES, backups=DEFAULT_LOG_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+        self._f = open(path, 'a', encoding='utf-8')
+        self._size = self._f.tell()
+
+    def write(self, timestamp, level, message):
+        line = f"{timestamp:%Y-%m-%d %H:%M:%S} [{_LEVEL_NAMES.get(level, level)}] {message}\n"
+        with self._lock:
+            if self._f is None:
+                return
+            self._f.write(line)
+            # Character count is close enough to bytes for deciding when to roll over
+            self._size += len(line)
+            if self._size >= self.max_bytes:
+                self._rotate_locked()
+
+    def _rotate_locked(self):
+        self._f.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        self._f = open(self.path, 'w', encoding='utf-8')
+        self._size = 0
+
+    def close(self):
+        with self._lock:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+
+
+class LogRing:
+    """
+    The last ``capacity`` log entries. A message with a category is folded
+    into the entry already holding that category, which then shows the count
+    and the latest message, e.g. "跳过排除的文件 ×12,345".
+    """
+
+    def __init__(self, capacity=DEFAULT_RING_SIZE):
+        self.capacity = capacity
+        # key -> [text, count]; categorized entries are keyed by category, the rest by a serial number
+        self._entries = OrderedDict()
+        self._serial = 0
+        self.dropped = 0
+
+    def add(self, text, category=None):
+        """
+        Returns True if the entry was simply appended, so a view may append
+        text too; False if earlier entries changed and it should re-render.
+        """
+        if category is not None and category in self._entries:
+            entry = self._entries[category]
+            entry[0] = text
+            entry[1] += 1
+            self._entries.move_to_end(category)
+            return False
+        if category is None:
+            self._serial += 1
+            key = self._serial
+        else:
+            key = category
+        self._entries[key] = [text, 1]
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.dropped += 1
+            return False
+        return True
+
+    def clear(self):
+        self._entries.clear()
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def render(self):
+        """The ring as text, one line per entry, oldest first."""
+        lines = []
+        if self.dropped:
+            lines.append(f"... 已省略 {self.dropped:,} 条较早的日志，完整日志见输出文件夹中的 {LOG_FILE_NAME}\n")
+        for key, (text, count) in self._entries.items():
+            if count > 1:
+                lines.append(f"{key} ×{count:,}  最近: {text}")
+            else:
+                lines.append(text)
+        return ''.join(lines)
@@ -0,0 +1,209 @@
+"""Tree manifests for Folder-Eye.
+
+A manifest is a JSON Lines snapshot of a directory tree: one header line
+followed by one record per file (relative path, size, mtime, digest and
+text/binary flag). It is written and read as a stream, optionally gzip
+compressed (``.gz`` suffix), so a baseline can be compared against without the
+original tree being mounted.
+
+``iter_manifest`` also accepts standard checksum files, both GNU
+(``sha256sum`` / ``md5sum`` output) and BSD (``SHA256 (path) = digest``) style.
+Those carry only a digest, so size and text flag are unknown.
+"""
+import os
+import re
+import json
+import gzip
+import hashlib
+import threading
+from datetime import datetime
+
+MANIFEST_FORMAT = "folder-eye-manifest"
+MANIFEST_VERSION = 1
+
+# Digest length (hex chars) -> algorithm, for checksum files that do not name it
+_ALGORITHM_BY_LENGTH = {
+    32: 'md5',
+    40: 'sha1',
+    56: 'sha224',
+    64: 'sha256',
+    96: 'sha384',
+}
+# Lengths shared by several common tools: 128 is sha512sum and b2sum (BLAKE2b-512)
+_AMBIGUOUS_LENGTHS = {
+    128: ('sha512', 'blake2b'),
+}
+
+# b2sum -l N --tag writes 'BLAKE2b-N'; the full-length forms are plain blake2b / blake2s
+_SIZED_BLAKE2 = re.compile(r'^blake2([bs])-(\d+)$')
+_BLAKE2_BITS = {'b': 512, 's': 256}
+
+_GNU_LINE = re.compile(r'^(\\?)([0-9a-fA-F]+) [ *](.+)$')
+_BSD_LINE = re.compile(r'^\\?([A-Za-z0-9-]+) \((.+)\) = ([0-9a-fA-F]+)$')
+
+
+class ManifestEntry:
+    __slots__ = ('rel_path', 'size', 'mtime_ns', 'digest', 'is_text', 'algorithm')
+
+    def __init__(self, rel_path, size, mtime_ns, digest, is_text, algorithm):
+        self.rel_path = rel_path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.digest = digest
+        self.is_text = is_text
+        self.algorithm = algorithm
+
+
+def _open_text(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8', newline='\n')
+    return open(path, mode, encoding='utf-8', newline='\n')
+
+
+def _to_manifest_path(rel_path):
+    # Manifests always use '/' so they stay portable between Windows and Linux
+    return rel_path.replace(os.path.sep, '/')
+
+
+def _from_manifest_path(path):
+    return os.path.normpath(path.replace('/', os.path.sep))
+
+
+class ManifestWriter:
+    """Streams manifest records to disk; write() may be called from any thread."""
+
+    def __init__(self, path, root, algorithm='sha256'):
+        self.path = path
+        self.algorithm = algorithm
+        self.count = 0
+        self._lock = threading.Lock()
+        self._f = _open_text(path, 'w')
+        header = {
+            'format': MANIFEST_FORMAT,
+            'version': MANIFEST_VERSION,
+            'algorithm': algorithm,
+            'root': os.path.abspath(root),
+            'created': datetime.now().isoformat(timespec='seconds'),
+        }
+        self._f.write(json.dumps(header, ensure_ascii=False) + '\n')
+
+    def write(self, rel_path, st, digest, is_text):
+        record = {
+            'path': _to_manifest_path(rel_path),
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'digest': digest,
+            'text': is_text,
+        }
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._f.write(line)
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _unescape_gnu_path(path):
+    # coreutils prefixes the line with '\' and escapes '\\' and '\n' in such names
+    return path.replace('\\\\', '\0').replace('\\n', '\n').replace('\0', '\\')
+
+
+def sized_blake2(algorithm):
+    """A hasher for 'blake2b-N' / 'blake2s-N' (N bits), or None for any other name."""
+    match = _SIZED_BLAKE2.match(algorithm)
+    if not match:
+        return None
+    variant, bits = match.group(1), int(match.group(2))
+    if bits % 8 or not 8 <= bits <= _BLAKE2_BITS[variant]:
+        raise ValueError(f"不支持的 BLAKE2 长度: {algorithm}")
+    return getattr(hashlib, f'blake2{variant}')(digest_size=bits // 8)
+
+
+def _tag_algorithm(tag, digest):
+    """Algorithm name for a BSD tag such as SHA256, SHA3-256 or BLAKE2b-256; rejects what cannot be verified."""
+    name = tag.lower()
+    match = _SIZED_BLAKE2.match(name)
+    if match:
+        if int(match.group(2)) == _BLAKE2_BITS[match.group(1)]:
+            name = f'blake2{match.group(1)}'
+        candidates = [name]
+    else:
+        candidates = [name.replace('-', ''), name.replace('-', '_')]
+    for candidate in candidates:
+        # SHAKE has no fixed digest size
+        if candidate.startswith('shake'):
+            continue
+        try:
+            hasher = sized_blake2(candidate) or hashlib.new(candidate)
+        except ValueError:
+            continue
+        # A wrong length would otherwise turn every entry into a difference later
+        if hasher.digest_size * 2 != len(digest):
+            raise ValueError(f"校验值长度 {len(digest)} 与算法 {tag} 不符")
+        return candidate
+    raise ValueError(f"不支持的校验算法: {tag}")
+
+
+def _parse_checksum_line(line, algorithm=None):
+    match = _BSD_LINE.match(line)
+    if match:
+        tag, path, digest = match.groups()
+        return ManifestEntry(_from_manifest_path(path), None, None, digest.lower(), None,
+                             _tag_algorithm(tag, digest))
+    match = _GNU_LINE.match(line)
+    if match:
+        escaped, digest, path = match.groups()
+        if escaped:
+            path = _unescape_gnu_path(path)
+        if algorithm is None:
+            algorithm = _ALGORITHM_BY_LENGTH.get(len(digest))
+        if algorithm is None:
+            candidates = _AMBIGUOUS_LENGTHS.get(len(digest))
+            if candidates:
+                raise ValueError(f"校验值长度 {len(digest)} 可能来自 {' 或 '.join(candidates)}，无法确定算法；"
+                                 f"请使用带算法标记的 BSD 格式（如 sha512sum --tag / b2sum --tag），"
+                                 f"或用 --checksum-algorithm 指定")
+            raise ValueError(f"无法识别的校验值长度: {line}")
+        return ManifestEntry(_from_manifest_path(path), None, None, digest.lower(), None, algorithm)
+    raise ValueError(f"无法解析的校验行: {line}")
+
+
+def iter_manifest(path, checksum_algorithm=None):
+    """
+    Yield ManifestEntry objects from a Folder-Eye manifest or a checksum file.
+    checksum_algorithm names the algorithm of untagged (GNU style) checksum
+    lines; without it the algorithm is inferred from the digest length, and
+    lengths several tools share are rejected.
+    """
+    with _open_text(path, 'r') as f:
+        algorithm = None
+        is_manifest = None
+        for line in f:
+            line = line.rstrip('\r\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+
+            if is_manifest is None:
+                is_manifest = line.lstrip().startswith('{')
+                if is_manifest:
+                    header = json.loads(line)
+                    if header.get('format') != MANIFEST_FORMAT:
+                        raise ValueError(f"不是有效的清单文件: {path}")
+                    algorithm = header.get('algorithm', 'sha256')
+                    continue
+
+            if is_manifest:
+                record = json.loads(line)
+                yield ManifestEntry(_from_manifest_path(record['path']), record.get('size'),
+                                    record.get('mtime_ns'), record['digest'], record.get('text'),
+                                    record.get('algorithm', algorithm))
+            else:
+                yield _parse_checksum_line(line, checksum_algorithm)
@@ -0,0 +1,314 @@
+"""Per-phase run metrics for Folder-Eye.
+
+Every comparison records, per phase (scan, compare, diff reports, copy,
+summary), the wall and CPU time, bytes read and written by the process, the
+files and bytes the phase scheduled, and the phase's own peak memory. The result
+is written to ``报告/metrics.json`` and shown in the summary report next to
+the previous run's numbers, so a slower run stands out.
+
+CPU time includes all threads and, once they have exited, the diff report
+worker processes; I/O counters and memory cover this process only. The peak
+memory of a phase is measured from its start. On Linux the kernel's
+high-water mark (VmHWM) is reset when a phase begins and read when it ends.
+Elsewhere a background thread samples the resident size while the phase
+runs, through psutil when installed, so short spikes between samples can be
+missed. Without either, no per-phase peak is recorded. The run's overall
+peak is the largest phase peak.
+
+Two optional, heavier captures:
+
+* ``profile``: cProfile of the comparison thread, saved as ``profile.pstats``
+  plus a text summary of the top functions in ``profile.txt``.
+* ``trace_memory``: tracemalloc, adding the peak of traced Python allocations
+  per phase and the top allocation sites to metrics.json.
+"""
+import io
+import os
+import sys
+import json
+import time
+import pstats
+import threading
+import cProfile
+import tracemalloc
+from datetime import datetime
+
+try:
+    import psutil  # Optional: I/O counters and peak memory on every platform
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+METRICS_NAME = "metrics.json"
+PROFILE_NAME = "profile.pstats"
+PROFILE_TEXT_NAME = "profile.txt"
+METRICS_VERSION = 1
+
+PHASE_LABELS = {
+    'scan': "扫描",
+    'compare': "比较",
+    'diff_reports': "差异报告",
+    'copy': "复制",
+    'summary': "汇总报告",
+}
+
+# Seconds between resident-size samples where the kernel peak cannot be reset
+RSS_SAMPLE_INTERVAL = 0.05
+
+# Functions listed in profile.txt / allocation sites kept in metrics.json
+PROFILE_TOP = 40
+ALLOCATION_TOP = 15
+
+
+def _io_counters():
+    """(bytes read, bytes written) through read/write calls of this process so far, or (None, None)."""
+    if psutil is not None:
+        try:
+            counters = psutil.Process().io_counters()
+            return (getattr(counters, 'read_chars', counters.read_bytes),
+                    getattr(counters, 'write_chars', counters.write_bytes))
+        except (AttributeError, psutil.Error):
+            pass
+    try:
+        with open('/proc/self/io', 'r') as f:
+            fields = dict(line.split(':', 1) for line in f)
+        return int(fields['rchar']), int(fields['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+# --- Optimization: Per-Phase Peak Memory ---
+def _reset_peak_rss():
+    """Reset Linux's peak resident size (VmHWM, also ru_maxrss) to the current size; False if not possible."""
+    if not sys.platform.startswith('linux'):
+        return False
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _kernel_peak_rss():
+    """Peak resident size since the last reset, from /proc/self/status, else ru_maxrss; None if unknown."""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return None
+
+
+def _current_rss():
+    if psutil is not None:
+        try:
+            return psutil.Process().memory_info().rss
+        except psutil.Error:
+            pass
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class _RssSampler:
+    """Tracks the largest resident size seen on a background thread until stop()."""
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = _current_rss() or 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="folder-eye-rss", daemon=True)
+        self._thread.start()
+
+    def _sample(self):
+        rss = _current_rss()
+        if rss is not None and rss > self.peak:
+            self.peak = rss
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self._sample()
+        return self.peak
+
+
+def _cpu_seconds():
+    times = os.times()
+    # Children count once they have been waited for, i.e. after the report pool shut down
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class PhaseMetrics:
+    __slots__ = ('name', 'wall_seconds', 'cpu_seconds', 'read_bytes', 'written_bytes',
+                 'files', 'bytes', 'peak_rss', 'peak_rss_method', 'traced_peak', 'extra', '_start', '_sampler')
+
+    def __init__(self, name):
+        self.name = name
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.read_bytes = None
+        self.written_bytes = None
+        self.files = None
+        self.bytes = None
+        # Peak resident size during the phase; method is 'hwm' (kernel) or 'sampled'
+        self.peak_rss = None
+        self.peak_rss_method = None
+        self.traced_peak = None
+        # Phase-specific figures, e.g. the scan time of each tree
+        self.extra = {}
+        self._start = None
+        self._sampler = None
+
+    def to_dict(self):
+        data = {slot: getattr(self, slot) for slot in self.__slots__
+                if slot != 'extra' and not slot.startswith('_')}
+        data.update(self.extra)
+        return data
+
+
+class RunMetrics:
+    """Collects PhaseMetrics for one run. Phases are sequential: begin() / end() pairs do not nest."""
+
+    def __init__(self, profile=False, trace_memory=False):
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.phases = []
+        self.previous = None
+        self.top_allocations = None
+        self.started = None
+        self._started_wall = None
+        self._profiler = None
+        self._stats_text = None
+        self._owns_tracemalloc = False
+        self._open_phase = None
+
+    def start(self):
+        self.started = datetime.now().isoformat(timespec='seconds')
+        self._started_wall = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def begin(self, name):
+        """Start measuring a phase; pass the returned PhaseMetrics to end()."""
+        self._stop_sampler()
+        record = PhaseMetrics(name)
+        record._start = (time.perf_counter(), _cpu_seconds()) + _io_counters()
+        if _reset_peak_rss():
+            record.peak_rss_method = 'hwm'
+        elif _current_rss() is not None:
+            record.peak_rss_method = 'sampled'
+            record._sampler = _RssSampler()
+        self._open_phase = record
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        return record
+
+    def _stop_sampler(self):
+        # A phase that was never ended (the run failed) must not leave its sampler running
+        record, self._open_phase = self._open_phase, None
+        if record is not None and record._sampler is not None:
+            sampler, record._sampler = record._sampler, None
+            return sampler.stop()
+        return None
+
+    def end(self, record):
+        wall0, cpu0, read0, written0 = record._start
+        record.wall_seconds = round(time.perf_counter() - wall0, 4)
+        record.cpu_seconds = round(_cpu_seconds() - cpu0, 4)
+        read1, written1 = _io_counters()
+        if read0 is not None and read1 is not None:
+            record.read_bytes = read1 - read0
+            record.written_bytes = written1 - written0
+        if record.peak_rss_method == 'hwm':
+            record.peak_rss = _kernel_peak_rss()
+        elif record is self._open_phase:
+            record.peak_rss = self._stop_sampler()
+        self._open_phase = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            record.traced_peak = tracemalloc.get_traced_memory()[1]
+        self.phases.append(record)
+        return record
+
+    def stop(self):
+        """End profiling / memory tracing; safe to call more than once."""
+        self._stop_sampler()
+        if self._profiler is not None and self._stats_text is None:
+            self._profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(self._profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP)
+            self._stats_text = out.getvalue()
+        if self._owns_tracemalloc:
+            snapshot = tracemalloc.take_snapshot()
+            self.top_allocations = [
+                {'site': str(stat.traceback), 'size': stat.size, 'count': stat.count}
+                for stat in snapshot.statistics('lineno')[:ALLOCATION_TOP]
+            ]
+            tracemalloc.stop()
+            self._owns_tracemalloc = False
+
+    def load_previous(self, path):
+        """Keep the metrics of the last run written to path, for comparison in the report."""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == METRICS_VERSION:
+                self.previous = data
+        except (OSError, ValueError):
+            self.previous = None
+
+    def previous_wall(self, name):
+        if not self.previous:
+            return None
+        for phase in self.previous.get('phases', []):
+            if phase.get('name') == name:
+                return phase.get('wall_seconds')
+        return None
+
+    def to_dict(self, **run_info):
+        data = {
+            'version': METRICS_VERSION,
+            'started': self.started,
+            'wall_seconds': round(time.perf_counter() - self._started_wall, 4) if self._started_wall else None,
+        }
+        data.update(run_info)
+        peaks = [phase.peak_rss for phase in self.phases if phase.peak_rss is not None]
+        data['peak_rss'] = max(peaks) if peaks else None
+        data['phases'] = [phase.to_dict() for phase in self.phases]
+        if self.top_allocations is not None:
+            data['top_allocations'] = self.top_allocations
+        if self.previous:
+            data['previous'] = {'started': self.previous.get('started'),
+                                'wall_seconds': self.previous.get('wall_seconds')}
+        return data
+
+    def write(self, target_dir, **run_info):
+        """Write metrics.json (and the profile files when profiling) into target_dir; returns the JSON path."""
+        path = os.path.join(target_dir, METRICS_NAME)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(**run_info), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        if self._profiler is not None:
+            self._profiler.dump_stats(os.path.join(target_dir, PROFILE_NAME))
+            with open(os.path.join(target_dir, PROFILE_TEXT_NAME), 'w', encoding='utf-8') as f:
+                f.write(self._stats_text or '')
+        return path
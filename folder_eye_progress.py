@@ -0,0 +1,126 @@
+"""Progress, throughput and ETA for Folder-Eye's phases.
+
+Each phase (scan, compare, diff reports, copy) declares how many bytes and
+files it has scheduled, and workers advance it as they finish. Progress is
+weighted by bytes plus a fixed per-file overhead, so a tree of many small
+files still moves the bar and one huge file does not look like one tick.
+
+Rates are a moving average over the last few seconds, which is also what the
+ETA divides by: it follows the current pace (cold vs. warm cache, small vs.
+large files) instead of the average since the start.
+"""
+import time
+import threading
+from collections import deque
+
+# Byte-equivalent cost of opening and statting one file
+FILE_OVERHEAD_BYTES = 64 * 1024
+# Seconds of history behind the moving averages
+RATE_WINDOW = 10.0
+# Minimum seconds between two status updates
+STATUS_INTERVAL = 0.25
+
+
+def format_duration(seconds):
+    seconds = int(seconds + 0.5)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+def format_size(nbytes):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if nbytes < 1024 or unit == 'GB':
+            return f"{nbytes:.0f} {unit}" if unit == 'B' else f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+
+
+class PhaseStats:
+    """Totals of one finished phase."""
+    __slots__ = ('label', 'files', 'bytes', 'seconds')
+
+    def __init__(self, label, files, nbytes, seconds):
+        self.label = label
+        self.files = files
+        self.bytes = nbytes
+        self.seconds = seconds
+
+    def summary_text(self):
+        seconds = max(self.seconds, 1e-6)
+        return (f"{self.label}阶段: {self.files} 个文件，{format_size(self.bytes)}，"
+                f"用时 {format_duration(self.seconds)}，平均 {self.bytes / seconds / (1024 * 1024):.1f} MB/s、"
+                f"{self.files / seconds:.0f} 文件/s")
+
+
+class ProgressTracker:
+    """
+    Thread-safe progress of the current phase. report(message, percent) is
+    the engine's update_status; it is called at most every STATUS_INTERVAL
+    seconds and never while the lock is held.
+    """
+
+    def __init__(self, report):
+        self.report = report
+        self.phases = []
+        self._lock = threading.Lock()
+        self._label = None
+
+    def start(self, label, total_bytes=None, total_files=None):
+        """Begin a phase. With no totals (e.g. the scan) only counts and rates are shown."""
+        now = time.monotonic()
+        with self._lock:
+            self._label = label
+            self._total_bytes = total_bytes
+            self._total_files = total_files
+            self._bytes = 0
+            self._files = 0
+            self._started = now
+            self._last_report = 0.0
+            self._samples = deque([(now, 0, 0)])
+        self.report(label, 0 if total_files is not None else None)
+
+    def advance(self, nbytes=0, nfiles=1):
+        with self._lock:
+            if self._label is None:
+                return
+            self._bytes += nbytes
+            self._files += nfiles
+            now = time.monotonic()
+            if now - self._last_report < STATUS_INTERVAL:
+                return
+            self._last_report = now
+            message, percent = self._status_locked(now)
+        self.report(message, percent)
+
+    def _status_locked(self, now):
+        samples = self._samples
+        samples.append((now, self._bytes, self._files))
+        while len(samples) > 2 and now - samples[1][0] >= RATE_WINDOW:
+            samples.popleft()
+        t0, bytes0, files0 = samples[0]
+        elapsed = max(now - t0, 1e-6)
+        byte_rate = (self._bytes - bytes0) / elapsed
+        file_rate = (self._files - files0) / elapsed
+
+        if self._total_files is None:
+            return (f"{self._label}: 已处理 {self._files} 个文件 | {file_rate:.0f} 文件/s", None)
+
+        done = self._bytes + self._files * FILE_OVERHEAD_BYTES
+        total = max(self._total_bytes + self._total_files * FILE_OVERHEAD_BYTES, 1)
+        percent = min(done / total * 100, 100)
+        rate = byte_rate + file_rate * FILE_OVERHEAD_BYTES
+        eta = format_duration((total - done) / rate) if rate > 0 else "--:--"
+        return (f"{self._label}: {percent:.1f}% ({self._files}/{self._total_files}) | "
+                f"{byte_rate / (1024 * 1024):.1f} MB/s | {file_rate:.0f} 文件/s | 剩余 {eta}", percent)
+
+    def finish(self):
+        """End the phase and return its PhaseStats (also kept in self.phases)."""
+        with self._lock:
+            if self._label is None:
+                return None
+            stats = PhaseStats(self._label, self._files, self._bytes, time.monotonic() - self._started)
+            self._label = None
+        self.phases.append(stats)
+        return stats
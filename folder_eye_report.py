@@ -0,0 +1,1221 @@
+"""HTML rendering for Folder-Eye diff and summary reports.
+
+Pure functions with no GUI dependencies, shared by the comparison engine and
+the Tk front end.
+"""
+import os
+import re
+import gzip
+import json
+import base64
+import hashlib
+from datetime import datetime
+from collections import deque
+from urllib.parse import quote
+
+import folder_eye_diff
+from folder_eye_progress import format_size
+
+
+# --- Optimization: Shared Report Assets ---
+# Styles and scripts common to every diff report. Reports link one versioned
+# bundle written into the report folder; inline_assets embeds them instead for
+# a self-contained single file. The text, including the indentation of blank
+# lines, is kept exactly as reports have always inlined it.
+DIFF_REPORT_CSS = """\
+        body {
+            font-family: 'Consolas', 'Microsoft YaHei', monospace;
+            margin: 20px;
+            background-color: #f5f5f5;
+            overflow-x: auto;
+            font-size: 14px;
+        }
+        .diff-container {
+            max-width: 100%;
+            margin: 0 auto;
+            background-color: white;
+            border-radius: 8px;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+            overflow: hidden;
+        }
+        .diff-header {
+            background-color: #2c3e50;
+            color: white;
+            padding: 15px;
+            font-size: 16px;
+            font-weight: bold;
+            white-space: nowrap;
+        }
+        .control-bar {
+            padding: 10px 15px;
+            background-color: #f1f1f1;
+            display: flex;
+            align-items: center;
+            gap: 15px;
+            flex-wrap: wrap;
+        }
+        .control-btn {
+            padding: 6px 12px;
+            border: none;
+            border-radius: 4px;
+            background-color: #3498db;
+            color: white;
+            cursor: pointer;
+            transition: background-color 0.2s;
+            font-size: 12px;
+        }
+        .control-btn.active {
+            background-color: #2980b9;
+        }
+        .control-btn:hover {
+            background-color: #2980b9;
+        }
+        .legend {
+            display: flex;
+            gap: 15px;
+            font-size: 14px;
+        }
+        .legend-item {
+            display: flex;
+            align-items: center;
+            gap: 5px;
+        }
+        .legend-item.deleted {
+            color: #c0392b;
+        }
+        .legend-item.added {
+            color: #27ae60;
+        }
+        .legend-item.changed {
+            color: #f39c12;
+        }
+        .legend-item.reference {
+            color: #7f8c8d;
+        }
+        .file-info {
+            margin: 10px 15px;
+            padding: 10px;
+            background-color: #f8f9fa;
+            border-radius: 4px;
+            white-space: nowrap;
+            overflow-x: auto;
+        }
+        .diff-fragment {
+            margin: 10px 15px;
+            border-radius: 4px;
+            overflow: hidden;
+            box-shadow: 0 1px 3px rgba(0,0,0,0.1);
+        }
+        .fragment-header {
+            padding: 8px 12px;
+            background-color: #34495e;
+            color: white;
+            display: flex;
+            justify-content: space-between;
+            align-items: center;
+        }
+        .fragment-title {
+            font-weight: bold;
+        }
+        .fragment-reference {
+            font-size: 12px;
+            color: #bdc3c7;
+        }
+        .diff-fragment-deleted {
+            border-left: 4px solid #c0392b;
+        }
+        .diff-fragment-added {
+            border-left: 4px solid #27ae60;
+        }
+        .diff-fragment-changed {
+            border-left: 4px solid #f39c12;
+        }
+        .diff-fragment-context {
+            border-left: 4px solid #bdc3c7;
+            background-color: #f8f9fa;
+        }
+        .copy-fragment-btn {
+            padding: 4px 8px;
+            font-size: 12px;
+            background-color: #3498db;
+            color: white;
+            border: none;
+            border-radius: 4px;
+            cursor: pointer;
+            margin-left: 5px;
+        }
+        .copy-fragment-btn:hover {
+            background-color: #2980b9;
+        }
+        .fragment-table {
+            width: 100%;
+            border-collapse: collapse;
+            font-size: 14px;
+            table-layout: fixed;
+        }
+        .fragment-table th {
+            background-color: #34495e;
+            color: white;
+            padding: 10px;
+            text-align: left;
+            position: sticky;
+            top: 0;
+            white-space: nowrap;
+        }
+        .fragment-table td {
+            padding: 8px 10px;
+            vertical-align: middle;
+            position: relative;
+            border-bottom: 1px solid #eee;
+            min-height: 32px;
+            box-sizing: border-box;
+            line-height: 1.5;
+        }
+        .col-line-num {
+            width: 60px !important;
+            min-width: 60px !important;
+            max-width: 60px !important;
+        }
+        .col-content {
+            width: calc(50% - 60px) !important;
+            min-width: calc(50% - 60px) !important;
+            padding-right: 40px !important;
+        }
+        .line-num {
+            text-align: right;
+            color: #7f8c8d;
+            background-color: rgba(0,0,0,0.05);
+            font-family: monospace;
+            white-space: nowrap;
+            padding: 0 5px;
+            vertical-align: middle;
+        }
+        .content {
+            word-wrap: break-word;
+            white-space: pre-wrap;
+            font-family: 'Consolas', monospace;
+            line-height: 1.5;
+            overflow-wrap: break-word;
+            min-height: 24px;
+        }
+        .content del {
+            background-color: #ffcccc;
+            color: #c0392b;
+            text-decoration: none;
+        }
+        .content ins {
+            background-color: #ccffcc;
+            color: #27ae60;
+            text-decoration: none;
+        }
+        .reference-line {
+            background-color: #f8f9fa;
+            color: #7f8c8d;
+        }
+        .reference-line .content {
+            color: #7f8c8d;
+        }
+        .diff-line {
+            background-color: rgba(243, 156, 18, 0.1);
+        }
+        .delete-line {
+            background-color: rgba(192, 57, 43, 0.1);
+        }
+        .add-line {
+            background-color: rgba(39, 174, 96, 0.1);
+        }
+        .copy-btn {
+            position: absolute;
+            right: 8px;
+            top: 50%;
+            transform: translateY(-50%);
+            padding: 4px 8px;
+            font-size: 12px;
+            background-color: #3498db;
+            color: white;
+            border: none;
+            border-radius: 4px;
+            cursor: pointer;
+            opacity: 0;
+            transition: opacity 0.2s;
+            height: 24px;
+            line-height: 16px;
+        }
+        .diff-row:hover .copy-btn {
+            opacity: 1;
+        }
+        .copy-btn:hover {
+            background-color: #2980b9;
+        }
+        .copy-toast {
+            position: fixed;
+            bottom: 20px;
+            right: 20px;
+            padding: 10px 20px;
+            background-color: #2ecc71;
+            color: white;
+            border-radius: 4px;
+            opacity: 0;
+            transition: opacity 0.3s;
+            pointer-events: none;
+            z-index: 100;
+        }
+        .diff-content {
+            overflow-x: auto;
+        }
+        .content:empty {
+            min-height: 24px;
+            display: inline-block;
+            width: 100%;
+        }
+"""
+
+DIFF_REPORT_JS = """\
+            async function copyCoreDiff(coreDiffJson, type) {
+                try {
+                    coreDiffJson = coreDiffJson.replace(/\\\\"/g, '"');
+                    const diffLines = JSON.parse(coreDiffJson || '[]');
+                    
+                    if (!diffLines.length || diffLines.every(line => line.trim() === '')) {
+                        alert('该片段无' + (type === 'original' ? '修改前' : '修改后') + '核心差异内容！');
+                        return;
+                    }
+
+                    const text = diffLines.join('\\n');
+                    let copySuccess = false;
+                    if (navigator.clipboard && window.isSecureContext) {
+                        try {
+                            await navigator.clipboard.writeText(text);
+                            copySuccess = true;
+                        } catch (err) {
+                            copySuccess = false;
+                        }
+                    }
+                    
+                    if (!copySuccess) {
+                        const textArea = document.createElement('textarea');
+                        textArea.value = text;
+                        textArea.style.position = 'fixed';
+                        textArea.style.opacity = 0;
+                        document.body.appendChild(textArea);
+                        textArea.select();
+                        try {
+                            document.execCommand('copy');
+                            copySuccess = true;
+                        } catch (err) {
+                            alert('复制失败，请手动复制：\\n' + text);
+                            return;
+                        } finally {
+                            document.body.removeChild(textArea);
+                        }
+                    }
+                    
+                    if (copySuccess) {
+                        showToast();
+                    }
+                } catch (e) {
+                    console.error('复制失败:', e);
+                    alert('复制失败：' + e.message);
+                }
+            }
+
+            async function copyOnlyCoreLine(btn) {
+                try {
+                    const row = btn.closest('tr');
+                    if (row.dataset.isCore !== 'true') {
+                        alert('仅可复制核心差异行，参考行不支持单独复制！');
+                        return;
+                    }
+
+                    const contentCell = btn.parentElement;
+                    const text = contentCell.textContent.replace('复制', '').trim();
+                    
+                    if (!text) {
+                        alert('该行无内容可复制！');
+                        return;
+                    }
+
+                    let copySuccess = false;
+                    if (navigator.clipboard && window.isSecureContext) {
+                        try {
+                            await navigator.clipboard.writeText(text);
+                            copySuccess = true;
+                        } catch (err) {
+                            copySuccess = false;
+                        }
+                    }
+                    
+                    if (!copySuccess) {
+                        const textArea = document.createElement('textarea');
+                        textArea.value = text;
+                        textArea.style.position = 'fixed';
+                        textArea.style.opacity = 0;
+                        document.body.appendChild(textArea);
+                        textArea.select();
+                        try {
+                            document.execCommand('copy');
+                            copySuccess = true;
+                        } catch (err) {
+                            alert('复制失败，请手动复制：\\n' + text);
+                            return;
+                        } finally {
+                            document.body.removeChild(textArea);
+                        }
+                    }
+                    
+                    if (copySuccess) {
+                        showToast();
+                    }
+                } catch (e) {
+                    console.error('单行复制失败:', e);
+                    alert('复制失败：' + e.message);
+                }
+            }
+
+            function showToast() {
+                const toast = document.getElementById('copyToast');
+                toast.style.opacity = '1';
+                setTimeout(() => {
+                    toast.style.opacity = '0';
+                }, 2000);
+            }
+
+            function toggleDisplay(mode) {
+                const allBtns = document.querySelectorAll('.control-btn');
+                allBtns.forEach(btn => btn.classList.remove('active'));
+                
+                const activeBtn = document.getElementById(mode === 'all' ? 'showAllBtn' : 'showDiffBtn');
+                activeBtn.classList.add('active');
+                
+                const fragments = document.querySelectorAll('.diff-fragment');
+                fragments.forEach(fragment => {
+                    fragment.style.display = mode === 'all' ? 'block' : (fragment.dataset.type === 'changed' ? 'block' : 'none');
+                });
+            }
+            
+            document.addEventListener('DOMContentLoaded', function() {
+                toggleDisplay('all');
+            });
+"""
+
+# --- Optimization: Lazy Diff Rendering ---
+# Client-side renderer for lazy mode: turns data/<id>.js into the same view as *_diff.html
+DIFF_VIEWER_JS = r"""// Renders one modified file from its compressed diff data (data/<id>.js), using
+// the same layout and classes as the pre-rendered *_diff.html reports.
+(function () {
+    function escapeHtml(text) {
+        return text.replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;')
+            .replace(/"/g, '&quot;').replace(/'/g, '&#39;');
+    }
+
+    function basename(path) {
+        return path.split(/[\\/]/).pop();
+    }
+
+    function parseDiff(lines) {
+        let skip = 0;
+        while (skip < lines.length && (lines[skip].startsWith('---') || lines[skip].startsWith('+++'))) {
+            skip++;
+        }
+        const parsed = [];
+        const core = [];
+        let numA = 0, numB = 0, inHunk = false;
+        lines.slice(skip).forEach((line, idx) => {
+            const type = line.trim() ? line[0] : '';
+            const p = { line: line, type: type, numA: null, numB: null, isCore: false };
+            if (line.startsWith('@@')) {
+                const m = /^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@/.exec(line.trim());
+                if (m) {
+                    numA = parseInt(m[1], 10);
+                    numB = parseInt(m[3], 10);
+                    inHunk = true;
+                }
+            } else if (inHunk) {
+                if (type === '-') {
+                    p.isCore = true; p.numA = numA++; core.push(idx);
+                } else if (type === '+') {
+                    p.isCore = true; p.numB = numB++; core.push(idx);
+                } else if (type === ' ') {
+                    p.numA = numA++; p.numB = numB++;
+                }
+            }
+            parsed.push(p);
+        });
+        return { parsed: parsed, core: core };
+    }
+
+    function fragments(lines, context) {
+        const diff = parseDiff(lines);
+        const blocks = [];
+        diff.core.forEach(idx => {
+            const last = blocks[blocks.length - 1];
+            if (last && idx === last[last.length - 1] + 1) {
+                last.push(idx);
+            } else {
+                blocks.push([idx]);
+            }
+        });
+        if (!blocks.length) {
+            return [{ type: 'context', lines: diff.parsed }];
+        }
+        return blocks.map(block => {
+            const start = Math.max(0, block[0] - context);
+            const end = Math.min(diff.parsed.length - 1, block[block.length - 1] + context);
+            return { type: 'changed', lines: diff.parsed.slice(start, end + 1) };
+        });
+    }
+
+    function renderFragment(fragment, index, data) {
+        let minA = null, maxA = null, minB = null, maxB = null;
+        const original = [], modified = [];
+        fragment.lines.forEach(p => {
+            if (p.numA !== null) { minA = minA === null ? p.numA : Math.min(minA, p.numA); maxA = Math.max(maxA || 0, p.numA); }
+            if (p.numB !== null) { minB = minB === null ? p.numB : Math.min(minB, p.numB); maxB = Math.max(maxB || 0, p.numB); }
+            if (p.isCore && p.type === '-') original.push(p.line.slice(1));
+            if (p.isCore && p.type === '+') modified.push(p.line.slice(1));
+        });
+        let range = '';
+        if (minA && maxA && minB && maxB) range = '（源文件：' + minA + '-' + maxA + ' | 修改文件：' + minB + '-' + maxB + '）';
+        else if (minA && maxA) range = '（源文件：' + minA + '-' + maxA + '）';
+        else if (minB && maxB) range = '（修改文件：' + minB + '-' + maxB + '）';
+
+        const html = ['<div class="diff-fragment diff-fragment-' + fragment.type + '" data-type="' + fragment.type + '">'];
+        if (fragment.type === 'changed') {
+            window.folderEyeCore.push([original, modified]);
+            const core = window.folderEyeCore.length - 1;
+            html.push('<div class="fragment-header"><div><span class="fragment-title">差异片段 #' + (index + 1) +
+                '</span> <span class="fragment-reference">' + range + '</span></div><div>' +
+                '<button class="copy-fragment-btn" onclick="folderEyeCopyCore(' + core + ', \'original\')">复制修改前差异</button> ' +
+                '<button class="copy-fragment-btn" onclick="folderEyeCopyCore(' + core + ', \'modified\')">复制修改后差异</button>' +
+                '</div></div>');
+        }
+        html.push('<table class="fragment-table"><thead><tr>' +
+            '<th class="col-line-num">源文件行号</th><th class="col-content">原始文件 (' + escapeHtml(basename(data.a)) + ')</th>' +
+            '<th class="col-line-num">修改文件行号</th><th class="col-content">修改文件 (' + escapeHtml(basename(data.b)) + ')</th>' +
+            '</tr></thead><tbody>');
+        const rowClass = { '-': 'delete-line diff-row', '+': 'add-line diff-row', ' ': 'reference-line diff-row' };
+        fragment.lines.forEach(p => {
+            if (p.type === '?') return;
+            const content = p.line.length > 1 ? escapeHtml(p.line.slice(1)) : '';
+            const left = (p.type === '-' || p.type === ' ') ? content : '';
+            const right = (p.type === '+' || p.type === ' ') ? content : '';
+            html.push('<tr class="' + (rowClass[p.type] || 'diff-row') + '" data-line-type="' + p.type + '" data-is-core="' + p.isCore + '">' +
+                '<td class="line-num col-line-num">' + (p.numA === null ? '' : p.numA) + '</td>' +
+                '<td class="content col-content">' + left + '<button class="copy-btn" onclick="copyOnlyCoreLine(this)">复制</button></td>' +
+                '<td class="line-num col-line-num">' + (p.numB === null ? '' : p.numB) + '</td>' +
+                '<td class="content col-content">' + right + '<button class="copy-btn" onclick="copyOnlyCoreLine(this)">复制</button></td></tr>');
+        });
+        html.push('</tbody></table></div>');
+        return html.join('');
+    }
+
+    function render(data) {
+        document.title = '文件差异对比: ' + basename(data.a) + ' vs ' + basename(data.b);
+        document.getElementById('fileA').textContent = data.a;
+        document.getElementById('fileB').textContent = data.b;
+        document.getElementById('compareTime').textContent = data.time;
+        if (data.coarse) {
+            document.getElementById('coarseNotice').style.display = 'block';
+        }
+        const container = document.getElementById('diffContent');
+        container.innerHTML = '';
+        const all = fragments(data.lines, 3);
+        // Render in slices so very large diffs do not freeze the page
+        let next = 0;
+        (function renderSlice() {
+            const html = [];
+            const stop = Math.min(all.length, next + 200);
+            for (; next < stop; next++) {
+                html.push(renderFragment(all[next], next, data));
+            }
+            container.insertAdjacentHTML('beforeend', html.join('\n'));
+            if (next < all.length) setTimeout(renderSlice, 0);
+        })();
+    }
+
+    function showError(message) {
+        document.getElementById('diffContent').innerHTML =
+            '<div class="file-info" style="color: #c0392b;">' + escapeHtml(message) + '</div>';
+    }
+
+    window.folderEyeCore = [];
+
+    window.folderEyeCopyCore = function (index, type) {
+        const lines = window.folderEyeCore[index][type === 'original' ? 0 : 1];
+        copyCoreDiff(JSON.stringify(lines).replace(/"/g, '\\"'), type);
+    };
+
+    // Called by data/<id>.js: base64 of gzip-compressed JSON
+    window.folderEyeLoadDiff = async function (payload) {
+        try {
+            const bytes = Uint8Array.from(atob(payload), c => c.charCodeAt(0));
+            const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+            render(JSON.parse(await new Response(stream).text()));
+        } catch (e) {
+            showError('无法解析差异数据: ' + e.message);
+        }
+    };
+
+    document.addEventListener('DOMContentLoaded', function () {
+        const id = new URLSearchParams(location.search).get('f') || '';
+        if (!id || id.indexOf('/') !== -1 || id.indexOf('\\') !== -1 || id.startsWith('.')) {
+            showError('未指定差异数据文件');
+            return;
+        }
+        const script = document.createElement('script');
+        script.src = 'data/' + encodeURIComponent(id);
+        script.onerror = () => showError('找不到差异数据: data/' + id);
+        document.body.appendChild(script);
+    });
+})();
+"""
+
+ASSET_DIR = "assets"
+# Content hash in the file names: a changed bundle never meets a stale browser cache
+ASSET_VERSION = hashlib.sha1(
+    (DIFF_REPORT_CSS + DIFF_REPORT_JS + DIFF_VIEWER_JS).encode('utf-8')).hexdigest()[:10]
+DIFF_REPORT_CSS_NAME = f"diff-report.{ASSET_VERSION}.css"
+DIFF_REPORT_JS_NAME = f"diff-report.{ASSET_VERSION}.js"
+DIFF_VIEWER_JS_NAME = f"diff-viewer.{ASSET_VERSION}.js"
+
+DATA_DIR = "data"
+DIFF_VIEWER_NAME = "差异查看器.html"
+
+
+def write_report_assets(reports_dir):
+    """Write the CSS/JS bundle into reports_dir/assets unless this version is already there."""
+    asset_dir = os.path.join(reports_dir, ASSET_DIR)
+    os.makedirs(asset_dir, exist_ok=True)
+    for name, text in ((DIFF_REPORT_CSS_NAME, DIFF_REPORT_CSS), (DIFF_REPORT_JS_NAME, DIFF_REPORT_JS),
+                       (DIFF_VIEWER_JS_NAME, DIFF_VIEWER_JS)):
+        path = os.path.join(asset_dir, name)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+    return asset_dir
+
+
+def report_data_filename(rel_path):
+    return f"{rel_path.replace(os.path.sep, '_')}.js"
+
+
+def write_diff_data(path, diff_lines, file_a, file_b, coarse=False):
+    """
+    Lazy mode: store the unified diff of one pair as gzip + base64 inside a
+    tiny script (browsers cannot fetch() local files, but they can load
+    scripts), for the viewer page to render when the file is opened.
+    """
+    payload = json.dumps({
+        'a': file_a,
+        'b': file_b,
+        'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'coarse': coarse,
+        'lines': diff_lines,
+    }, ensure_ascii=False, separators=(',', ':'))
+    encoded = base64.b64encode(gzip.compress(payload.encode('utf-8'), compresslevel=6)).decode('ascii')
+    with open(path, 'w', encoding='ascii') as f:
+        f.write(f'folderEyeLoadDiff("{encoded}");\n')
+
+
+def write_diff_viewer(reports_dir):
+    """Write the lazy-mode viewer page (and the asset bundle it links) into reports_dir."""
+    write_report_assets(reports_dir)
+    os.makedirs(os.path.join(reports_dir, DATA_DIR), exist_ok=True)
+    with open(os.path.join(reports_dir, DIFF_VIEWER_NAME), 'w', encoding='utf-8') as f:
+        f.write(f"""<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>文件差异对比</title>
+    <link rel="stylesheet" href="{ASSET_DIR}/{DIFF_REPORT_CSS_NAME}">
+</head>
+<body>
+    <div class="diff-container">
+        <div class="diff-header">文件差异对比</div>
+        <div class="control-bar">
+            <button id="showAllBtn" class="control-btn active" onclick="toggleDisplay('all')">全部显示</button>
+            <button id="showDiffBtn" class="control-btn" onclick="toggleDisplay('diff')">只显示差异</button>
+            <div class="legend">
+                <span class="legend-item deleted">🟥 已删除</span>
+                <span class="legend-item added">🟩 已新增</span>
+                <span class="legend-item changed">🟨 已修改</span>
+                <span class="legend-item reference">⬜ 参考代码</span>
+            </div>
+        </div>
+        <div class="file-info">
+            <div><strong>原始文件:</strong> <span id="fileA"></span></div>
+            <div><strong>修改文件:</strong> <span id="fileB"></span></div>
+            <div><strong>对比时间:</strong> <span id="compareTime"></span></div>
+            <div id="coarseNotice" style="display: none; color: #c0392b;"><strong>注意:</strong> 文件过大或差异计算超出时间预算，部分区域以整块替换的粗粒度方式显示</div>
+        </div>
+        <div id="diffContent" class="diff-content"><div class="file-info">正在加载差异数据...</div></div>
+    </div>
+
+    <div id="copyToast" class="copy-toast">复制成功！</div>
+
+    <script src="{ASSET_DIR}/{DIFF_REPORT_JS_NAME}"></script>
+    <script src="{ASSET_DIR}/{DIFF_VIEWER_JS_NAME}"></script>
+</body>
+</html>""")
+
+
+def _inline_or_link_css(inline_assets):
+    if inline_assets:
+        return f"    <style>\n{DIFF_REPORT_CSS}    </style>\n"
+    return f'    <link rel="stylesheet" href="{ASSET_DIR}/{DIFF_REPORT_CSS_NAME}">\n'
+
+
+def _inline_or_link_js(inline_assets):
+    if inline_assets:
+        return f"        <script>\n{DIFF_REPORT_JS}        </script>\n"
+    return f'        <script src="{ASSET_DIR}/{DIFF_REPORT_JS_NAME}"></script>\n'
+
+
+def report_filename(rel_path):
+    return f"{rel_path.replace(os.path.sep, '_')}_diff.html"
+
+
+def compute_diff(content_a, content_b, file_a, file_b, algorithm='auto',
+                 time_budget=folder_eye_diff.DEFAULT_TIME_BUDGET):
+    """DiffResult for two texts; large inputs use the histogram engine under time_budget seconds."""
+    return folder_eye_diff.unified_diff(content_a.splitlines(), content_b.splitlines(),
+                                        file_a, file_b, n=3, algorithm=algorithm, time_budget=time_budget)
+
+
+def compute_diff_lines(content_a, content_b, file_a, file_b):
+    return compute_diff(content_a, content_b, file_a, file_b).lines
+
+
+def _parse_diff_header(header_line):
+    pattern = r'@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@'
+    match = re.match(pattern, header_line.strip())
+    if not match:
+        return None
+
+    start_a = int(match.group(1))
+    count_a = int(match.group(2)) if match.group(2) else 1
+    start_b = int(match.group(3))
+    count_b = int(match.group(4)) if match.group(4) else 1
+
+    return {
+        'start_a': start_a,
+        'count_a': count_a,
+        'start_b': start_b,
+        'count_b': count_b
+    }
+
+
+class ParsedLine:
+    """One unified-diff line with its source line numbers; slotted since a rewrite parses one per line."""
+    __slots__ = ('line', 'line_idx', 'line_type', 'num_a', 'num_b', 'is_core_diff')
+
+    def __init__(self, line, line_idx, line_type):
+        self.line = line
+        self.line_idx = line_idx
+        self.line_type = line_type
+        self.num_a = None
+        self.num_b = None
+        self.is_core_diff = False
+
+    @property
+    def content(self):
+        return self.line[1:].rstrip('\n') if self.line_type in ('-', '+') else ''
+
+
+def _iter_parsed_lines(diff_lines):
+    """Parse unified-diff lines one at a time, after the leading ---/+++ file headers."""
+    in_headers = True
+    line_idx = 0
+    current_line_num_a = 0
+    current_line_num_b = 0
+    header_info = None
+
+    for line in diff_lines:
+        if in_headers:
+            if line.startswith(('---', '+++')):
+                continue
+            in_headers = False
+
+        line_type = line[0] if line.strip() else ''
+        parsed_line = ParsedLine(line, line_idx, line_type)
+        line_idx += 1
+
+        if line.startswith('@@'):
+            header_info = _parse_diff_header(line)
+            if header_info:
+                current_line_num_a = header_info['start_a']
+                current_line_num_b = header_info['start_b']
+        elif header_info:
+            if line_type == '-':
+                parsed_line.is_core_diff = True
+                parsed_line.num_a = current_line_num_a
+                current_line_num_a += 1
+            elif line_type == '+':
+                parsed_line.is_core_diff = True
+                parsed_line.num_b = current_line_num_b
+                current_line_num_b += 1
+            elif line_type == ' ':
+                parsed_line.num_a = current_line_num_a
+                parsed_line.num_b = current_line_num_b
+                current_line_num_a += 1
+                current_line_num_b += 1
+
+        yield parsed_line
+
+
+class _OpenFragment:
+    """A fragment still collecting lines; end is unknown while its core block keeps growing."""
+    __slots__ = ('parsed_lines', 'core_indices', 'end')
+
+    def __init__(self, leading):
+        self.parsed_lines = list(leading)
+        self.core_indices = []
+        self.end = None
+
+    def to_dict(self):
+        original_core_diff = []
+        modified_core_diff = []
+        for p_line in self.parsed_lines:
+            if p_line.is_core_diff:
+                if p_line.line_type == '-':
+                    original_core_diff.append(p_line.content)
+                elif p_line.line_type == '+':
+                    modified_core_diff.append(p_line.content)
+        return {
+            'type': 'changed',
+            'lines': [p_line.line for p_line in self.parsed_lines],
+            'line_numbers': [(p_line.num_a, p_line.num_b) for p_line in self.parsed_lines],
+            'core_indices': self.core_indices,
+            'original_core_diff': original_core_diff,
+            'modified_core_diff': modified_core_diff,
+            'parsed_lines': self.parsed_lines
+        }
+
+
+# --- Optimization: Single-Pass Fragment Streaming ---
+def _iter_diff_fragments(diff_lines, context_lines=3):
+    """
+    Yield diff fragments in one pass over diff_lines. Each contiguous block of
+    -/+ lines becomes a fragment with context_lines of context on both sides
+    (neighbouring fragments may share context lines). A fragment is yielded as
+    soon as its trailing context is complete, so only the last context_lines
+    lines and the fragments still open are held.
+    """
+    leading = deque(maxlen=context_lines) if context_lines else None
+    open_fragments = deque()
+    # Only a diff without any -/+ line is shown whole, so everything is kept until the first one
+    raw_lines = []
+    all_parsed = []
+    seen_core = False
+
+    def track(line):
+        if not seen_core:
+            raw_lines.append(line)
+        return line
+
+    for p_line in _iter_parsed_lines(track(line) for line in diff_lines):
+        idx = p_line.line_idx
+        if p_line.is_core_diff:
+            if not seen_core:
+                seen_core = True
+                raw_lines = all_parsed = None
+            if not open_fragments or open_fragments[-1].end is not None:
+                open_fragments.append(_OpenFragment(leading or ()))
+            open_fragments[-1].core_indices.append(idx)
+        else:
+            if open_fragments and open_fragments[-1].end is None:
+                open_fragments[-1].end = idx - 1 + context_lines
+            if all_parsed is not None:
+                all_parsed.append(p_line)
+
+        for fragment in open_fragments:
+            if fragment.end is None or idx <= fragment.end:
+                fragment.parsed_lines.append(p_line)
+        while open_fragments and open_fragments[0].end is not None and idx >= open_fragments[0].end:
+            yield open_fragments.popleft().to_dict()
+        if leading is not None:
+            leading.append(p_line)
+
+    for fragment in open_fragments:
+        yield fragment.to_dict()
+
+    if not seen_core:
+        yield {
+            'type': 'context',
+            'lines': raw_lines,
+            'line_numbers': [(None, None)] * len(raw_lines),
+            'core_indices': [],
+            'original_core_diff': [],
+            'modified_core_diff': [],
+            'parsed_lines': all_parsed
+        }
+
+
+def escape_html(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;').replace("'", '&#39;')
+
+
+# --- Optimization: Streaming Report Writer ---
+def _coarse_notice(coarse):
+    if not coarse:
+        return ''
+    return ('\n            <div style="color: #c0392b;"><strong>注意:</strong> '
+            '文件过大或差异计算超出时间预算，部分区域以整块替换的粗粒度方式显示</div>')
+
+
+def iter_diff_html(diff_lines, file_a, file_b, inline_assets=False, coarse=False):
+    """
+    Yield the diff report as a stream of pieces (header, then fragment by
+    fragment and row by row, then footer), so it can be written to disk as it
+    is produced instead of being assembled in memory first. Unless
+    inline_assets is set, the report links the bundle from write_report_assets.
+    coarse adds a notice that part of the diff is hunk-level only.
+    """
+    fragments = _iter_diff_fragments(diff_lines, context_lines=3)
+
+    yield f"""<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>文件差异对比: {os.path.basename(file_a)} vs {os.path.basename(file_b)}</title>
+{_inline_or_link_css(inline_assets)}</head>
+<body>
+    <div class="diff-container">
+        <div class="diff-header">文件差异对比</div>
+        <div class="control-bar">
+            <button id="showAllBtn" class="control-btn active" onclick="toggleDisplay('all')">全部显示</button>
+            <button id="showDiffBtn" class="control-btn" onclick="toggleDisplay('diff')">只显示差异</button>
+            <div class="legend">
+                <span class="legend-item deleted">🟥 已删除</span>
+                <span class="legend-item added">🟩 已新增</span>
+                <span class="legend-item changed">🟨 已修改</span>
+                <span class="legend-item reference">⬜ 参考代码</span>
+            </div>
+        </div>
+        <div class="file-info">
+            <div><strong>原始文件:</strong> {escape_html(file_a)}</div>
+            <div><strong>修改文件:</strong> {escape_html(file_b)}</div>
+            <div><strong>对比时间:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</div>{_coarse_notice(coarse)}
+        </div>
+        <div class="diff-content">"""
+
+    for fragment_idx, fragment in enumerate(fragments):
+        if fragment_idx:
+            yield '\n'
+        frag_type = fragment['type']
+        frag_lines = fragment['lines']
+        line_numbers = fragment['line_numbers']
+        fragment_parsed_lines = fragment['parsed_lines']
+
+        min_a = max_a = min_b = max_b = None
+        for num_a, num_b in line_numbers:
+            if num_a is not None:
+                min_a = num_a if min_a is None else min(min_a, num_a)
+                max_a = num_a if max_a is None else max(max_a, num_a)
+            if num_b is not None:
+                min_b = num_b if min_b is None else min(min_b, num_b)
+                max_b = num_b if max_b is None else max(max_b, num_b)
+
+        yield f'<div class="diff-fragment diff-fragment-{frag_type}" data-type="{frag_type}">'
+        range_text = ""
+        if min_a and max_a and min_b and max_b:
+            range_text = f"（源文件：{min_a}-{max_a} | 修改文件：{min_b}-{max_b}）"
+        elif min_a and max_a:
+            range_text = f"（源文件：{min_a}-{max_a}）"
+        elif min_b and max_b:
+            range_text = f"（修改文件：{min_b}-{max_b}）"
+
+        original_core_json = json.dumps(fragment['original_core_diff'], ensure_ascii=False).replace('"', '\\"')
+        modified_core_json = json.dumps(fragment['modified_core_diff'], ensure_ascii=False).replace('"', '\\"')
+
+        if frag_type == 'changed':
+            yield f'''<div class="fragment-header">
+                    <div>
+                        <span class="fragment-title">差异片段 #{fragment_idx + 1}</span>
+                        <span class="fragment-reference">{range_text}</span>
+                    </div>
+                    <div>
+                        <button class="copy-fragment-btn" onclick="copyCoreDiff('{original_core_json}', 'original')">复制修改前差异</button>
+                        <button class="copy-fragment-btn" onclick="copyCoreDiff('{modified_core_json}', 'modified')">复制修改后差异</button>
+                    </div>
+                </div>'''
+
+        yield f'''<table class="fragment-table">
+                <thead>
+                    <tr>
+                        <th class="col-line-num">源文件行号</th>
+                        <th class="col-content">原始文件 ({os.path.basename(file_a)})</th>
+                        <th class="col-line-num">修改文件行号</th>
+                        <th class="col-content">修改文件 ({os.path.basename(file_b)})</th>
+                    </tr>
+                </thead>
+                <tbody>'''
+
+        for line_idx, (line, (num_a, num_b)) in enumerate(zip(frag_lines, line_numbers)):
+            p_line = fragment_parsed_lines[line_idx] if line_idx < len(fragment_parsed_lines) else None
+            is_core_diff = p_line.is_core_diff if p_line else False
+            line_type = p_line.line_type if p_line else (line[0] if line else '')
+
+            row_class = ''
+            if line_type == '-':
+                row_class = 'delete-line diff-row'
+            elif line_type == '+':
+                row_class = 'add-line diff-row'
+            elif line_type == ' ':
+                row_class = 'reference-line diff-row'
+            elif line_type == '?':
+                row_class = 'diff-line diff-row'
+            else:
+                row_class = 'diff-row'
+
+            line_content = line[1:].rstrip('\n') if len(line) > 1 else ''
+            original_line = ''
+            modified_line = ''
+
+            if line_type == '-':
+                original_line = escape_html(line_content)
+            elif line_type == '+':
+                modified_line = escape_html(line_content)
+            elif line_type == ' ':
+                original_line = escape_html(line_content)
+                modified_line = escape_html(line_content)
+            elif line_type == '?':
+                continue
+
+            display_num_a = str(num_a) if num_a is not None else ''
+            display_num_b = str(num_b) if num_b is not None else ''
+
+            yield f'''<tr class="{row_class}" data-line-type="{line_type}" data-is-core="{str(is_core_diff).lower()}">
+                    <td class="line-num col-line-num">{display_num_a}</td>
+                    <td class="content col-content">{original_line}<button class="copy-btn" onclick="copyOnlyCoreLine(this)">复制</button></td>
+                    <td class="line-num col-line-num">{display_num_b}</td>
+                    <td class="content col-content">{modified_line}<button class="copy-btn" onclick="copyOnlyCoreLine(this)">复制</button></td>
+                </tr>'''
+
+        yield '''</tbody></table></div>'''
+
+    yield f"""
+        </div>
+        </div>
+        
+        <div id="copyToast" class="copy-toast">复制成功！</div>
+        
+{_inline_or_link_js(inline_assets)}        </body>
+        </html>"""
+
+
+def build_diff_html(diff_lines, file_a, file_b, inline_assets=False, coarse=False):
+    return ''.join(iter_diff_html(diff_lines, file_a, file_b, inline_assets, coarse))
+
+
+def write_diff_html(path, diff_lines, file_a, file_b, inline_assets=False, coarse=False,
+                    buffer_size=1024 * 1024):
+    """Stream the diff report straight into path through a buffered writer."""
+    with open(path, 'w', encoding='utf-8', buffering=buffer_size) as f:
+        f.writelines(iter_diff_html(diff_lines, file_a, file_b, inline_assets, coarse))
+
+
+def _format_bytes(value):
+    if value is None:
+        return "-"
+    return format_size(value)
+
+
+def _metrics_section(metrics):
+    """
+    Table of per-phase run metrics (dicts as in metrics.json plus 'label' and
+    'previous_wall_seconds'); the summary phase itself is still running and only
+    appears in metrics.json.
+    """
+    if not metrics:
+        return ""
+    rows = ""
+    for phase in metrics:
+        previous = phase.get('previous_wall_seconds')
+        if previous:
+            change = (phase['wall_seconds'] - previous) / previous * 100
+            css = " class='slower'" if change > 20 else ""
+            previous_cell = f"{previous:.2f} s <span{css}>({change:+.0f}%)</span>"
+        else:
+            previous_cell = "-"
+        rows += (f"<tr><td>{escape_html(phase['label'])}</td>"
+                 f"<td>{phase['wall_seconds']:.2f} s</td>"
+                 f"<td>{phase['cpu_seconds']:.2f} s</td>"
+                 f"<td>{phase['files'] if phase.get('files') is not None else '-'}</td>"
+                 f"<td>{_format_bytes(phase.get('read_bytes'))}</td>"
+                 f"<td>{_format_bytes(phase.get('written_bytes'))}</td>"
+                 f"<td>{_format_bytes(phase.get('peak_rss'))}</td>"
+                 f"<td>{previous_cell}</td></tr>")
+    return f"""
+        <h2>运行指标</h2>
+        <table class="metrics">
+            <tr><th>阶段</th><th>耗时</th><th>CPU 时间</th><th>文件数</th><th>读取</th><th>写入</th><th>阶段峰值内存</th><th>上次耗时</th></tr>
+            {rows}
+        </table>
+        <p class="metrics-note">完整数据见同目录下的 metrics.json</p>"""
+
+
+def build_summary_html(modified_files, added_files, deleted_files, dir_a, dir_b, link_reports=True,
+                       lazy_reports=False, metrics=None):
+    modified_list = ""
+    for file in modified_files:
+        if link_reports:
+            if lazy_reports:
+                report_path = f"{DIFF_VIEWER_NAME}?f={quote(report_data_filename(file))}"
+            else:
+                report_path = report_filename(file)
+            modified_list += f"<li><a href='{escape_html(report_path)}' target='_blank'>{escape_html(file)}</a></li>"
+        else:
+            modified_list += f"<li>{escape_html(file)}</li>"
+    
+    added_list = ""
+    for file in added_files:
+        added_list += f"<li>{escape_html(file)}</li>"
+    
+    deleted_list = ""
+    for file in deleted_files:
+        deleted_list += f"<li>{escape_html(file)}</li>"
+    
+    return f"""<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>文件夹对比汇总报告</title>
+    <style>
+        body {{
+            font-family: 'Microsoft YaHei', sans-serif;
+            margin: 20px;
+            line-height: 1.6;
+        }}
+        .container {{
+            max-width: 1200px;
+            margin: 0 auto;
+            background: white;
+            padding: 20px;
+            border-radius: 8px;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+        }}
+        h1 {{
+            color: #2c3e50;
+            border-bottom: 2px solid #3498db;
+            padding-bottom: 10px;
+        }}
+        h2 {{
+            color: #34495e;
+            margin-top: 30px;
+        }}
+        .info-box {{
+            background: #f8f9fa;
+            padding: 15px;
+            border-radius: 4px;
+            margin: 20px 0;
+        }}
+        .file-list {{
+            list-style: none;
+            padding: 0;
+        }}
+        .file-list li {{
+            padding: 8px;
+            border-bottom: 1px solid #eee;
+        }}
+        .file-list li:hover {{
+            background: #f1f1f1;
+        }}
+        .file-list a {{
+            color: #3498db;
+            text-decoration: none;
+        }}
+        .file-list a:hover {{
+            text-decoration: underline;
+        }}
+        .summary {{
+            display: flex;
+            flex-wrap: wrap;
+            gap: 20px;
+            margin: 20px 0;
+        }}
+        .summary-item {{
+            background: #e3f2fd;
+            padding: 15px;
+            border-radius: 8px;
+            flex: 1;
+            min-width: 200px;
+            text-align: center;
+        }}
+        .summary-item h3 {{
+            margin: 0 0 10px 0;
+            color: #2c3e50;
+        }}
+        .summary-item .count {{
+            font-size: 24px;
+            font-weight: bold;
+            color: #3498db;
+        }}
+        .metrics {{
+            border-collapse: collapse;
+            width: 100%;
+        }}
+        .metrics th, .metrics td {{
+            padding: 6px 10px;
+            border-bottom: 1px solid #eee;
+            text-align: right;
+        }}
+        .metrics th:first-child, .metrics td:first-child {{
+            text-align: left;
+        }}
+        .metrics .slower {{
+            color: #c0392b;
+            font-weight: bold;
+        }}
+        .metrics-note {{
+            color: #7f8c8d;
+            font-size: 12px;
+        }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>文件夹对比汇总报告</h1>
+        
+        <div class="info-box">
+            <p><strong>原始文件夹:</strong> {escape_html(dir_a)}</p>
+            <p><strong>修改文件夹:</strong> {escape_html(dir_b)}</p>
+            <p><strong>对比时间:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
+        </div>
+        
+        <div class="summary">
+            <div class="summary-item">
+                <h3>修改的文件</h3>
+                <div class="count">{len(modified_files)}</div>
+            </div>
+            <div class="summary-item">
+                <h3>新增的文件</h3>
+                <div class="count">{len(added_files)}</div>
+            </div>
+            <div class="summary-item">
+                <h3>删除的文件</h3>
+                <div class="count">{len(deleted_files)}</div>
+            </div>
+            <div class="summary-item">
+                <h3>总计差异</h3>
+                <div class="count">{len(modified_files) + len(added_files) + len(deleted_files)}</div>
+            </div>
+        </div>
+        
+        <h2>修改的文件 ({len(modified_files)})</h2>
+        {f"<ul class='file-list'>{modified_list}</ul>" if modified_files else "<p>无修改的文件</p>"}
+        
+        <h2>新增的文件 ({len(added_files)})</h2>
+        {f"<ul class='file-list'>{added_list}</ul>" if added_files else "<p>无新增的文件</p>"}
+        
+        <h2>删除的文件 ({len(deleted_files)})</h2>
+        {f"<ul class='file-list'>{deleted_list}</ul>" if deleted_files else "<p>无删除的文件</p>"}
+        {_metrics_section(metrics)}
+    </div>
+</body>
+</html>"""
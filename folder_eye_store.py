@@ -0,0 +1,397 @@
+"""Content-addressed archive store for Folder-Eye.
+
+Instead of copying every differing file into the result folder, a run can put
+them into a shared store that keeps each distinct content once, named by its
+digest:
+
+    STORE/
+        folder-eye-store.json              format marker
+        objects/<algorithm>/<ab>/<digest>  one read-only blob per content
+        runs/<run_id>.json                 path -> digest index of each run
+        tmp/                               blobs being written
+
+The run's index is also written to 报告/archive_index.json in the result
+folder. Its paths mirror the normal layout (修改文件/原始文件/..., 新增文件/...),
+so ``restore`` rebuilds the folders a copying run would have written. A
+repeated audit of unchanged files writes nothing but the index.
+
+Digests come from the comparison when it computed one; otherwise the file is
+hashed before anything is written. A new blob is hashed again while it is
+copied and named by what was actually copied, so a file that changes
+mid-run cannot end up under the wrong name.
+
+``gc`` drops old run indexes, then every blob no remaining run references.
+Blobs touched within the grace period are kept, because a run still in
+progress has not registered its index yet; runs touch the blobs they reuse.
+
+Command line:
+    python folder_eye_store.py list STORE
+    python folder_eye_store.py restore STORE RUN_ID|archive_index.json DEST
+    python folder_eye_store.py gc STORE [--keep-runs N] [--older-than DAYS] [--dry-run]
+"""
+import os
+import sys
+import json
+import stat
+import time
+import uuid
+import shutil
+import argparse
+from datetime import datetime, timedelta
+
+from folder_eye_copy import CopyEngine, DirectoryCache
+from folder_eye_progress import format_size
+
+STORE_FORMAT = "folder-eye-store"
+INDEX_FORMAT = "folder-eye-archive-index"
+STORE_VERSION = 1
+STORE_MARKER = "folder-eye-store.json"
+ARCHIVE_INDEX_NAME = "archive_index.json"
+DEFAULT_GRACE_HOURS = 24
+
+_BLOCK = 1024 * 1024
+_READ_ONLY = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+
+
+def _to_index_path(rel_path):
+    # Indexes always use '/' so a store can move between Windows and Linux
+    return rel_path.replace(os.path.sep, '/')
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def _remove(path):
+    # Blobs are read-only, which Windows refuses to delete
+    try:
+        os.remove(path)
+    except PermissionError:
+        os.chmod(path, stat.S_IWRITE | stat.S_IREAD)
+        os.remove(path)
+
+
+class ArchiveStore:
+    """One store directory. Blob writes are safe from several threads and processes."""
+
+    def __init__(self, root, create=False):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.runs_dir = os.path.join(root, "runs")
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.dirs = DirectoryCache()
+
+        marker = os.path.join(root, STORE_MARKER)
+        if os.path.isfile(marker):
+            try:
+                with open(marker, 'r', encoding='utf-8') as f:
+                    info = json.load(f)
+            except (OSError, ValueError) as e:
+                raise ValueError(f"无法读取归档存储标记: {marker} - {e}")
+            if info.get('format') != STORE_FORMAT or info.get('version') != STORE_VERSION:
+                raise ValueError(f"不支持的归档存储格式: {root}")
+        elif not create:
+            raise ValueError(f"不是归档存储: {root}")
+        elif os.path.isdir(root) and os.listdir(root):
+            raise ValueError(f"归档存储目录不为空且不是归档存储: {root}")
+        else:
+            os.makedirs(root, exist_ok=True)
+            _write_json(marker, {'format': STORE_FORMAT, 'version': STORE_VERSION,
+                                 'created': datetime.now().isoformat(timespec='seconds')})
+        for path in (self.objects_dir, self.runs_dir, self.tmp_dir):
+            os.makedirs(path, exist_ok=True)
+
+    def blob_path(self, algorithm, digest):
+        return os.path.join(self.objects_dir, algorithm, digest[:2], digest)
+
+    def reuse(self, algorithm, digest):
+        """True if the blob exists; it is touched so a concurrent gc keeps it."""
+        path = self.blob_path(algorithm, digest)
+        if not os.path.exists(path):
+            return False
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return True
+
+    def _tmp_path(self):
+        return os.path.join(self.tmp_dir, uuid.uuid4().hex)
+
+    def _finalize(self, tmp_path, algorithm, digest):
+        path = self.blob_path(algorithm, digest)
+        os.chmod(tmp_path, _READ_ONLY)
+        self.dirs.ensure(os.path.dirname(path))
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # Another writer stored the same content first (Windows cannot replace read-only files)
+            if not os.path.exists(path):
+                raise
+            _remove(tmp_path)
+
+    def put_bytes(self, algorithm, digest, data):
+        """Store data under digest unless present; returns True if a blob was written."""
+        if self.reuse(algorithm, digest):
+            return False
+        tmp_path = self._tmp_path()
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        self._finalize(tmp_path, algorithm, digest)
+        return True
+
+    def put_file(self, src, algorithm, new_hasher):
+        """Copy src into the store, hashing what is copied; returns (digest, written)."""
+        hasher = new_hasher(algorithm)
+        tmp_path = self._tmp_path()
+        try:
+            with open(src, 'rb') as fsrc, open(tmp_path, 'wb') as fdst:
+                while True:
+                    block = fsrc.read(_BLOCK)
+                    if not block:
+                        break
+                    hasher.update(block)
+                    fdst.write(block)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                _remove(tmp_path)
+            raise
+        digest = hasher.hexdigest()
+        if self.reuse(algorithm, digest):
+            _remove(tmp_path)
+            return digest, False
+        self._finalize(tmp_path, algorithm, digest)
+        return digest, True
+
+    # --- Run indexes ---
+    def write_run(self, index):
+        path = os.path.join(self.runs_dir, f"{index['run_id']}.json")
+        _write_json(path, index)
+        return path
+
+    def runs(self, strict=False):
+        """All run indexes, oldest first. Unreadable ones are skipped, or raise with strict."""
+        runs = []
+        for name in os.listdir(self.runs_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.runs_dir, name)
+            try:
+                index = load_index(path)
+                runs.append((_run_order(index, os.stat(path).st_mtime_ns), index))
+            except (OSError, ValueError) as e:
+                if strict:
+                    raise ValueError(f"无法读取运行索引 {name}，为避免误删对象已停止: {e}")
+        runs.sort(key=lambda item: item[0])
+        return [index for _, index in runs]
+
+    def load_run(self, run):
+        """Index of a run id, or of an archive_index.json path."""
+        if os.path.isfile(run):
+            return load_index(run)
+        path = os.path.join(self.runs_dir, f"{run}.json")
+        if not os.path.isfile(path):
+            raise ValueError(f"归档存储中没有该运行: {run}")
+        return load_index(path)
+
+    def restore(self, index, dest_dir):
+        """Rebuild the archived files of index under dest_dir; returns the number of files."""
+        dirs = DirectoryCache()
+        for rel_path, entry in index['files'].items():
+            dest = os.path.join(dest_dir, *rel_path.split('/'))
+            dirs.ensure(os.path.dirname(dest))
+            shutil.copyfile(self.blob_path(index['algorithm'], entry['digest']), dest)
+            os.utime(dest, ns=(entry['mtime_ns'], entry['mtime_ns']))
+        return len(index['files'])
+
+    def gc(self, keep_runs=None, older_than_days=None, grace_hours=DEFAULT_GRACE_HOURS, dry_run=False):
+        """
+        Drop the run indexes beyond keep_runs (newest kept) or older than
+        older_than_days, then remove unreferenced blobs and stale temp files.
+        Returns (dropped run ids, blobs removed, bytes freed).
+        """
+        # A run whose index cannot be read would look like it references nothing
+        runs = self.runs(strict=True)
+        dropped = set()
+        if keep_runs is not None:
+            dropped.update(index['run_id'] for index in runs[:max(0, len(runs) - keep_runs)])
+        if older_than_days is not None:
+            cutoff = (datetime.now() - timedelta(days=older_than_days)).isoformat(timespec='seconds')
+            dropped.update(index['run_id'] for index in runs if (index.get('created') or '') < cutoff)
+
+        referenced = set()
+        for index in runs:
+            if index['run_id'] not in dropped:
+                referenced.update((index['algorithm'], entry['digest']) for entry in index['files'].values())
+
+        if not dry_run:
+            for run_id in dropped:
+                _remove(os.path.join(self.runs_dir, f"{run_id}.json"))
+
+        grace_cutoff = time.time() - grace_hours * 3600
+        removed = freed = 0
+        for algorithm in os.listdir(self.objects_dir):
+            for dirpath, _, filenames in os.walk(os.path.join(self.objects_dir, algorithm)):
+                for digest in filenames:
+                    if (algorithm, digest) in referenced:
+                        continue
+                    path = os.path.join(dirpath, digest)
+                    st = os.stat(path)
+                    if st.st_mtime >= grace_cutoff:
+                        continue
+                    removed += 1
+                    freed += st.st_size
+                    if not dry_run:
+                        _remove(path)
+        if not dry_run:
+            for name in os.listdir(self.tmp_dir):
+                path = os.path.join(self.tmp_dir, name)
+                if os.stat(path).st_mtime < grace_cutoff:
+                    _remove(path)
+        return sorted(dropped), removed, freed
+
+
+def _run_order(index, file_mtime_ns):
+    """
+    Sort key of a run index. 'created' only has seconds and run ids are random
+    after the timestamp, so runs are ordered by created_ns; indexes written
+    before it existed use 'created' and then their file's mtime.
+    """
+    created_ns = index.get('created_ns')
+    if created_ns is None:
+        try:
+            created_ns = int(datetime.fromisoformat(index.get('created') or '').timestamp()) * 10**9
+        except ValueError:
+            created_ns = 0
+    return created_ns, file_mtime_ns, index['run_id']
+
+
+def load_index(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    if index.get('format') != INDEX_FORMAT or index.get('version') != STORE_VERSION:
+        raise ValueError(f"不是归档索引: {path}")
+    return index
+
+
+def write_index(path, index):
+    _write_json(path, index)
+
+
+class ArchiveWriter(CopyEngine):
+    """
+    CopyEngine that puts each job's file into an ArchiveStore instead of
+    copying it. dest only provides the file's path relative to output_dir,
+    its key in the run index. known_digest(path) returns a digest the
+    comparison already computed with algorithm, or None.
+    """
+
+    def __init__(self, store, output_dir, algorithm, new_hasher, known_digest=None, **kwargs):
+        super().__init__(**kwargs)
+        self.store = store
+        self.output_dir = output_dir
+        self.algorithm = algorithm
+        self.new_hasher = new_hasher
+        self.known_digest = known_digest or (lambda path: None)
+        self.run_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+        self.files = {}
+        self.written_bytes = 0
+
+    def copy_file(self, src, dest, content=None):
+        st = os.stat(src)
+        if content is not None:
+            hasher = self.new_hasher(self.algorithm)
+            hasher.update(content)
+            digest = hasher.hexdigest()
+            written = self.store.put_bytes(self.algorithm, digest, content)
+        else:
+            digest = self.known_digest(src) or self._hash(src)
+            written = False
+            if not self.store.reuse(self.algorithm, digest):
+                digest, written = self.store.put_file(src, self.algorithm, self.new_hasher)
+
+        rel_path = _to_index_path(os.path.relpath(dest, self.output_dir))
+        with self._lock:
+            self.files[rel_path] = {'digest': digest, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+            if written:
+                self.written_bytes += st.st_size
+        return ('stored' if written else 'deduplicated'), st.st_size
+
+    def _hash(self, path):
+        hasher = self.new_hasher(self.algorithm)
+        with open(path, 'rb') as f:
+            while True:
+                block = f.read(_BLOCK)
+                if not block:
+                    break
+                hasher.update(block)
+        return hasher.hexdigest()
+
+    def index(self, **run_info):
+        index = {
+            'format': INDEX_FORMAT,
+            'version': STORE_VERSION,
+            'run_id': self.run_id,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'created_ns': time.time_ns(),
+            'algorithm': self.algorithm,
+        }
+        index.update(run_info)
+        index['files'] = dict(sorted(self.files.items()))
+        return index
+
+
+# --- Command Line Entry Point ---
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="folder_eye_store.py", description="管理内容寻址归档存储")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", help="列出存储中的运行")
+    list_parser.add_argument("store", help="归档存储目录")
+
+    restore_parser = commands.add_parser("restore", help="把一次运行的归档文件还原到文件夹")
+    restore_parser.add_argument("store", help="归档存储目录")
+    restore_parser.add_argument("run", help=f"运行 ID，或结果文件夹中的 {ARCHIVE_INDEX_NAME}")
+    restore_parser.add_argument("dest", help="还原到的文件夹")
+
+    gc_parser = commands.add_parser("gc", help="删除旧的运行索引和不再被引用的对象")
+    gc_parser.add_argument("store", help="归档存储目录")
+    gc_parser.add_argument("--keep-runs", type=int, metavar="N", help="只保留最近 N 次运行")
+    gc_parser.add_argument("--older-than", type=float, metavar="DAYS", help="删除早于 DAYS 天的运行")
+    gc_parser.add_argument("--grace-hours", type=float, default=DEFAULT_GRACE_HOURS, metavar="HOURS",
+                           help="最近 HOURS 小时内写入或复用的对象不删除，以免影响正在进行的运行（默认: %(default)s）")
+    gc_parser.add_argument("--dry-run", action="store_true", help="只显示将删除的内容")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    try:
+        store = ArchiveStore(args.store)
+        if args.command == "list":
+            for index in store.runs():
+                size = sum(entry['size'] for entry in index['files'].values())
+                print(f"{index['run_id']}  {index.get('created', '')}  {len(index['files'])} 个文件  "
+                      f"{format_size(size)}  {index.get('dir_a', '')} -> {index.get('dir_b', '')}")
+        elif args.command == "restore":
+            count = store.restore(store.load_run(args.run), args.dest)
+            print(f"已还原 {count} 个文件到: {args.dest}")
+        else:
+            if args.keep_runs is None and args.older_than is None:
+                print("仅清理未被引用的对象（未指定 --keep-runs 或 --older-than）", file=sys.stderr)
+            dropped, removed, freed = store.gc(args.keep_runs, args.older_than, args.grace_hours, args.dry_run)
+            prefix = "将" if args.dry_run else "已"
+            print(f"{prefix}删除 {len(dropped)} 个运行索引、{removed} 个对象，释放 {format_size(freed)}")
+            for run_id in dropped:
+                print(f"  - {run_id}")
+    except (OSError, ValueError) as e:
+        print(f"归档存储操作失败: {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""Reuse of rendered diff views for Folder-Eye's double-click.
+
+Two layers, tried in order:
+
+* The report index (``报告/report_index.json``), written by the engine, maps
+  each modified file to its report and to the size, mtime and digest both
+  sides had when it was rendered. If the files still match, the existing
+  report is opened as is.
+* ``TempReportCache`` keeps views rendered on demand in ``临时报告``, keyed by
+  both files' stat identity and evicted least recently used once the folder
+  exceeds its size or count budget.
+"""
+import os
+import json
+import hashlib
+
+REPORT_INDEX_NAME = "report_index.json"
+DEFAULT_TEMP_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TEMP_MAX_FILES = 200
+_TEMP_SUFFIX = "_temp_diff.html"
+
+
+def fingerprint_algorithm(algorithm):
+    """algorithm if hashlib can recompute it when a view is checked (not xxhash), else sha256."""
+    return algorithm if algorithm in hashlib.algorithms_guaranteed else 'sha256'
+
+
+def file_fingerprint(st, raw, algorithm='sha256'):
+    """[size, mtime_ns, digest, algorithm] recorded for a file whose bytes raw were read after stat st."""
+    return [st.st_size, st.st_mtime_ns, hashlib.new(algorithm, raw).hexdigest(), algorithm]
+
+
+def known_fingerprint(st, digest, algorithm):
+    """Fingerprint from a digest the comparison already computed for the file at stat st."""
+    return [st.st_size, st.st_mtime_ns, digest, algorithm]
+
+
+def _file_digest(path, algorithm):
+    hasher = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _unchanged(path, fingerprint):
+    """Size must match; a matching mtime is trusted, otherwise the digest decides (e.g. after a touch)."""
+    st = os.stat(path)
+    size, mtime_ns, digest = fingerprint[:3]
+    # Indexes written before the algorithm was recorded always used sha256
+    algorithm = fingerprint[3] if len(fingerprint) > 3 else 'sha256'
+    if st.st_size != size:
+        return False
+    return st.st_mtime_ns == mtime_ns or _file_digest(path, algorithm) == digest
+
+
+def write_report_index(reports_dir, entries):
+    """entries: rel_path -> {'report': file name in reports_dir, 'a': fingerprint, 'b': fingerprint}."""
+    path = os.path.join(reports_dir, REPORT_INDEX_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class ReportIndex:
+    """Read side of report_index.json; reloads when the file changes (e.g. after the next run)."""
+
+    def __init__(self, reports_dir):
+        self.reports_dir = reports_dir
+        self._entries = {}
+        self._loaded_mtime = None
+
+    def _load(self):
+        path = os.path.join(self.reports_dir, REPORT_INDEX_NAME)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self._entries, self._loaded_mtime = {}, None
+            return
+        if mtime != self._loaded_mtime:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+            self._loaded_mtime = mtime
+
+    def find(self, rel_path, file_a, file_b):
+        """Path of the report for rel_path if both files are unchanged since it was rendered, else None."""
+        self._load()
+        entry = self._entries.get(rel_path)
+        if not entry:
+            return None
+        report_path = os.path.join(self.reports_dir, entry['report'])
+        try:
+            if os.path.isfile(report_path) and _unchanged(file_a, entry['a']) and _unchanged(file_b, entry['b']):
+                return report_path
+        except OSError:
+            pass
+        return None
+
+
+class TempReportCache:
+    """Size-bounded LRU of views rendered on demand; recency is the file's mtime, refreshed on each hit."""
+
+    def __init__(self, temp_dir, max_bytes=DEFAULT_TEMP_MAX_BYTES, max_files=DEFAULT_TEMP_MAX_FILES):
+        self.temp_dir = temp_dir
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+
+    def _path_for(self, rel_path, file_a, file_b):
+        st_a = os.stat(file_a)
+        st_b = os.stat(file_b)
+        key = hashlib.sha1(
+            f"{os.path.abspath(file_a)}|{st_a.st_size}|{st_a.st_mtime_ns}|"
+            f"{os.path.abspath(file_b)}|{st_b.st_size}|{st_b.st_mtime_ns}".encode('utf-8')
+        ).hexdigest()[:12]
+        return os.path.join(self.temp_dir, f"{rel_path.replace(os.path.sep, '_')}_{key}{_TEMP_SUFFIX}")
+
+    def get_or_render(self, rel_path, file_a, file_b, render):
+        """
+        Return (path, hit). On a miss render(path) writes the view, then the
+        folder is trimmed back to its budget.
+        """
+        path = self._path_for(rel_path, file_a, file_b)
+        if os.path.isfile(path):
+            os.utime(path)
+            return path, True
+
+        os.makedirs(self.temp_dir, exist_ok=True)
+        render(path)
+        self.evict(keep=path)
+        return path, False
+
+    def evict(self, keep=None):
+        """Delete least recently used views until the folder fits max_bytes and max_files. Returns files removed."""
+        views = []
+        for entry in os.scandir(self.temp_dir):
+            if entry.is_file() and entry.name.endswith(_TEMP_SUFFIX):
+                st = entry.stat()
+                views.append((st.st_mtime_ns, st.st_size, entry.path))
+        views.sort()
+
+        total = sum(size for _, size, _ in views)
+        count = len(views)
+        removed = 0
+        for _, size, path in views:
+            if total <= self.max_bytes and count <= self.max_files:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            count -= 1
+            removed += 1
+        return removed